@@ -162,9 +162,14 @@ void MeshNode::handle_line(const std::shared_ptr<Session>& /*who*/, const std::s
 
         WireMsg m = j.get<WireMsg>();
 
-        // Deduplication
-        if (seen_ids_.count(m.msg_id)) return;
-        seen_ids_.insert(m.msg_id);
+        // Deduplication. Chunks of one payload share a msg_id, and re-sent
+        // chunks carry a new timestamp, so key those by index and timestamp.
+        std::string seen_key = m.msg_id;
+        if (m.chunk_total > 0) {
+            seen_key += "#" + std::to_string(m.chunk_index) + "@" + std::to_string(m.timestamp);
+        }
+        if (seen_ids_.count(seen_key)) return;
+        seen_ids_.insert(seen_key);
 
         // TTL-based rebroadcast
         if (m.ttl > 0) {
@@ -1,74 +1,548 @@
 # analytics.py
-# Simple in-memory analytics system for tracking emotion patterns
-import json
-from datetime import datetime, timedelta
-from typing import Dict, List, Any
-from collections import defaultdict, Counter
+# Simple in-memory analytics system for tracking emotion patterns.
+# Events are stored per user in compact typed columns (see `EventRing`)
+# rather than one dict per event, and trend queries run vectorized.
+# Events can also be written to a durable `AnalyticsLog` (see
+# analytics_log.py), which rebuilds this state on startup.
+import threading
+import time
+from array import array
+from contextlib import ExitStack, contextmanager
+from functools import lru_cache
+from typing import Dict, Iterable, List, Any, Optional, Tuple
+
+import numpy as np
+
+# Events kept per user; older ones are overwritten
+MAX_EVENTS_PER_USER = 1000
+# Users are spread over this many locks (see `EmotionAnalytics`)
+LOCK_SHARDS = 16
+
+
+class EmotionCodes:
+    """Interns emotion labels as small integer codes (stored as uint8)."""
+
+    def __init__(self, names=('happy', 'sad', 'angry', 'scared', 'normal')):
+        self.names: List[str] = []
+        self._codes: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        for name in names:
+            self.code(name)
+
+    def code(self, name: str) -> int:
+        code = self._codes.get(name)
+        if code is None:
+            with self._lock:
+                code = self._codes.get(name)
+                if code is None:
+                    if len(self.names) > 255:
+                        raise ValueError('too many distinct emotion labels')
+                    self.names.append(name)
+                    code = self._codes[name] = len(self.names) - 1
+        return code
+
+
+@lru_cache(maxsize=8192)
+def _local_hour(quarter: int) -> int:
+    # Hour of day (local time) of a 15-minute slot; every UTC offset is a
+    # multiple of 15 minutes, so all events in one slot share the hour
+    return time.localtime(quarter * 900).tm_hour
+
+
+@lru_cache(maxsize=1024)
+def _utc_offset(day: int) -> int:
+    # Local UTC offset (seconds) at the start of a UTC day
+    return time.localtime(day * 86400).tm_gmtoff
+
+
+def _local_hours(timestamps: np.ndarray) -> np.ndarray:
+    """Local hour of day of each epoch-second timestamp."""
+    # Usually one UTC offset covers every day involved and the hours are
+    # plain arithmetic; around a DST change, look them up per slot
+    days = np.unique(timestamps // 86400).tolist()
+    offsets = {_utc_offset(edge) for day in days for edge in (day, day + 1)}
+    if len(offsets) == 1:
+        return (timestamps + offsets.pop()) // 3600 % 24
+    quarters, inverse = np.unique(timestamps // 900, return_inverse=True)
+    hours = np.fromiter((_local_hour(int(q)) for q in quarters), dtype=np.int64, count=len(quarters))
+    return hours[inverse]
+
+
+class EventRing:
+    """One user's events as a ring buffer of typed columns.
+
+    Columns: epoch seconds (int64), emotion code (uint8), confidence
+    (float32) and text length (uint32), 17 bytes per event. The buffer
+    starts small and doubles up to `max_events`; after that each append
+    overwrites the oldest event. Timestamps are kept non-decreasing (an
+    event older than the newest one is stored with the newest time), so
+    time windows are found by binary search.
+    """
+
+    __slots__ = ('timestamps', 'emotions', 'confidences', 'lengths', 'start', 'size', 'max_events')
+
+    def __init__(self, max_events: int = MAX_EVENTS_PER_USER, capacity: int = 8):
+        capacity = min(capacity, max_events)
+        self.timestamps = np.zeros(capacity, dtype=np.int64)
+        self.emotions = np.zeros(capacity, dtype=np.uint8)
+        self.confidences = np.zeros(capacity, dtype=np.float32)
+        self.lengths = np.zeros(capacity, dtype=np.uint32)
+        self.start = 0
+        self.size = 0
+        self.max_events = max_events
+
+    def __len__(self) -> int:
+        return self.size
+
+    def append(self, timestamp: int, emotion: int, confidence: float,
+               length: int) -> Optional[Tuple[int, int, int]]:
+        """Add an event; returns the evicted (timestamp, emotion, length), if any."""
+        evicted = None
+        capacity = len(self.timestamps)
+        if self.size:
+            timestamp = max(timestamp, int(self.timestamps[(self.start + self.size - 1) % capacity]))
+        if self.size == capacity:
+            if capacity < self.max_events:
+                self._grow(min(self.max_events, capacity * 2))
+                capacity = len(self.timestamps)
+            else:
+                # Full: the slot of the oldest event becomes the newest
+                evicted = (int(self.timestamps[self.start]), int(self.emotions[self.start]),
+                           int(self.lengths[self.start]))
+                self.start = (self.start + 1) % capacity
+                self.size -= 1
+        i = (self.start + self.size) % capacity
+        self.timestamps[i] = timestamp
+        self.emotions[i] = emotion
+        self.confidences[i] = confidence
+        self.lengths[i] = max(0, length)
+        self.size += 1
+        return evicted
+
+    @property
+    def newest(self) -> int:
+        """Stored timestamp of the newest event (the buffer must not be empty)."""
+        return int(self.timestamps[(self.start + self.size - 1) % len(self.timestamps)])
+
+    @classmethod
+    def from_columns(cls, max_events: int, timestamps: np.ndarray, emotions: np.ndarray,
+                     confidences: np.ndarray, lengths: np.ndarray) -> 'EventRing':
+        """Ring holding the newest `max_events` of the given events (oldest first)."""
+        ring = cls(max_events, capacity=max(8, min(len(timestamps), max_events)))
+        n = min(len(timestamps), max_events)
+        if n:
+            ring.timestamps[:n] = timestamps[-n:]
+            ring.emotions[:n] = emotions[-n:]
+            ring.confidences[:n] = confidences[-n:]
+            ring.lengths[:n] = lengths[-n:]
+            ring.size = n
+        return ring
+
+    def columns(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Copies of the (timestamps, emotions, confidences, lengths) columns, oldest first."""
+        parts = [slice(lo, hi) for lo, hi in self._runs()]
+        return tuple(np.concatenate([column[p] for p in parts])
+                     for column in (self.timestamps, self.emotions, self.confidences, self.lengths))
+
+    def _grow(self, capacity: int) -> None:
+        # Only called before the buffer wraps, so events are in [0, size)
+        for name in ('timestamps', 'emotions', 'confidences', 'lengths'):
+            column = getattr(self, name)
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            setattr(self, name, grown)
+
+    def _runs(self) -> List[Tuple[int, int]]:
+        # The ring is at most two sorted runs: [start, capacity) then [0, end - capacity)
+        end = self.start + self.size
+        capacity = len(self.timestamps)
+        runs = [(self.start, min(end, capacity))]
+        if end > capacity:
+            runs.append((0, end - capacity))
+        return runs
+
+    def first_after(self, cutoff: int) -> Optional[int]:
+        """Timestamp of the oldest event newer than `cutoff`, None if there is none."""
+        for lo, hi in self._runs():
+            i = lo + int(np.searchsorted(self.timestamps[lo:hi], cutoff, side='right'))
+            if i < hi:
+                return int(self.timestamps[i])
+        return None
+
+    def since(self, cutoff: int, until: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(timestamps, emotions, lengths) of events newer than `cutoff` (and
+        older than `until`, if given), oldest first."""
+        parts = []
+        for lo, hi in self._runs():
+            run = self.timestamps[lo:hi]
+            first = lo + int(np.searchsorted(run, cutoff, side='right'))
+            last = hi if until is None else lo + int(np.searchsorted(run, until, side='left'))
+            if first < last:
+                parts.append(slice(first, last))
+        if len(parts) < 2:
+            part = parts[0] if parts else slice(0, 0)
+            return self.timestamps[part], self.emotions[part], self.lengths[part]
+        return tuple(np.concatenate([column[p] for p in parts])
+                     for column in (self.timestamps, self.emotions, self.lengths))
+
+
+# A bucket aggregates the events of one hour or day as a flat list:
+# [length_sum, key, count, key, count, ...] with key = emotion code * 24 +
+# local hour of day. Keys are in the order they were first seen, which
+# trend queries use to break ties the same way a scan of the raw events
+# would. (Lists of small ints keep a bucket at a few dozen bytes.)
+Bucket = List[int]
+
+
+def _bucket_add(bucket: Bucket, key: int, length: int) -> None:
+    bucket[0] += length
+    for i in range(1, len(bucket), 2):
+        if bucket[i] == key:
+            bucket[i + 1] += 1
+            return
+    bucket += (key, 1)
+
+
+def _bucket_remove(bucket: Bucket, key: int, length: int) -> None:
+    bucket[0] -= length
+    for i in range(1, len(bucket), 2):
+        if bucket[i] == key:
+            if bucket[i + 1] == 1:
+                del bucket[i:i + 2]
+            else:
+                bucket[i + 1] -= 1
+            return
+
+
+class TrendBuckets:
+    """Rolling daily and hourly aggregates of one user's events.
+
+    Daily buckets are keyed by UTC day number and cover every event in the
+    user's `EventRing` (evicted events are subtracted again); hourly
+    buckets, keyed by UTC hour number, are kept for the newest two days
+    only. Both are in time order. Eviction removes the oldest events
+    first, so only the oldest bucket's first-seen order can be off; trend
+    queries read the first hour or day of their window from the raw events
+    and so never use it.
+    """
+
+    __slots__ = ('hourly', 'daily')
+
+    def __init__(self):
+        self.hourly: Dict[int, Bucket] = {}
+        self.daily: Dict[int, Bucket] = {}
+
+    def add(self, timestamp: int, emotion: int, length: int) -> None:
+        key = emotion * 24 + _local_hour(timestamp // 900)
+        for table, slot in ((self.hourly, timestamp // 3600), (self.daily, timestamp // 86400)):
+            bucket = table.get(slot)
+            if bucket is None:
+                bucket = table[slot] = [0]
+            _bucket_add(bucket, key, length)
+        # Drop hourly buckets from before yesterday (UTC)
+        keep_from = (timestamp // 86400 - 1) * 24
+        while True:
+            hour = next(iter(self.hourly))
+            if hour >= keep_from:
+                break
+            del self.hourly[hour]
+
+    @classmethod
+    def from_events(cls, timestamps: np.ndarray, emotions: np.ndarray, lengths: np.ndarray) -> 'TrendBuckets':
+        """Buckets of a ring's events (oldest first), as `add` would build them."""
+        buckets = cls()
+        if not len(timestamps):
+            return buckets
+        keys = emotions.astype(np.int64) * 24 + _local_hours(timestamps)
+        lengths = lengths.astype(np.int64)
+        hours = timestamps // 3600
+        recent = int(np.searchsorted(hours, (int(timestamps[-1]) // 86400 - 1) * 24))
+        for table, slots, rows in ((buckets.daily, timestamps // 86400, slice(None)),
+                                   (buckets.hourly, hours, slice(recent, None))):
+            slots, keys_, lengths_ = slots[rows], keys[rows], lengths[rows]
+            if not len(slots):
+                continue
+            # Timestamps are sorted, so each slot is one run of rows
+            starts = np.flatnonzero(np.diff(slots, prepend=slots[0] - 1))
+            for slot, length_sum in zip(slots[starts].tolist(), np.add.reduceat(lengths_, starts).tolist()):
+                table[slot] = [length_sum]
+            # (slot, key) pairs in order of first appearance; keys are < 2**13
+            pairs, first, counts = np.unique(slots * 8192 + keys_, return_index=True, return_counts=True)
+            order = np.argsort(first, kind='stable')
+            for pair, count in zip(pairs[order].tolist(), counts[order].tolist()):
+                table[pair >> 13] += (pair & 8191, count)
+        return buckets
+
+    def remove(self, timestamp: int, emotion: int, length: int) -> None:
+        key = emotion * 24 + _local_hour(timestamp // 900)
+        for table, slot in ((self.hourly, timestamp // 3600), (self.daily, timestamp // 86400)):
+            bucket = table.get(slot)
+            if bucket is not None:
+                _bucket_remove(bucket, key, length)
+                if len(bucket) == 1:
+                    del table[slot]
+
+    def hourly_start(self) -> int:
+        """First UTC hour whose hourly bucket is kept (if it has events)."""
+        return next(iter(self.hourly), 0) // 24 * 24
+
+    def between_hours(self, first_hour: int, last_hour: int) -> List[Bucket]:
+        """Hourly buckets of UTC hours first_hour..last_hour, oldest first."""
+        hourly = self.hourly
+        return [hourly[h] for h in range(first_hour, last_hour + 1) if h in hourly]
+
+    def between_days(self, first_day: int, last_day: int) -> List[Bucket]:
+        """Daily buckets of UTC days first_day..last_day, oldest first."""
+        buckets = []
+        for day in reversed(self.daily):
+            if day < first_day:
+                break
+            if day <= last_day:
+                buckets.append(self.daily[day])
+        buckets.reverse()
+        return buckets
+
 
 class EmotionAnalytics:
-    """Simple in-memory analytics system for emotion tracking."""
+    """Simple in-memory analytics system for emotion tracking.
+
+    Each user's last `max_events` events live in an `EventRing`; emotion
+    labels are stored as codes shared by all users. `log_emotion` also
+    updates the user's `TrendBuckets`, so trend queries add up daily and
+    hourly aggregates instead of rescanning the events.
+
+    With a `log` attached (see `AnalyticsLog.attach`), every logged event is
+    also appended to it, in the same order as it is applied here.
+
+    Each user is guarded by one of `shards` locks, so writes and trend
+    queries for different users rarely wait on each other; snapshots take
+    every lock.
+    """
     
-    def __init__(self):
-        # Store emotion data: {user_id: [(timestamp, emotion, confidence, text_length), ...]}
-        self.emotion_data = defaultdict(list)
+    def __init__(self, max_events: int = MAX_EVENTS_PER_USER, shards: int = LOCK_SHARDS):
+        self.max_events = max_events
+        self.codes = EmotionCodes()
+        # {user_id: EventRing} and {user_id: TrendBuckets}
+        self.events: Dict[str, EventRing] = {}
+        self.buckets: Dict[str, TrendBuckets] = {}
+        self.log = None
+        self._locks = [threading.Lock() for _ in range(shards)]
+    
+    def _lock(self, user_id: str) -> threading.Lock:
+        return self._locks[hash(user_id) % len(self._locks)]
+    
+    @contextmanager
+    def _all_locks(self):
+        with ExitStack() as stack:
+            for lock in self._locks:
+                stack.enter_context(lock)
+            yield
     
-    def log_emotion(self, user_id: str, emotion: str, confidence: float, text_length: int = 0):
-        """Log an emotion event for analytics."""
-        timestamp = datetime.now()
-        self.emotion_data[user_id].append({
-            'timestamp': timestamp,
-            'emotion': emotion,
-            'confidence': confidence,
-            'text_length': text_length
-        })
+    def _append(self, user_id: str, timestamp: int, emotion: int, confidence: float, length: int) -> None:
+        ring = self.events.get(user_id)
+        if ring is None:
+            ring = self.events[user_id] = EventRing(self.max_events)
+            self.buckets[user_id] = TrendBuckets()
+        buckets = self.buckets[user_id]
+        evicted = ring.append(timestamp, emotion, confidence, length)
+        if evicted is not None:
+            buckets.remove(*evicted)
+        buckets.add(ring.newest, emotion, max(0, length))
+    
+    def log_emotion(self, user_id: str, emotion: str, confidence: float, text_length: int = 0,
+                    timestamp: Optional[float] = None):
+        """Log an emotion event for analytics (at `timestamp`, epoch seconds, default now)."""
+        when = int(time.time() if timestamp is None else timestamp)
+        log = self.log
+        record = log.encode(user_id, when, emotion, confidence, text_length) if log is not None else None
+        with self._lock(user_id):
+            self._append(user_id, when, self.codes.code(emotion), confidence, text_length)
+            if record is not None:
+                log.append(record)
+    
+    def log_emotions(self, user_id: str, events: List[Tuple[str, float, int]], timestamp: Optional[float] = None):
+        """Log several (emotion, confidence, text_length) events at once.
+
+        Used by batch endpoints; all events get the same timestamp.
+        """
+        if not events:
+            return
+        when = int(time.time() if timestamp is None else timestamp)
+        code = self.codes.code
+        log = self.log
+        records = [log.encode(user_id, when, emotion, confidence, text_length)
+                   for emotion, confidence, text_length in events] if log is not None else None
+        with self._lock(user_id):
+            for i, (emotion, confidence, text_length) in enumerate(events):
+                self._append(user_id, when, code(emotion), confidence, text_length)
+                if records is not None:
+                    log.append(records[i])
+    
+    def log_batch(self, events: Iterable[Tuple[str, float, str, float, int]]) -> int:
+        """Log (user_id, timestamp, emotion, confidence, text_length) events.
+
+        Used by the ingestion queue and the analytics server. An event that
+        cannot be logged is skipped; returns how many were.
+        """
+        failed = 0
+        for user_id, timestamp, emotion, confidence, text_length in events:
+            try:
+                self.log_emotion(user_id, emotion, confidence, text_length, timestamp=timestamp)
+            except Exception:
+                failed += 1
+        return failed
+    
+    def stats(self) -> Dict[str, Any]:
+        """Users and events held, plus the attached log's counters (None without one)."""
+        rings = list(self.events.values())
+        return {
+            'users': len(rings),
+            'events': sum(len(ring) for ring in rings),
+            'max_events_per_user': self.max_events,
+            'log': self.log.stats() if self.log is not None else None,
+        }
+    
+    def export_state(self) -> Dict[str, Any]:
+        """Every user's events as flat columns, for a snapshot.
+
+        Users' events are concatenated (oldest first) in `timestamps`,
+        `emotions`, `confidences` and `lengths`; `offsets` has one more
+        entry than `users`, user i owns rows offsets[i]:offsets[i + 1].
+        `emotions` are codes into `names`. `seq` is the number of events the
+        attached log had been given when the state was taken (0 without one).
+        """
+        with self._all_locks():
+            users = list(self.events)
+            columns = [self.events[user].columns() for user in users]
+            names = list(self.codes.names)
+            seq = self.log.appended if self.log is not None else 0
+        sizes = [len(c[0]) for c in columns]
+        state: Dict[str, Any] = {'seq': seq, 'users': users, 'names': names,
+                                 'offsets': np.concatenate(([0], np.cumsum(sizes, dtype=np.int64)))}
+        for i, (name, dtype) in enumerate((('timestamps', np.int64), ('emotions', np.uint8),
+                                           ('confidences', np.float32), ('lengths', np.uint32))):
+            state[name] = (np.concatenate([c[i] for c in columns]) if columns
+                           else np.zeros(0, dtype=dtype))
+        return state
+    
+    def restore_state(self, state: Optional[Dict[str, Any]],
+                      tail: Iterable[Tuple[str, int, str, float, int]] = ()) -> None:
+        """Replace all events with those of `state` (`export_state` output,
+        or None for none) followed by the `tail` events.
+
+        `tail` yields (user_id, timestamp, emotion, confidence, text_length)
+        and is applied as `log_emotion` would, in one pass. Each user keeps
+        the newest `max_events` events; the trend buckets are rebuilt from
+        them.
+        """
+        codes = EmotionCodes(state['names']) if state is not None else EmotionCodes()
+        columns: Dict[str, List[np.ndarray]] = {}
+        if state is not None:
+            offsets = np.asarray(state['offsets']).tolist()
+            for i, user in enumerate(state['users']):
+                rows = slice(offsets[i], offsets[i + 1])
+                columns[user] = [state[name][rows] for name in ('timestamps', 'emotions', 'confidences', 'lengths')]
+        # Tail events are gathered per user in typed arrays, then appended
+        tails: Dict[str, Tuple[array, array, array, array]] = {}
+        code = codes.code
+        for user_id, timestamp, emotion, confidence, text_length in tail:
+            rows = tails.get(user_id)
+            if rows is None:
+                rows = tails[user_id] = (array('q'), array('B'), array('f'), array('I'))
+            rows[0].append(timestamp)
+            rows[1].append(code(emotion))
+            rows[2].append(confidence)
+            rows[3].append(max(0, text_length))
+        for user_id, rows in tails.items():
+            added = [np.asarray(rows[0], dtype=np.int64), np.asarray(rows[1], dtype=np.uint8),
+                     np.asarray(rows[2], dtype=np.float32), np.asarray(rows[3], dtype=np.uint32)]
+            if user_id in columns:
+                added = [np.concatenate(pair) for pair in zip(columns[user_id], added)]
+            # Timestamps never go backwards within a user (see `EventRing`)
+            added[0] = np.maximum.accumulate(added[0])
+            columns[user_id] = added
         
-        # Keep only last 1000 entries per user to prevent memory bloat
-        if len(self.emotion_data[user_id]) > 1000:
-            self.emotion_data[user_id] = self.emotion_data[user_id][-1000:]
+        events: Dict[str, EventRing] = {}
+        buckets: Dict[str, TrendBuckets] = {}
+        for user, (timestamps, emotions, confidences, lengths) in columns.items():
+            ring = EventRing.from_columns(self.max_events, timestamps, emotions, confidences, lengths)
+            if not len(ring):
+                continue
+            events[user] = ring
+            n = len(ring)  # a new ring holds its events in [0, n)
+            buckets[user] = TrendBuckets.from_events(ring.timestamps[:n], ring.emotions[:n], ring.lengths[:n])
+        with self._all_locks():
+            self.codes, self.events, self.buckets = codes, events, buckets
     
     def get_emotion_trends(self, user_id: str, days: int = 7) -> Dict[str, Any]:
         """Get emotion trends for a user over the last N days."""
-        if user_id not in self.emotion_data:
+        with self._lock(user_id):
+            return self._trends(user_id, days)
+    
+    def _trends(self, user_id: str, days: int) -> Dict[str, Any]:
+        ring = self.events.get(user_id)
+        if ring is None or not len(ring):
             return self._empty_trends()
         
-        # Filter to last N days
-        cutoff = datetime.now() - timedelta(days=days)
-        recent_data = [
-            entry for entry in self.emotion_data[user_id] 
-            if entry['timestamp'] > cutoff
-        ]
-        
-        if not recent_data:
+        # First event of the last N days (binary search on the time column)
+        first = ring.first_after(int(time.time() - days * 86400))
+        if first is None:
             return self._empty_trends()
         
-        # Calculate emotion distribution
-        emotions = [entry['emotion'] for entry in recent_data]
-        emotion_counts = Counter(emotions)
-        total = len(emotions)
+        # Counts per (emotion, hour of day), keys in order of first
+        # appearance. The first hour of the window (or its first day, if
+        # the window starts before the hourly buckets) may be partial and
+        # is read from the raw events, everything after it from buckets.
+        buckets = self.buckets[user_id]
+        newest = ring.newest
+        first_hour, last_hour = first // 3600, newest // 3600
+        if first_hour >= buckets.hourly_start():
+            raw_until = (first_hour + 1) * 3600
+            later = buckets.between_hours(first_hour + 1, last_hour)
+        else:
+            first_day, last_day = first // 86400, newest // 86400
+            raw_until = (first_day + 1) * 86400
+            later = buckets.between_days(first_day + 1, last_day - 1)
+            later += buckets.between_hours(last_day * 24, last_hour)
+        timestamps, emotions, lengths = ring.since(first - 1, until=raw_until)
+        length_sum = int(lengths.sum(dtype=np.int64))
+        counts: Dict[int, int] = {}
+        for key in (emotions.astype(np.int64) * 24 + _local_hours(timestamps)).tolist():
+            counts[key] = counts.get(key, 0) + 1
+        for bucket in later:
+            length_sum += bucket[0]
+            for i in range(1, len(bucket), 2):
+                key = bucket[i]
+                counts[key] = counts.get(key, 0) + bucket[i + 1]
         
+        # Calculate emotion distribution (an emotion's first key is its
+        # first appearance)
+        emotion_counts: Dict[int, int] = {}
+        for key, count in counts.items():
+            emotion_counts[key // 24] = emotion_counts.get(key // 24, 0) + count
+        total = sum(emotion_counts.values())
+        names = self.codes.names
         emotion_percentages = {
-            emotion: round((count / total) * 100, 1)
-            for emotion, count in emotion_counts.items()
+            names[code]: round((count / total) * 100, 1)
+            for code, count in emotion_counts.items()
         }
         
-        # Time-based patterns (hourly)
-        hourly_emotions = defaultdict(list)
-        for entry in recent_data:
-            hour = entry['timestamp'].hour
-            hourly_emotions[hour].append(entry['emotion'])
-        
-        # Find most common emotion by hour
-        peak_hours = {}
-        for hour, hour_emotions in hourly_emotions.items():
-            if hour_emotions:
-                most_common = Counter(hour_emotions).most_common(1)[0]
-                peak_hours[hour] = {
-                    'emotion': most_common[0],
-                    'count': most_common[1]
-                }
+        # Most common emotion per hour of day: highest count, ties going to
+        # the emotion seen first in that hour; hours in order of first appearance
+        leaders: Dict[int, Tuple[int, int]] = {}
+        for key, count in counts.items():
+            code, hour = divmod(key, 24)
+            best = leaders.get(hour)
+            if best is None or count > best[0]:
+                leaders[hour] = (count, code)
+        peak_hours = {
+            hour: {'emotion': names[code], 'count': count}
+            for hour, (count, code) in leaders.items()
+        }
         
         # Generate insights
-        insights = self._generate_insights(emotion_percentages, peak_hours, recent_data, days)
+        avg_length = length_sum / total
+        insights = self._generate_insights(emotion_percentages, peak_hours, avg_length, days)
         
         return {
             'total_messages': total,
@@ -89,7 +563,7 @@ class EmotionAnalytics:
         }
     
     def _generate_insights(self, emotion_percentages: Dict[str, float], 
-                          peak_hours: Dict[int, Dict], recent_data: List[Dict], days: int) -> List[str]:
+                          peak_hours: Dict[int, Dict], avg_length: float, days: int) -> List[str]:
         """Generate human-readable insights from the data."""
         insights = []
         
@@ -128,10 +602,8 @@ class EmotionAnalytics:
                     insights.append(f"You've sent frustrated messages {period_text}. Try waiting until morning for important conversations.")
         
         # Message length patterns
-        if recent_data:
-            avg_length = sum(entry.get('text_length', 0) for entry in recent_data) / len(recent_data)
-            if avg_length > 200:
-                insights.append("Your messages are getting longer. Consider breaking complex thoughts into smaller messages.")
+        if avg_length > 200:
+            insights.append("Your messages are getting longer. Consider breaking complex thoughts into smaller messages.")
         
         # Positive reinforcement
         if emotion_percentages.get('happy', 0) > 30:
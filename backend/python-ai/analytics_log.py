@@ -0,0 +1,361 @@
+# analytics_log.py
+# Durable storage behind `EmotionAnalytics`, which otherwise lives only in
+# memory and loses every user's history on a restart or redeploy.
+#
+# Events are appended to a log of segment files. Request handlers only
+# encode an event and queue it; a background flusher writes whatever has
+# queued up as one checksummed frame and syncs once per batch (group
+# commit), so one fsync covers every event that arrived in the meantime.
+# Every `snapshot_every` events the flusher also writes a snapshot of the
+# in-memory state (flat NumPy columns, see `EmotionAnalytics.export_state`)
+# and deletes the segments it covers. On startup the newest snapshot is
+# loaded and only the log after it is replayed; a torn frame at the end of
+# a segment (a crash mid-write) is cut off. Only one process at a time may
+# use a log directory (it is locked where the OS supports it).
+import json
+import os
+import struct
+import threading
+import time
+import zipfile
+import zlib
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, the directory is not locked
+    fcntl = None
+
+# Frame header: payload length, CRC-32 of the payload, sequence number of
+# the first event in it, number of events
+_FRAME = struct.Struct('<IIQI')
+# Event: epoch seconds, confidence, text length, emotion label length and
+# user id length (both UTF-8 strings follow)
+_EVENT = struct.Struct('<qfIHI')
+
+# (sequence number, user id, timestamp, emotion, confidence, text length)
+LoggedEvent = Tuple[int, str, int, str, float, int]
+
+
+def _fsync_dir(directory: str) -> None:
+    # Make a new or renamed directory entry durable (not possible on Windows)
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _decode_frame(data: bytes, pos: int, first_seq: int, count: int) -> Iterator[LoggedEvent]:
+    for seq in range(first_seq, first_seq + count):
+        timestamp, confidence, length, n_label, n_user = _EVENT.unpack_from(data, pos)
+        pos += _EVENT.size
+        emotion = data[pos:pos + n_label].decode('utf-8')
+        pos += n_label
+        user_id = data[pos:pos + n_user].decode('utf-8')
+        pos += n_user
+        yield seq, user_id, timestamp, emotion, confidence, length
+
+
+class LogLocked(Exception):
+    """Raised by `attach` when another process is using the log directory."""
+
+
+class AnalyticsLog:
+    """Group-committed append-only event log with snapshots.
+
+    `attach(analytics)` rebuilds an `EmotionAnalytics` from `directory`
+    (newest snapshot plus the log after it) and starts the flusher; from
+    then on the analytics object passes every event it logs to `append`.
+    An event is durable once the flusher has written and synced its batch,
+    normally within `flush_interval` seconds (`flush()` waits for that).
+    With `fsync=False` batches are only handed to the OS, which survives a
+    crash of the process but not of the machine.
+
+    Segments roll over at `segment_bytes`. Snapshots are written by the
+    flusher thread, so batches wait while one is taken.
+    """
+
+    def __init__(self, directory: str, flush_interval: float = 0.05, max_batch: int = 4096,
+                 fsync: bool = True, segment_bytes: int = 64 * 2 ** 20, snapshot_every: int = 1_000_000):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.fsync = fsync
+        self.segment_bytes = segment_bytes
+        self.snapshot_every = snapshot_every
+        # Sequence numbers: events are numbered from 1 in append order;
+        # `appended` is the last one queued, `durable` the last one written
+        self.appended = 0
+        self.durable = 0
+        self.snapshot_seq = 0
+        self._pending: List[bytes] = []
+        self._waiters = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._source = None
+        self._segment = None
+        self._segment_size = 0
+        self._dir_lock = None
+        self._counters = {'batches': 0, 'events_written': 0, 'bytes_written': 0, 'fsyncs': 0,
+                          'write_errors': 0, 'snapshots': 0, 'snapshot_ms': 0.0, 'recovered_events': 0,
+                          'replayed_events': 0, 'truncated_bytes': 0, 'recovery_ms': 0.0}
+
+    def attach(self, analytics) -> Dict[str, Any]:
+        """Recover `analytics` from the directory, then start logging its events.
+
+        Returns recovery statistics (events from the snapshot and replayed
+        from the log, time taken).
+        """
+        t0 = time.perf_counter()
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock_directory()
+        for name in os.listdir(self.directory):
+            if name.endswith('.tmp'):
+                os.remove(os.path.join(self.directory, name))
+        state = self._load_snapshot()
+        applied = self.snapshot_seq = state['seq'] if state is not None else 0
+        snapshot_events = int(state['offsets'][-1]) if state is not None else 0
+        replayed = 0
+
+        def tail():
+            nonlocal applied, replayed
+            for _, path in self._segments():
+                for seq, user_id, timestamp, emotion, confidence, length in self._read_segment(path, applied):
+                    if seq > applied:
+                        applied = seq
+                        replayed += 1
+                        yield user_id, timestamp, emotion, confidence, length
+
+        analytics.restore_state(state, tail())
+        self.appended = self.durable = applied
+        self._counters['recovered_events'] = snapshot_events
+        self._counters['replayed_events'] = replayed
+        self._counters['recovery_ms'] = round((time.perf_counter() - t0) * 1000, 1)
+
+        self._source = analytics.export_state
+        analytics.log = self
+        self._thread = threading.Thread(target=self._run, name='analytics-log', daemon=True)
+        self._thread.start()
+        return {'snapshot_seq': self.snapshot_seq, 'recovered_events': snapshot_events,
+                'replayed_events': replayed, 'recovery_ms': self._counters['recovery_ms']}
+
+    @staticmethod
+    def encode(user_id: str, timestamp: int, emotion: str, confidence: float, length: int) -> bytes:
+        """One event as a log record; raises if it cannot be logged (e.g. a non-string id).
+
+        `EmotionAnalytics` encodes before changing its state, so an event is
+        either both in memory and in the log, or in neither.
+        """
+        label = emotion.encode('utf-8')
+        user = user_id.encode('utf-8')
+        header = _EVENT.pack(timestamp, confidence, min(max(0, length), 0xFFFFFFFF), len(label), len(user))
+        return header + label + user
+
+    def append(self, record: bytes) -> None:
+        """Queue one `encode`d event for the next batch (called by `EmotionAnalytics`)."""
+        with self._cond:
+            self._pending.append(record)
+            self.appended += 1
+            if len(self._pending) >= self.max_batch:
+                self._cond.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every event appended so far is durable; False on timeout."""
+        with self._cond:
+            target = self.appended
+            if self._thread is None or self.durable >= target:
+                return self.durable >= target
+            self._waiters += 1
+            self._cond.notify_all()
+            try:
+                return self._cond.wait_for(lambda: self.durable >= target, timeout)
+            finally:
+                self._waiters -= 1
+
+    def close(self, snapshot: bool = True) -> None:
+        """Flush the queue, stop the flusher and (by default) write a final snapshot."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            if snapshot and self.appended > self.snapshot_seq:
+                self.snapshot()
+        if self._segment is not None:
+            self._segment.close()
+            self._segment = None
+        if self._dir_lock is not None:
+            self._dir_lock.close()
+            self._dir_lock = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            batches = self._counters['batches']
+            return dict(
+                self._counters,
+                appended=self.appended,
+                durable=self.durable,
+                pending=len(self._pending),
+                snapshot_seq=self.snapshot_seq,
+                avg_batch=round(self._counters['events_written'] / batches, 1) if batches else 0.0,
+            )
+
+    def snapshot(self) -> None:
+        """Write a snapshot of the attached analytics and drop the segments it covers."""
+        t0 = time.perf_counter()
+        state = self._source()
+        seq = state['seq']
+        meta = json.dumps({'seq': seq, 'users': state['users'], 'names': state['names']})
+        path = os.path.join(self.directory, f"snapshot-{seq:016d}.npz")
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            np.savez(f, meta=np.frombuffer(meta.encode('utf-8'), dtype=np.uint8), offsets=state['offsets'],
+                     timestamps=state['timestamps'], emotions=state['emotions'],
+                     confidences=state['confidences'], lengths=state['lengths'])
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        os.replace(tmp, path)
+        if self.fsync:
+            _fsync_dir(self.directory)
+        self.snapshot_seq = seq
+
+        # Older snapshots, and segments whose events all precede this one
+        for name in os.listdir(self.directory):
+            if name.startswith('snapshot-') and name.endswith('.npz') and name != os.path.basename(path):
+                os.remove(os.path.join(self.directory, name))
+        segments = self._segments()
+        for (_, path), (next_first, _) in zip(segments, segments[1:]):
+            if next_first <= seq + 1:
+                os.remove(path)
+        self._counters['snapshots'] += 1
+        self._counters['snapshot_ms'] = round((time.perf_counter() - t0) * 1000, 1)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                if not self._closed and not self._waiters and len(self._pending) < self.max_batch:
+                    self._cond.wait(self.flush_interval)
+                batch, self._pending = self._pending, []
+                last = self.appended
+                closed = self._closed
+            if batch:
+                if not self._write(batch, last - len(batch) + 1):
+                    if closed:
+                        return  # shutting down; the batch is lost
+                    with self._cond:
+                        self._pending[:0] = batch
+                    time.sleep(self.flush_interval)
+                    continue
+                with self._cond:
+                    self.durable = last
+                    self._cond.notify_all()
+            if closed:
+                with self._cond:
+                    if not self._pending:
+                        return
+            elif self._source is not None and last - self.snapshot_seq >= self.snapshot_every:
+                self.snapshot()
+
+    def _write(self, batch: List[bytes], first_seq: int) -> bool:
+        payload = b''.join(batch)
+        header = _FRAME.pack(len(payload), zlib.crc32(payload), first_seq, len(batch))
+        try:
+            if self._segment is None or self._segment_size >= self.segment_bytes:
+                if self._segment is not None:
+                    self._segment.close()
+                # A segment is named after its first event; a file of that
+                # name can only hold a torn write of this same batch
+                self._segment = open(os.path.join(self.directory, f"segment-{first_seq:016d}.log"), 'wb')
+                self._segment_size = 0
+                if self.fsync:
+                    _fsync_dir(self.directory)
+            self._segment.write(header)
+            self._segment.write(payload)
+            self._segment.flush()
+            if self.fsync:
+                os.fsync(self._segment.fileno())
+                self._counters['fsyncs'] += 1
+        except OSError:
+            # Start a new segment for the retry, after whatever was torn here
+            self._counters['write_errors'] += 1
+            if self._segment is not None:
+                try:
+                    self._segment.close()
+                except OSError:
+                    pass
+            self._segment = None
+            return False
+        self._segment_size += len(header) + len(payload)
+        self._counters['batches'] += 1
+        self._counters['events_written'] += len(batch)
+        self._counters['bytes_written'] += len(header) + len(payload)
+        return True
+
+    def _lock_directory(self) -> None:
+        # Two processes appending to one log would corrupt it (e.g. several
+        # server workers, each with its own in-memory analytics)
+        lock = open(os.path.join(self.directory, 'LOCK'), 'a')
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock.close()
+                raise LogLocked(f"{self.directory} is in use by another process")
+        self._dir_lock = lock
+
+    def _segments(self) -> List[Tuple[int, str]]:
+        # (first sequence number, path), oldest first
+        segments = []
+        for name in os.listdir(self.directory):
+            if name.startswith('segment-') and name.endswith('.log'):
+                segments.append((int(name[8:-4]), os.path.join(self.directory, name)))
+        return sorted(segments)
+
+    def _load_snapshot(self) -> Optional[Dict[str, Any]]:
+        names = sorted((n for n in os.listdir(self.directory)
+                        if n.startswith('snapshot-') and n.endswith('.npz')), reverse=True)
+        for name in names:
+            try:
+                with np.load(os.path.join(self.directory, name)) as data:
+                    state = json.loads(data['meta'].tobytes().decode('utf-8'))
+                    for key in ('offsets', 'timestamps', 'emotions', 'confidences', 'lengths'):
+                        state[key] = data[key]
+                return state
+            except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile, NotImplementedError):
+                # Unreadable (truncated files raise EOFError or BadZipFile, corrupt
+                # zip headers NotImplementedError); fall back to an older one
+                continue
+        return None
+
+    def _read_segment(self, path: str, after: int = 0) -> Iterator[LoggedEvent]:
+        # Events of the valid frames in a segment; frames holding only
+        # events up to `after` are checked but not decoded
+        with open(path, 'rb') as f:
+            data = f.read()
+        view = memoryview(data)
+        pos = 0
+        while pos + _FRAME.size <= len(data):
+            length, crc, first_seq, count = _FRAME.unpack_from(data, pos)
+            start, end = pos + _FRAME.size, pos + _FRAME.size + length
+            if end > len(data) or zlib.crc32(view[start:end]) != crc:
+                break
+            if first_seq + count - 1 > after:
+                yield from _decode_frame(data, start, first_seq, count)
+            pos = end
+        view.release()
+        if pos < len(data):
+            # Torn or corrupt tail: nothing after it can be trusted
+            os.truncate(path, pos)
+            self._counters['truncated_bytes'] += len(data) - pos
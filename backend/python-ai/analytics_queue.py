@@ -0,0 +1,127 @@
+# analytics_queue.py
+# Takes analytics logging off the request path. /api/classify and friends
+# used to update `EmotionAnalytics` (and its durable log) before answering;
+# now they only append the event to a queue, and a background consumer
+# applies whatever has queued up in batches (to the local store, or as one
+# message to the analytics server, see analytics_server.py).
+#
+# Readers that must see their own writes (mood advice computed right after
+# the message was classified, the /api/pipeline advice stage) call
+# `flush()` first; it wakes the consumer and waits for the backlog.
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+from latency import summary_ms
+
+# (user_id, timestamp, emotion, confidence, text length)
+QueuedEvent = Tuple[str, float, str, float, int]
+
+
+class IngestQueue:
+    """Queue of analytics events applied to an `EmotionAnalytics` in batches.
+
+    `log_emotion` / `log_emotions` mirror the analytics methods but only
+    stamp the event with the current time and queue it. The consumer
+    thread sleeps while the queue is empty; once an event arrives it waits
+    `interval` seconds for more to batch up (less if `flush()` is waiting)
+    and applies them all. Beyond `max_pending` queued events new ones are
+    dropped (and counted) rather than letting memory grow without bound.
+    """
+
+    def __init__(self, analytics, interval: float = 0.005, max_pending: int = 100_000, samples: int = 1024):
+        self.analytics = analytics
+        self.interval = interval
+        self.max_pending = max_pending
+        # Events are numbered in queue order; `applied` is the last one done
+        self.enqueued = 0
+        self.applied = 0
+        self._pending: List[QueuedEvent] = []
+        self._oldest = 0.0  # monotonic time the oldest pending event was queued
+        self._lock = threading.Lock()
+        self._done = threading.Condition(self._lock)
+        self._ready = threading.Event()  # the queue has events
+        self._urgent = threading.Event()  # someone is waiting for them
+        self._closed = False
+        self._lags = deque(maxlen=samples)
+        self._counters = {'batches': 0, 'dropped': 0, 'errors': 0, 'flushes': 0, 'max_depth': 0}
+        self._thread = threading.Thread(target=self._run, name='analytics-ingest', daemon=True)
+        self._thread.start()
+
+    def log_emotion(self, user_id: str, emotion: str, confidence: float, text_length: int = 0) -> None:
+        self._put([(user_id, time.time(), emotion, confidence, text_length)])
+
+    def log_emotions(self, user_id: str, events: List[Tuple[str, float, int]]) -> None:
+        """Queue several (emotion, confidence, text_length) events with one timestamp."""
+        when = time.time()
+        self._put([(user_id, when, emotion, confidence, length) for emotion, confidence, length in events])
+
+    def _put(self, events: List[QueuedEvent]) -> None:
+        with self._lock:
+            if not self._closed:
+                if len(self._pending) + len(events) > self.max_pending:
+                    self._counters['dropped'] += len(events)
+                    return
+                if not self._pending:
+                    self._oldest = time.monotonic()
+                    self._ready.set()
+                self._pending += events
+                self.enqueued += len(events)
+                self._counters['max_depth'] = max(self._counters['max_depth'], len(self._pending))
+                return
+        # Shutting down: the consumer is gone, apply inline
+        self.analytics.log_batch(events)
+
+    def flush(self, timeout: Optional[float] = 1.0) -> bool:
+        """Wait until every event queued so far is applied; False on timeout."""
+        with self._lock:
+            target = self.enqueued
+            if self.applied >= target:
+                return True
+            self._counters['flushes'] += 1
+            self._urgent.set()
+            self._ready.set()
+            return self._done.wait_for(lambda: self.applied >= target, timeout)
+
+    def close(self) -> None:
+        """Apply what is queued and stop the consumer."""
+        with self._lock:
+            self._closed = True
+            self._urgent.set()
+            self._ready.set()
+        self._thread.join()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lags = list(self._lags)
+            return dict(
+                self._counters,
+                depth=len(self._pending),
+                enqueued=self.enqueued,
+                applied=self.applied,
+                lag_ms=round((time.monotonic() - self._oldest) * 1000, 2) if self._pending else 0.0,
+                apply_lag_ms=summary_ms(lags, (50, 99)),
+            )
+
+    def _run(self) -> None:
+        while True:
+            self._ready.wait()
+            self._urgent.wait(self.interval)
+            with self._lock:
+                self._ready.clear()
+                self._urgent.clear()
+                batch, self._pending = self._pending, []
+                oldest = self._oldest
+                closed = self._closed
+            failed = self.analytics.log_batch(batch) if batch else 0
+            with self._lock:
+                self._counters['errors'] += failed
+                self.applied += len(batch)
+                if batch:
+                    self._counters['batches'] += 1
+                    # Queue-to-applied time of the batch's oldest event
+                    self._lags.append(time.monotonic() - oldest)
+                self._done.notify_all()
+                if closed and not self._pending:
+                    return
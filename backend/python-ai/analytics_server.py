@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+# analytics_server.py
+# One analytics store shared by several server worker processes. Each
+# worker used to hold its own `EmotionAnalytics`, so /api/analytics and
+# /api/mood-advice answered differently depending on which worker took the
+# request. With ANALYTICS_SERVER set, a single local aggregator process owns
+# the store (and its durable log) and the workers use `RemoteAnalytics`,
+# which talks to it over a `multiprocessing.connection` socket.
+#
+# The server is single-threaded. Each round it reads every message that has
+# arrived, applies all logged events, then answers the queries, so a query
+# sees every event that any worker had sent before asking.
+#
+# Run it with `python analytics_server.py` (same ANALYTICS_* environment as
+# app.py), or let the first worker that finds no server start it.
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing.connection import Client, Connection, Listener, Pipe, wait
+from queue import Empty, Full, LifoQueue
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from analytics import MAX_EVENTS_PER_USER, EmotionAnalytics
+from analytics_log import AnalyticsLog, LogLocked
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_KEY_PATH = os.path.join(HERE, 'analytics_server.key')
+
+Address = Union[str, Tuple[str, int]]
+
+logger = logging.getLogger(__name__)
+
+
+class AnalyticsUnavailable(ConnectionError):
+    """The analytics server could not be reached or did not answer in time."""
+
+
+def parse_address(value: str) -> Address:
+    """'host:port' -> (host, port) for TCP; anything else is a Unix socket path."""
+    host, sep, port = value.rpartition(':')
+    if sep and port.isdigit():
+        return host or '127.0.0.1', int(port)
+    return value
+
+
+def load_authkey(path: str = DEFAULT_KEY_PATH) -> bytes:
+    """ANALYTICS_SERVER_AUTHKEY, or else a random key stored in `path`.
+
+    The key file is created (mode 0600) by the first process that needs it
+    and read by the others.
+    """
+    key = os.environ.get('ANALYTICS_SERVER_AUTHKEY')
+    if key:
+        return key.encode('utf-8')
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        # Another process may still be writing it
+        for _ in range(100):
+            with open(path, 'rb') as f:
+                key = f.read().strip()
+            if key:
+                return key
+            time.sleep(0.01)
+        raise ValueError(f"{path} is empty")
+    key = os.urandom(32).hex()
+    os.write(fd, key.encode('ascii'))
+    os.close(fd)
+    return key.encode('ascii')
+
+
+def spawn_server(address: Address, authkey: bytes) -> subprocess.Popen:
+    """Start `python analytics_server.py` detached from the calling worker."""
+    host_port = f"{address[0]}:{address[1]}" if isinstance(address, tuple) else address
+    env = dict(os.environ, ANALYTICS_SERVER=host_port, ANALYTICS_SERVER_AUTHKEY=authkey.decode('ascii'))
+    return subprocess.Popen([sys.executable, os.path.abspath(__file__)], env=env, cwd=HERE,
+                            stdin=subprocess.DEVNULL, start_new_session=True)
+
+
+class AnalyticsServer:
+    """Serves one `EmotionAnalytics` to `RemoteAnalytics` clients.
+
+    Messages are tuples. ('log', events), a list of (user_id, timestamp,
+    emotion, confidence, text_length) events, gets no reply; ('trends',
+    user_id, days) and ('stats',) are answered on the same connection with
+    ('ok', value) or ('error', message).
+    """
+
+    def __init__(self, analytics: EmotionAnalytics, address: Address, authkey: bytes):
+        self.analytics = analytics
+        self.listener = Listener(address, authkey=authkey)
+        self.address = self.listener.address
+        self._conns: List[Connection] = []
+        self._accepted: List[Connection] = []
+        self._wake_recv, self._wake_send = Pipe(duplex=False)
+        self._lock = threading.Lock()
+        self._closed = False
+        self._counters = {'connections': 0, 'rounds': 0, 'messages': 0, 'events': 0, 'failed_events': 0,
+                          'queries': 0}
+
+    def serve_forever(self) -> None:
+        threading.Thread(target=self._accept, name='analytics-accept', daemon=True).start()
+        while not self._closed:
+            ready = wait(self._conns + [self._wake_recv])
+            if self._wake_recv in ready:
+                while self._wake_recv.poll():
+                    self._wake_recv.recv_bytes()
+                with self._lock:
+                    # New connections may already carry messages
+                    accepted, self._accepted = self._accepted, []
+                self._conns += accepted
+                ready = [c for c in ready if c is not self._wake_recv] + accepted
+            self._round(ready)
+
+    def close(self) -> None:
+        self._closed = True
+        self.listener.close()
+        self._wake_send.send_bytes(b'')
+
+    def _accept(self) -> None:
+        while not self._closed:
+            try:
+                conn = self.listener.accept()
+            except OSError:
+                if self._closed:
+                    return
+                continue  # failed handshake (e.g. wrong authkey)
+            with self._lock:
+                self._accepted.append(conn)
+                self._counters['connections'] += 1
+            self._wake_send.send_bytes(b'')
+
+    def _round(self, ready: List[Connection]) -> None:
+        logged: List[Any] = []
+        queries: List[Tuple[Connection, Any]] = []
+        for conn in ready:
+            try:
+                while conn.poll():
+                    message = conn.recv()
+                    if message[0] == 'log':
+                        logged.append(message[1])
+                    else:
+                        queries.append((conn, message))
+            except (EOFError, OSError, TypeError, IndexError):
+                self._drop(conn)
+        counters = self._counters
+        counters['rounds'] += 1
+        counters['messages'] += len(logged) + len(queries)
+        # Every event that has arrived is applied before any query is answered
+        for events in logged:
+            counters['events'] += len(events)
+            counters['failed_events'] += self.analytics.log_batch(events)
+        for conn, message in queries:
+            counters['queries'] += 1
+            try:
+                if message[0] == 'trends':
+                    reply = ('ok', self.analytics.get_emotion_trends(message[1], message[2]))
+                elif message[0] == 'stats':
+                    reply = ('ok', dict(self.analytics.stats(), server=dict(counters)))
+                else:
+                    reply = ('error', f"unknown message {message[0]!r}")
+            except Exception as e:
+                reply = ('error', str(e))
+            try:
+                conn.send(reply)
+            except OSError:
+                self._drop(conn)
+
+    def _drop(self, conn: Connection) -> None:
+        if conn in self._conns:
+            self._conns.remove(conn)
+        conn.close()
+
+
+class RemoteAnalytics:
+    """`EmotionAnalytics` stand-in backed by an `AnalyticsServer`.
+
+    Logged events are sent without waiting for a reply, one message per
+    call; trend and stats queries take a connection from a small pool and
+    wait for the answer. If the server cannot be reached and `spawn` is
+    set, it is started (`spawn_server`) and connecting is retried for up to
+    `connect_timeout` seconds. Events that cannot be sent are counted in
+    `send_errors` and dropped; queries that fail or get no answer within
+    `query_timeout` seconds raise AnalyticsUnavailable.
+    """
+
+    def __init__(self, address: Address, authkey: bytes, spawn: bool = False, connect_timeout: float = 10.0,
+                 query_timeout: float = 5.0, pool_size: int = 8):
+        self.address = address
+        self.authkey = authkey
+        self.spawn = spawn
+        self.connect_timeout = connect_timeout
+        self.query_timeout = query_timeout
+        self._sender: Optional[Connection] = None
+        self._send_lock = threading.Lock()
+        self._pool: 'LifoQueue[Connection]' = LifoQueue(maxsize=pool_size)
+        self._spawn_lock = threading.Lock()
+        self._spawned_at = float('-inf')
+        self.send_errors = 0
+
+    def log_emotion(self, user_id: str, emotion: str, confidence: float, text_length: int = 0,
+                    timestamp: Optional[float] = None):
+        when = time.time() if timestamp is None else timestamp
+        self.log_batch([(user_id, when, emotion, confidence, text_length)])
+
+    def log_emotions(self, user_id: str, events: List[Tuple[str, float, int]], timestamp: Optional[float] = None):
+        when = time.time() if timestamp is None else timestamp
+        self.log_batch([(user_id, when, emotion, confidence, length) for emotion, confidence, length in events])
+
+    def log_batch(self, events: Iterable[Tuple[str, float, str, float, int]]) -> int:
+        """Send (user_id, timestamp, emotion, confidence, text_length) events;
+        returns how many could not be sent."""
+        events = list(events)
+        if not events:
+            return 0
+        with self._send_lock:
+            for _ in range(2):  # a broken connection (server restarted) is replaced once
+                try:
+                    if self._sender is None:
+                        self._sender = self._connect()
+                    self._sender.send(('log', events))
+                    return 0
+                except (OSError, EOFError):
+                    if self._sender is not None:
+                        self._sender.close()
+                        self._sender = None
+            self.send_errors += len(events)
+        return len(events)
+
+    def get_emotion_trends(self, user_id: str, days: int = 7) -> Dict[str, Any]:
+        return self._query(('trends', user_id, days))
+
+    def stats(self) -> Dict[str, Any]:
+        """The server's analytics, log and server counters, plus this client's send errors."""
+        return dict(self._query(('stats',)), send_errors=self.send_errors)
+
+    def close(self) -> None:
+        with self._send_lock:
+            if self._sender is not None:
+                self._sender.close()
+                self._sender = None
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except Empty:
+                return
+
+    def _query(self, message: Tuple) -> Any:
+        for attempt in range(2):
+            try:
+                conn = self._pool.get_nowait()
+            except Empty:
+                conn = self._connect()
+            try:
+                conn.send(message)
+                if not conn.poll(self.query_timeout):
+                    # The late answer would be read by the next query on this connection
+                    conn.close()
+                    raise AnalyticsUnavailable(
+                        f"analytics server at {self.address} did not answer within {self.query_timeout}s")
+                status, value = conn.recv()
+            except AnalyticsUnavailable:
+                raise
+            except (OSError, EOFError) as e:
+                conn.close()
+                if attempt:
+                    raise AnalyticsUnavailable(f"analytics server at {self.address} failed: {e}") from e
+                continue
+            try:
+                self._pool.put_nowait(conn)
+            except Full:
+                conn.close()
+            if status != 'ok':
+                raise RuntimeError(value)
+            return value
+
+    def _connect(self) -> Connection:
+        deadline = time.monotonic() + self.connect_timeout
+        while True:
+            try:
+                return Client(self.address, authkey=self.authkey)
+            except (FileNotFoundError, ConnectionRefusedError) as e:
+                if self.spawn:
+                    # One server start per timeout, however many threads are connecting
+                    with self._spawn_lock:
+                        if time.monotonic() - self._spawned_at > self.connect_timeout:
+                            spawn_server(self.address, self.authkey)
+                            self._spawned_at = time.monotonic()
+                if time.monotonic() > deadline:
+                    raise AnalyticsUnavailable(f"no analytics server at {self.address}") from e
+                time.sleep(0.05)
+
+
+def _lock_file(path: str):
+    # Held for the server's lifetime: only one server per Unix socket path
+    lock = open(path, 'a')
+    if fcntl is not None:
+        try:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock.close()
+            return None
+    return lock
+
+
+def main() -> int:
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+    address = parse_address(os.environ.get('ANALYTICS_SERVER') or os.path.join(HERE, 'analytics.sock'))
+    authkey = load_authkey()
+    if isinstance(address, str):
+        lock = _lock_file(address + '.lock')
+        if lock is None:
+            logger.info('An analytics server for %s is already running', address)
+            return 0
+        if os.path.exists(address):
+            os.remove(address)  # left behind by a server that died
+
+    analytics = EmotionAnalytics(max_events=int(os.environ.get('ANALYTICS_MAX_EVENTS', str(MAX_EVENTS_PER_USER))))
+    log_dir = os.environ.get('ANALYTICS_LOG_DIR', os.path.join(HERE, 'analytics_log'))
+    log = None
+    if log_dir:
+        log = AnalyticsLog(
+            log_dir,
+            flush_interval=float(os.environ.get('ANALYTICS_FLUSH_INTERVAL', '0.05')),
+            fsync=os.environ.get('ANALYTICS_FSYNC', '1') not in ('0', 'false', 'False'),
+            snapshot_every=int(os.environ.get('ANALYTICS_SNAPSHOT_EVERY', '1000000')),
+        )
+        try:
+            recovery = log.attach(analytics)
+        except LogLocked as e:
+            logger.error('%s; is another analytics server (or a worker without ANALYTICS_SERVER) running?', e)
+            return 1
+        logger.info('Analytics recovered from %s: %d events from snapshot, %d replayed in %.0f ms',
+                    log_dir, recovery['recovered_events'], recovery['replayed_events'], recovery['recovery_ms'])
+
+    try:
+        server = AnalyticsServer(analytics, address, authkey)
+    except OSError as e:
+        logger.info('Could not listen on %s (%s); another analytics server is probably running', address, e)
+        if log is not None:
+            log.close(snapshot=False)
+        return 0
+    logger.info('Analytics server listening on %s', server.address)
+    try:
+        import signal
+        signal.signal(signal.SIGTERM, lambda *_: server.close())
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if log is not None:
+            log.close()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
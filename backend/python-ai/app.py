@@ -8,15 +8,52 @@ High-level architecture and purpose:
      CORS headers to make that easy).
 
  - Endpoints provided:
-         POST /api/summarize  -> accepts JSON { text } and returns { summary, sentences }
+         POST /api/summarize  -> accepts JSON { text } and returns { summary, sentences, spans }
+         POST /api/summarize/stream -> accepts a (chunked) text/plain body and returns { summary, sentences }
+         POST /api/conversations/<id>/messages -> add a message to a running conversation summary
+         GET  /api/conversations/<id>/summary  -> current running summary of a conversation
          POST /api/classify   -> accepts JSON { text } and returns { label, score, matched }
+         POST /api/classify/batch -> accepts JSON { texts: [...] } and returns { results: [...] }
+         GET  /api/cache/stats -> response cache hit/miss/eviction counters
+         GET  /api/analytics/stats -> analytics users/events, ingestion queue depth/lag, durable log and analytics server counters
+         POST /api/pipeline   -> classify + rewrite + mood advice (+ analytics, summary) of one message
+                                 in a single round trip, with per-stage timings
+         POST /api/classify/draft -> incremental classify-as-you-type for a draft id
          POST /api/compress   -> accepts image bytes or multipart file 'image' and returns JPEG bytes
+                                 (?dedupe=1 answers near-duplicates of earlier uploads with a reference)
+         POST /api/compress/jobs -> queue a compression, returns { job_id } (202) immediately
+         GET  /api/compress/jobs/<id> -> job status (?wait=N long-polls)
+         GET  /api/compress/jobs/<id>/result -> the JPEG, once
+         GET  /api/compress/jobs/stats -> pending jobs and job latency percentiles
+         POST /api/compress/renditions -> several sizes/formats from one decode, as multipart/form-data
+         POST /api/compress/mesh -> like /api/compress, but returns the JPEG as mesh chunk messages
+         POST /api/mesh/messages -> feed received chunk / re-request messages; returns completed payloads
+         GET  /api/mesh/stats -> chunk outbox / reassembly counters
+         GET  /api/compress/stats -> compression pool queue depth, rejections and timings
+         GET  /api/compress/cache/stats -> compressed-image cache hit rate and bytes saved
+         POST /api/rewrite    -> accepts JSON { text, tone } and returns the rewritten text
+         GET  /api/analytics  -> a user's emotion trends (?user_id, ?days, ?fresh=1)
+         POST /api/mood-advice -> accepts JSON { emotion } and returns advice given the user's last day of emotions
          GET  /health         -> simple health check (returns { status: 'ok' })
 
- - This file wires together three helper modules in the same folder:
+ - This file wires together the helper modules in the same folder:
          `classifier.py`  - rule-based emergency-style message classifier
          `summarizer.py`  - small extractive TF-IDF based summarizer
+         `tone_rewriter.py` - rule-based tone rewrites of a message
+         `mood_advisor.py` - advice from emotion trends
          `compressor.py`  - image decode/resize/re-encode helper using OpenCV
+         `compress_pool.py` - process pool + bounded queue the compression runs in
+         `compress_jobs.py` - job table behind the asynchronous compression API
+         `latency.py`     - percentile summaries of timing samples for the stats endpoints
+         `image_cache.py` - content-addressed memory/disk cache of compressed images
+         `image_index.py` - perceptual-hash index for near-duplicate image lookup
+         `uploads.py`     - size-capped spooling of image uploads (memory, then temp file)
+         `mesh_chunks.py` - MTU-sized chunking / reassembly of payloads as mesh WireMsg messages
+         `pipeline.py`    - shared per-message analysis context and stage timing for /api/pipeline
+         `analytics.py`   - per-user emotion event store and trend queries
+         `analytics_log.py` - group-committed event log + snapshots that persist the analytics
+         `analytics_queue.py` - queue that applies analytics events off the request path
+         `analytics_server.py` - analytics server process shared by several workers
 
  - Execution / configuration:
          * The app binds to the host and port from the environment (PORT, BIND_HOST)
@@ -24,25 +61,50 @@ High-level architecture and purpose:
              `@app.after_request`. Use `ALLOW_ALL_CORS=0` in production if you need
              stricter policies.
 
-This file is intentionally small: it handles request parsing, validation,
-error handling, and delegates core work to the helper modules above.
+Besides request parsing, validation and error handling, this file holds the
+glue that spans several modules and is configured from the environment: the
+response cache, the draft / conversation session stores, the compression
+plan (image cache + near-duplicate index + process pool, shared by the sync,
+jobs and mesh endpoints) and the analytics backend setup. Core work stays in
+the helper modules above.
 """
 from __future__ import annotations
+import atexit
+import base64
+import codecs
+import hashlib
 import io
+import json
 import os
-from typing import List
+import re
+import socket
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from flask import Flask, request, jsonify, send_from_directory, abort, Response
 import logging
 import logging
 
 try:
-    from classifier import classify_text
-    from summarizer import ExtractiveSummarizer, split_sentences
-    from compressor import compress_image
+    from classifier import classify_text, classify_batch, IncrementalClassifier
+    from summarizer import CorpusIdf, ExtractiveSummarizer, RunningSummary, split_sentences
+    from compressor import compress_file, compress_renditions, compress_with_hash, image_hash, probe_image_header
     from tone_rewriter import get_rewrite_suggestions, rewrite_tone
+    from compress_pool import CompressionPool, PoolBusy
+    from compress_jobs import FAILED, PENDING, JobTable, JobTableFull
+    from image_cache import ImageCache, new_input_hasher
+    from image_index import HashIndex
+    from uploads import SpooledUpload, UploadTooLarge, spool_multipart, spool_stream
+    from mesh_chunks import NACK_TYPE, ChunkOutbox, Reassembler, make_ref
     from analytics import analytics
+    from analytics_log import AnalyticsLog, LogLocked
+    from analytics_queue import IngestQueue
+    from analytics_server import AnalyticsUnavailable, RemoteAnalytics, load_authkey, parse_address
     from mood_advisor import get_mood_advice, format_advice_for_display
+    from pipeline import DEFAULT_STAGES, AnalysisContext, StageTimer, parse_stages
 except Exception as e:
     # Import error will be raised at runtime if modules are missing; keep app importable for tests
     raise
@@ -54,6 +116,375 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(me
 logger = logging.getLogger(__name__)
 
 
+class ResponseCache:
+    """Bounded LRU + TTL cache for the pure part of the text endpoints.
+
+    Mesh flooding delivers the same message to /api/classify, /api/summarize
+    and /api/rewrite many times, often concurrently. Entries are keyed by a
+    SHA-256 of (endpoint, text, params). Concurrent misses for the same key
+    are coalesced ("single-flight"): the first caller computes, the others
+    wait on its Future and share the result. Exceptions are propagated to
+    every waiter and never cached.
+
+    Only deterministic results are cached; per-request side effects (such as
+    analytics logging) stay in the endpoint handlers.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: 'OrderedDict[str, Tuple[float, Any]]' = OrderedDict()
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def make_key(endpoint: str, text: str, params: Dict[str, Any] = None) -> str:
+        payload = json.dumps([endpoint, text, params or {}], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get_or_compute(self, endpoint: str, text: str, params: Dict[str, Any],
+                       compute: Callable[[], Any]) -> Any:
+        if self.max_entries <= 0:
+            return compute()
+
+        key = self.make_key(endpoint, text, params)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+                self.expirations += 1
+
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                future = Future()
+                self._inflight[key] = future
+                self.misses += 1
+                leader = True
+
+        if not leader:
+            return future.result()
+
+        try:
+            value = compute()
+        except BaseException as e:
+            with self._lock:
+                del self._inflight[key]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            del self._inflight[key]
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        future.set_result(value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'inflight': len(self._inflight),
+                'hit_rate': round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+            }
+
+
+# Shared cache for the text endpoints. Set RESPONSE_CACHE_SIZE=0 to disable.
+response_cache = ResponseCache(
+    max_entries=int(os.environ.get('RESPONSE_CACHE_SIZE', '1024')),
+    ttl=float(os.environ.get('RESPONSE_CACHE_TTL', '300')),
+)
+
+# Most messages accepted by one /api/classify/batch request (413 beyond).
+_classify_batch_max = int(os.environ.get('CLASSIFY_BATCH_MAX', '1000'))
+
+
+# Long-lived summarizer shared by all requests. Its IDF statistics are fitted
+# incrementally over every message summarized and persisted to
+# SUMMARIZER_IDF_PATH (every SUMMARIZER_IDF_SAVE_EVERY requests and at exit)
+# so they survive restarts. Set SUMMARIZER_IDF_PATH='' to keep them in memory.
+_idf_path = os.environ.get(
+    'SUMMARIZER_IDF_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'summarizer_idf.npz')
+)
+_idf_save_every = int(os.environ.get('SUMMARIZER_IDF_SAVE_EVERY', '100'))
+try:
+    summarizer = ExtractiveSummarizer(idf_model=CorpusIdf.load_or_create(_idf_path))
+except Exception:
+    logger.exception('Could not load summarizer IDF model from %s; starting empty', _idf_path)
+    summarizer = ExtractiveSummarizer(idf_model=CorpusIdf())
+_idf_unsaved = 0
+_idf_save_lock = threading.Lock()
+
+
+def _save_idf_model(force: bool = False) -> None:
+    global _idf_unsaved
+    if not _idf_path:
+        return
+    with _idf_save_lock:
+        if not force and _idf_unsaved < _idf_save_every:
+            return
+        _idf_unsaved = 0
+        try:
+            summarizer.idf_model.save(_idf_path)
+        except OSError:
+            logger.exception('Could not save summarizer IDF model to %s', _idf_path)
+
+
+def _summarize_and_track(text: str, max_sentences: int,
+                         context: AnalysisContext = None) -> List[Tuple[int, int]]:
+    global _idf_unsaved
+    if context is None:
+        spans = summarizer.summarize_spans(text, max_sentences=max_sentences)
+    else:
+        spans = summarizer.summarize_spans(text, max_sentences=max_sentences, spans=context.spans,
+                                           tokens=lambda: context.tokens)
+    result = [tuple(span) for span in spans.tolist()]
+    with _idf_save_lock:
+        _idf_unsaved += 1
+    _save_idf_model()
+    return result
+
+
+atexit.register(_save_idf_model, True)
+
+
+class SessionStore:
+    """Bounded store of per-key incremental state (drafts, conversations).
+
+    Sessions are created on first use with `factory()`. Least recently used
+    sessions are dropped once `max_sessions` is reached, and sessions idle
+    for longer than `ttl` seconds are dropped on access.
+    """
+
+    def __init__(self, factory: Callable[[], Any], max_sessions: int = 10000, ttl: float = 900.0):
+        self.factory = factory
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions: 'OrderedDict[str, Tuple[float, Any]]' = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: str, create: bool = True) -> Any:
+        """Return the session for `key`, creating it if needed (and allowed).
+
+        Callers must hold `lock` while using the returned session.
+        """
+        now = time.monotonic()
+        entry = self._sessions.pop(key, None)
+        if entry is None or entry[0] + self.ttl < now:
+            if not create:
+                return None
+            session = self.factory()
+        else:
+            session = entry[1]
+        self._sessions[key] = (now, session)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+        # Opportunistically expire idle sessions from the cold end
+        while self._sessions:
+            oldest_key, (last_used, _) = next(iter(self._sessions.items()))
+            if last_used + self.ttl >= now:
+                break
+            del self._sessions[oldest_key]
+        return session
+
+    def discard(self, key: str) -> None:
+        self._sessions.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+draft_sessions = SessionStore(
+    IncrementalClassifier,
+    max_sessions=int(os.environ.get('DRAFT_SESSIONS_MAX', '10000')),
+    ttl=float(os.environ.get('DRAFT_SESSION_TTL', '900')),
+)
+
+# Image decode/resize/encode runs in a process pool behind a bounded queue.
+# A full queue is answered with 503 + Retry-After rather than piling up.
+# Forking a threaded process can deadlock the child on a copied lock, so
+# forked workers are started here, before the analytics threads below exist
+# (a pool restarted after a worker crash is still forked later on).
+# COMPRESS_START_METHOD=forkserver avoids that under gunicorn; it needs every
+# __main__ module that imports this one to be import-safe.
+compress_pool = CompressionPool(
+    workers=int(os.environ.get('COMPRESS_WORKERS', '0')) or None,
+    queue_size=int(os.environ['COMPRESS_QUEUE_SIZE']) if 'COMPRESS_QUEUE_SIZE' in os.environ else None,
+    start_method=os.environ.get('COMPRESS_START_METHOD') or None,
+)
+if compress_pool.mp_context.get_start_method() == 'fork':
+    compress_pool.start()
+_compress_timeout = float(os.environ.get('COMPRESS_TIMEOUT', '60'))
+atexit.register(compress_pool.shutdown, False)
+
+# Asynchronous compression jobs: bounded table, unfetched results expire.
+compress_jobs = JobTable(
+    max_jobs=int(os.environ.get('COMPRESS_JOBS_MAX', '1000')),
+    ttl=float(os.environ.get('COMPRESS_JOB_TTL', '300')),
+)
+MAX_JOB_WAIT = 30.0
+
+# Perceptual hashes of compressed outputs, so clients that opt in (dedupe=1)
+# get near-duplicate uploads (resent screenshots, small edits) answered with a
+# reference to the output already made instead of a fresh compression.
+image_index = HashIndex(max_entries=int(os.environ.get('PHASH_INDEX_MAX', '100000')))
+_phash_max_distance = int(os.environ.get('PHASH_MAX_DISTANCE', '6'))
+
+# Image uploads are spooled (memory up to COMPRESS_SPOOL_BYTES, then a temp
+# file that workers mmap) under a hard byte limit, and rejected from the
+# header alone when the pixel count is over the limit.
+_upload_max_bytes = int(os.environ.get('COMPRESS_MAX_UPLOAD_BYTES', str(25 * 2 ** 20)))
+_upload_max_pixels = int(os.environ.get('COMPRESS_MAX_PIXELS', str(50 * 10 ** 6)))
+_upload_spool_bytes = int(os.environ.get('COMPRESS_SPOOL_BYTES', str(2 ** 20)))
+_upload_spool_dir = os.environ.get('UPLOAD_SPOOL_DIR') or None
+
+# Compressed images sent over the mesh are split into MTU-sized WireMsg
+# chunks; the outbox keeps recent payloads to answer re-requests, the
+# reassembler collects incoming chunks (bounded memory, idle timeout).
+_mesh_node_id = os.environ.get('MESH_NODE_ID') or socket.gethostname()
+_mesh_mtu = int(os.environ.get('MESH_MTU', '1200'))
+mesh_outbox = ChunkOutbox(_mesh_node_id, mtu=_mesh_mtu)
+mesh_inbox = Reassembler(
+    _mesh_node_id,
+    mtu=_mesh_mtu,
+    timeout=float(os.environ.get('MESH_TRANSFER_TIMEOUT', '30')),
+    nack_after=float(os.environ.get('MESH_NACK_AFTER', '1.0')),
+)
+
+# Content-addressed cache of compressed outputs: in-memory LRU plus a
+# size-capped directory that survives restarts (IMAGE_CACHE_DIR='' keeps it
+# in memory only).
+image_cache = ImageCache(
+    directory=os.environ.get(
+        'IMAGE_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'image_cache')
+    ),
+    memory_bytes=int(os.environ.get('IMAGE_CACHE_MEMORY_BYTES', str(32 * 2 ** 20))),
+    disk_bytes=int(os.environ.get('IMAGE_CACHE_DISK_BYTES', str(512 * 2 ** 20))),
+)
+
+# Emotion analytics are persisted to ANALYTICS_LOG_DIR: events are
+# group-committed to a segment log by a background flusher (at most
+# ANALYTICS_FLUSH_INTERVAL seconds after the request) and snapshotted every
+# ANALYTICS_SNAPSHOT_EVERY events; startup loads the snapshot and replays
+# the log after it. Set ANALYTICS_LOG_DIR='' to keep analytics in memory only.
+# Only one process can own the log: with several workers, set
+# ANALYTICS_SERVER (host:port or a Unix socket path) so they share one
+# analytics server process (analytics_server.py) that owns the store and
+# the log; the first worker that finds none starts it unless
+# ANALYTICS_SERVER_SPAWN=0. ANALYTICS_SERVER_AUTHKEY sets the shared key
+# (default: a random key kept in analytics_server.key). Trend queries that
+# get no answer within ANALYTICS_SERVER_TIMEOUT seconds (default 5) fail
+# with a 503.
+analytics.max_events = int(os.environ.get('ANALYTICS_MAX_EVENTS', str(analytics.max_events)))
+_analytics_server = os.environ.get('ANALYTICS_SERVER', '')
+_analytics_log_dir = '' if _analytics_server else os.environ.get(
+    'ANALYTICS_LOG_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'analytics_log')
+)
+analytics_backend = analytics
+analytics_log = None
+if _analytics_server:
+    analytics_backend = RemoteAnalytics(
+        parse_address(_analytics_server),
+        load_authkey(),
+        spawn=os.environ.get('ANALYTICS_SERVER_SPAWN', '1') not in ('0', 'false', 'False'),
+        query_timeout=float(os.environ.get('ANALYTICS_SERVER_TIMEOUT', '5')),
+    )
+    atexit.register(analytics_backend.close)
+    try:
+        logger.info('Using analytics server at %s (%d users)', _analytics_server,
+                    analytics_backend.stats()['users'])
+    except Exception:
+        # Keep serving; events are retried against the server as they come
+        logger.exception('Analytics server at %s is not reachable yet', _analytics_server)
+if _analytics_log_dir:
+    analytics_log = AnalyticsLog(
+        _analytics_log_dir,
+        flush_interval=float(os.environ.get('ANALYTICS_FLUSH_INTERVAL', '0.05')),
+        fsync=os.environ.get('ANALYTICS_FSYNC', '1') not in ('0', 'false', 'False'),
+        snapshot_every=int(os.environ.get('ANALYTICS_SNAPSHOT_EVERY', '1000000')),
+    )
+    try:
+        recovery = analytics_log.attach(analytics)
+        logger.info('Analytics recovered from %s: %d events from snapshot, %d replayed in %.0f ms',
+                    _analytics_log_dir, recovery['recovered_events'], recovery['replayed_events'],
+                    recovery['recovery_ms'])
+        atexit.register(analytics_log.close)
+    except LogLocked:
+        logger.warning('%s is in use by another process; this worker keeps its analytics in memory only '
+                       '(set ANALYTICS_SERVER to share analytics between workers)', _analytics_log_dir)
+        analytics_log = None
+    except Exception:
+        # Leave the files alone so nothing is overwritten; run in memory only
+        logger.exception('Could not recover analytics from %s; not persisting analytics', _analytics_log_dir)
+        analytics_log.close(snapshot=False)  # releases the directory lock
+        analytics_log = None
+
+# Handlers queue analytics events; a background consumer applies them every
+# ANALYTICS_APPLY_INTERVAL seconds (ANALYTICS_QUEUE=0 applies them inline).
+# Readers that need the latest events (mood advice, the pipeline's advice
+# and analytics stages, /api/analytics?fresh=1) flush the queue first unless
+# ANALYTICS_FLUSH_ON_READ=0. Registered after the log so it closes first.
+analytics_queue = None
+if os.environ.get('ANALYTICS_QUEUE', '1') not in ('0', 'false', 'False'):
+    analytics_queue = IngestQueue(
+        analytics_backend,
+        interval=float(os.environ.get('ANALYTICS_APPLY_INTERVAL', '0.005')),
+        max_pending=int(os.environ.get('ANALYTICS_QUEUE_MAX', '100000')),
+    )
+    atexit.register(analytics_queue.close)
+analytics_ingest = analytics_queue if analytics_queue is not None else analytics_backend
+_analytics_flush_on_read = os.environ.get('ANALYTICS_FLUSH_ON_READ', '1') not in ('0', 'false', 'False')
+
+
+def _user_id(data: Dict[str, Any]) -> str:
+    """The request's analytics user id ('anonymous' if absent); ValueError unless a string."""
+    user_id = data.get('user_id', 'anonymous')
+    if not isinstance(user_id, str):
+        raise ValueError('user_id must be a string')
+    return user_id
+
+
+def _fresh_trends(user_id: str, days: int, flush: bool = True) -> Dict[str, Any]:
+    """Trends of a user, including queued events when `flush` (and flush-on-read) is on."""
+    if flush and analytics_queue is not None and _analytics_flush_on_read:
+        analytics_queue.flush()
+    return analytics_backend.get_emotion_trends(user_id, days)
+
+# Running summaries per conversation (see summarizer.RunningSummary)
+conversations = SessionStore(
+    lambda: RunningSummary(max_sentences=3),
+    max_sessions=int(os.environ.get('CONVERSATIONS_MAX', '10000')),
+    ttl=float(os.environ.get('CONVERSATION_TTL', str(7 * 24 * 3600))),
+)
+
+
 @app.route('/')
 def index():
     # Serve the single-page app index.html when visiting '/'. If you build the
@@ -73,11 +504,98 @@ def api_summarize():
         return jsonify({'error': 'missing text'}), 400
 
     text = data['text']
-    # Delegate actual summarization to the ExtractiveSummarizer helper. It
-    # returns a list of selected sentences; we also provide a single joined
-    # string for simple display in the frontend.
-    summarizer = ExtractiveSummarizer()
-    summary = summarizer.summarize(text, max_sentences=3)
+    # Delegate actual summarization to the shared ExtractiveSummarizer. It
+    # returns the (start, end) offsets of the selected sentences, which we
+    # also return so the UI can highlight them in place (offsets count
+    # Unicode code points). Only the selected sentences are copied out, plus
+    # a single joined string for simple display in the frontend. Cached
+    # repeats (e.g. mesh floods of one message) don't count again in the
+    # corpus statistics.
+    spans = response_cache.get_or_compute(
+        'summarize', text, {'max_sentences': 3},
+        lambda: _summarize_and_track(text, 3)
+    )
+    summary = [text[start:end] for start, end in spans]
+    return jsonify({
+        'summary': ' '.join(summary),
+        'sentences': summary,
+        'spans': [[start, end] for start, end in spans]
+    })
+
+
+@app.route('/api/conversations/<conversation_id>/messages', methods=['POST'])
+def api_conversation_message(conversation_id: str):
+    """Add a message to a conversation's running summary.
+
+    JSON body: { text }. The summary is updated in time proportional to the
+    new message instead of re-summarizing the whole history.
+    """
+    data = request.get_json(force=True, silent=True)
+    if not data or not isinstance(data.get('text'), str):
+        return jsonify({'error': 'missing text'}), 400
+
+    with conversations.lock:
+        running = conversations.get(conversation_id)
+        summary = list(running.add_message(data['text']))
+        n_messages = running.n_messages
+
+    return jsonify({
+        'conversation_id': conversation_id,
+        'messages': n_messages,
+        'summary': ' '.join(summary),
+        'sentences': summary
+    })
+
+
+@app.route('/api/conversations/<conversation_id>/summary', methods=['GET'])
+def api_conversation_summary(conversation_id: str):
+    """Read the current running summary of a conversation."""
+    with conversations.lock:
+        running = conversations.get(conversation_id, create=False)
+        if running is None:
+            return jsonify({'error': 'unknown conversation'}), 404
+        summary = list(running.summary())
+        n_messages = running.n_messages
+
+    return jsonify({
+        'conversation_id': conversation_id,
+        'messages': n_messages,
+        'summary': ' '.join(summary),
+        'sentences': summary
+    })
+
+
+def _iter_request_text(chunk_size: int = 64 * 1024):
+    """Yield the request body as decoded text chunks without buffering it."""
+    decoder = codecs.getincrementaldecoder(request.mimetype_params.get('charset', 'utf-8'))(errors='replace')
+    stream = request.stream
+    while True:
+        raw = stream.read(chunk_size)
+        if not raw:
+            break
+        yield decoder.decode(raw)
+    yield decoder.decode(b'', final=True)
+
+
+@app.route('/api/summarize/stream', methods=['POST'])
+def api_summarize_stream():
+    """Summarize a large plain-text body (e.g. an incident log) as a stream.
+
+    The body is read in chunks (chunked transfer encoding is fine) and fed
+    to the map-reduce `summarize_stream`, so memory stays flat regardless of
+    the body size. Optional query parameter: max_sentences (default 3).
+    """
+    try:
+        max_sentences = int(request.args.get('max_sentences', 3))
+    except ValueError:
+        return jsonify({'error': 'max_sentences must be an integer'}), 400
+    if max_sentences < 1:
+        return jsonify({'error': 'max_sentences must be at least 1'}), 400
+
+    try:
+        summary = summarizer.summarize_stream(_iter_request_text(), max_sentences=max_sentences)
+    except LookupError:
+        return jsonify({'error': 'unsupported charset'}), 400
     return jsonify({'summary': ' '.join(summary), 'sentences': summary})
 
 
@@ -95,17 +613,23 @@ def api_classify():
         return jsonify({'error': 'missing text'}), 400
 
     text = data['text']
-    user_id = data.get('user_id', 'anonymous')
+    try:
+        user_id = _user_id(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
     # classify_text is a small, deterministic substring matcher (see
-    # classifier.py). It returns (label, score, matched_keywords).
-    label, score, matched = classify_text(text)
-    
-    # Log emotion for analytics
-    analytics.log_emotion(user_id, label, score, len(text))
+    # classifier.py). It returns (label, score, matched_keywords). Both it and
+    # the tone rewrite suggestions for negative emotions only depend on the
+    # text, so they are cached together.
+    def _classify():
+        label, score, matched = classify_text(text)
+        return label, score, matched, get_rewrite_suggestions(text, label)
+
+    label, score, matched, suggestions = response_cache.get_or_compute('classify', text, {}, _classify)
     
-    # Get tone rewrite suggestions for negative emotions
-    suggestions = get_rewrite_suggestions(text, label)
+    # Log emotion for analytics (on every request, cached or not)
+    analytics_ingest.log_emotion(user_id, label, score, len(text))
     
     return jsonify({
         'label': label, 
@@ -115,28 +639,587 @@ def api_classify():
     })
 
 
+@app.route('/api/classify/batch', methods=['POST'])
+def api_classify_batch():
+    """Classify a list of messages in one round trip.
+
+    Used by the mesh gateway when replaying backlogs. Results are identical
+    to calling /api/classify per message, and analytics are logged once for
+    the whole batch.
+    """
+    data = request.get_json(force=True, silent=True)
+    if not data or 'texts' not in data:
+        return jsonify({'error': 'missing texts'}), 400
+
+    texts = data['texts']
+    if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+        return jsonify({'error': 'texts must be a list of strings'}), 400
+    if len(texts) > _classify_batch_max:
+        return jsonify({'error': f'at most {_classify_batch_max} texts per batch'}), 413
+    try:
+        user_id = _user_id(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    classified = classify_batch(texts)
+
+    # Log the whole batch for analytics in one call
+    analytics_ingest.log_emotions(
+        user_id,
+        [(label, score, len(text)) for text, (label, score, _) in zip(texts, classified)]
+    )
+
+    results = [
+        {
+            'label': label,
+            'score': score,
+            'matched': matched,
+            'rewrite_suggestions': get_rewrite_suggestions(text, label)
+        }
+        for text, (label, score, matched) in zip(texts, classified)
+    ]
+    return jsonify({'results': results})
+
+
+@app.route('/api/classify/draft', methods=['POST'])
+def api_classify_draft():
+    """Live emotion feedback for the compose box.
+
+    JSON body: { draft_id, append } to add text at the end of the draft,
+    { draft_id, offset, text } to replace the draft from `offset` onwards,
+    { draft_id, text } to replace the whole draft, or
+    { draft_id, discard: true } to drop the session.
+
+    Offsets count Unicode code points. Only the changed part of the draft
+    is scanned. Nothing is logged to
+    analytics; the message is logged when it is sent through /api/classify.
+    """
+    data = request.get_json(force=True, silent=True)
+    if not data or not isinstance(data.get('draft_id'), str):
+        return jsonify({'error': 'missing draft_id'}), 400
+    draft_id = data['draft_id']
+
+    with draft_sessions.lock:
+        if data.get('discard'):
+            draft_sessions.discard(draft_id)
+            return jsonify({'draft_id': draft_id, 'discarded': True})
+
+        if isinstance(data.get('append'), str):
+            session = draft_sessions.get(draft_id)
+            label, score, matched = session.append(data['append'])
+        elif isinstance(data.get('text'), str):
+            offset = data.get('offset', 0)
+            if isinstance(offset, bool) or not isinstance(offset, int) or offset < 0:
+                return jsonify({'error': 'offset must be a non-negative integer'}), 400
+            session = draft_sessions.get(draft_id)
+            if offset > len(session):
+                return jsonify({'error': 'offset beyond end of draft', 'length': len(session)}), 409
+            label, score, matched = session.replace(offset, data['text'])
+        else:
+            return jsonify({'error': 'missing append or text'}), 400
+        length = len(session)
+
+    return jsonify({
+        'draft_id': draft_id,
+        'length': length,
+        'label': label,
+        'score': score,
+        'matched': matched
+    })
+
+
 @app.route('/api/compress', methods=['POST'])
-def api_compress():
-    # Expect a file field named 'image' or raw bytes in body
-    file = None
-    if 'image' in request.files:
-        file = request.files['image']
-        img_bytes = file.read()
+def api_compress(respond: Callable[..., Response] = None, resolve: Callable[[str], Any] = None):
+    # Expect a file field named 'image' or raw bytes in body. An optional
+    # `max_bytes` (query string or form field) switches to the byte-budget
+    # mode; the chosen parameters are reported in X-Compress-* headers.
+    # `respond(out, info, cache_status, key)` builds the success response.
+    # `dedupe=1` answers a near-duplicate of an earlier output with a
+    # reference to it (out is None) instead of compressing; `resolve(key)`
+    # turns that output's cache key into the reference (None: compress).
+    request.max_content_length = _upload_max_bytes
+    try:
+        upload, form = _read_image_upload()
+    except UploadTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    with upload:
+        try:
+            max_bytes, dedupe = _compress_options(form)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if not upload.size:
+            return jsonify({'error': 'no image bytes provided'}), 400
+        return _compress_upload(upload, max_bytes, respond or _compress_response, dedupe=dedupe,
+                                resolve=resolve)
+
+
+def _compress_options(form: Dict[str, str]) -> Tuple[int, bool]:
+    """(max_bytes or None, dedupe) from the query string / form; ValueError if invalid."""
+    dedupe = request.args.get('dedupe', '0') in ('1', 'true', 'True')
+    max_bytes = request.args.get('max_bytes') or form.get('max_bytes')
+    if max_bytes is not None:
+        try:
+            max_bytes = int(max_bytes)
+        except ValueError:
+            raise ValueError('max_bytes must be an integer')
+        if max_bytes <= 0:
+            raise ValueError('max_bytes must be positive')
+    return max_bytes, dedupe
+
+
+class _CompressPlan:
+    """Cache key and near-duplicate tag for one upload and set of parameters."""
+
+    def __init__(self, upload: SpooledUpload, max_bytes: int = None):
+        params = {'max_dim': 512, 'format': 'jpeg'}
+        if max_bytes is not None:
+            params['max_bytes'] = max_bytes
+        else:
+            params['quality'] = 75
+        # Near-duplicates only match outputs made with the same parameters
+        self.index_tag = json.dumps(params, sort_keys=True)
+        self.cache_key = ImageCache.make_key(upload.digest, params)
+        self.input_size = upload.size
+        self.max_bytes = max_bytes
+
+    def cached(self):
+        return image_cache.get(self.cache_key, input_size=self.input_size)
+
+    def submit(self, upload: SpooledUpload) -> Future:
+        return _submit_on_upload(upload, compress_with_hash, max_dim=512, jpeg_quality=75,
+                                 max_bytes=self.max_bytes)
+
+    def near(self, phash: int, resolve: Callable[[str], Any] = None) -> Optional[Dict[str, Any]]:
+        """Reference to an earlier output within PHASH_MAX_DISTANCE bits of `phash`, or None."""
+        match = image_index.nearest(phash, _phash_max_distance, tag=self.index_tag)
+        if match is None:
+            return None
+        ref_key, distance = match
+        if ref_key not in image_cache:
+            image_index.discard(ref_key)  # evicted from the cache
+            return None
+        ref = resolve(ref_key) if resolve is not None else ref_key
+        if ref is None:
+            return None
+        return {'near_duplicate_of': ref, 'near_duplicate_distance': distance}
+
+    def store(self, result: Tuple[bytes, Dict[str, Any], int]) -> Tuple[bytes, Dict[str, Any], str]:
+        """Cache and index a fresh result; returns (out, info, cache_status)."""
+        out, info, phash = result
+        image_cache.put(self.cache_key, out, info)
+        image_index.add(phash, self.cache_key, tag=self.index_tag)
+        return out, info, 'MISS'
+
+    def start(self, upload: SpooledUpload, dedupe: bool = False,
+              resolve: Callable[[str], Any] = None) -> Future:
+        """Future of (out, info, cache_status).
+
+        With `dedupe` the upload is first hashed from a small shrink-on-decode
+        thumbnail; a near-duplicate resolves to (None, reference, 'NEAR')
+        without being compressed. Exact repeats are `cached()` hits instead.
+        """
+        if not dedupe:
+            return _then(self.submit(upload), self.store)
+
+        def after_hash(phash: int):
+            near = self.near(phash, resolve)
+            if near is not None:
+                return None, near, 'NEAR'
+            return _then(self.submit(upload), self.store)
+        return _then(_submit_on_upload(upload, image_hash), after_hash)
+
+
+def _then(future: Future, fn: Callable[[Any], Any]) -> Future:
+    """Future of `fn(future.result())`, or of the result of the Future `fn` returns."""
+    chained: Future = Future()
+
+    def _adopt(f: Future) -> None:
+        error = f.exception()
+        if error is not None:
+            chained.set_exception(error)
+        else:
+            chained.set_result(f.result())
+
+    def _done(f: Future) -> None:
+        try:
+            value = fn(f.result())
+        except BaseException as e:
+            chained.set_exception(e)
+            return
+        if isinstance(value, Future):
+            value.add_done_callback(_adopt)
+        else:
+            chained.set_result(value)
+
+    future.add_done_callback(_done)
+    return chained
+
+
+def _compress_upload(upload: SpooledUpload, max_bytes: int, respond: Callable[..., Response],
+                     dedupe: bool = False, resolve: Callable[[str], Any] = None) -> Response:
+    # Repeat uploads of the same picture with the same parameters are served
+    # from the cache without decoding.
+    plan = _CompressPlan(upload, max_bytes)
+    cached = plan.cached()
+    if cached is not None:
+        out, info = cached
+        return respond(out, info or None, cache_status='HIT', key=plan.cache_key)
+
+    try:
+        out, info, cache_status = plan.start(upload, dedupe, resolve).result(timeout=_compress_timeout)
+    except Exception as e:
+        return _compress_error_response(e)
+    return respond(out, info, cache_status=cache_status, key=plan.cache_key)
+
+
+def _compress_error_response(e: Exception) -> Response:
+    if isinstance(e, PoolBusy):
+        return _busy_response(e)
+    if isinstance(e, ValueError):
+        response = jsonify({'error': str(e)})
+        response.status_code = 400
+    elif isinstance(e, FutureTimeoutError):
+        response = jsonify({'error': 'compression timed out'})
+        response.status_code = 504
     else:
-        # Try to read raw body
-        img_bytes = request.get_data() or b''
+        response = jsonify({'error': 'compression failed', 'detail': str(e)})
+        response.status_code = 500
+    return response
+
+
+def _check_image_header(head: bytes) -> bool:
+    """True once `head` settles the header; UploadTooLarge if it has too many pixels."""
+    header, complete = probe_image_header(head)
+    if header is not None and header[1] * header[2] > _upload_max_pixels:
+        _, w, h = header
+        raise UploadTooLarge(f"image is {w}x{h}; at most {_upload_max_pixels} pixels are accepted")
+    return complete
+
+
+def _read_image_upload() -> Tuple[SpooledUpload, Dict[str, str]]:
+    """Spool the multipart file 'image' or the raw body, checking its header as it arrives.
+
+    Returns the upload and the other multipart form fields ({} for a raw
+    body). The multipart body is parsed here as it streams in, so use the
+    returned fields rather than `request.form`. Callers set
+    `request.max_content_length` first so oversized bodies are refused
+    before they are read. Raises UploadTooLarge, or ValueError for a
+    malformed multipart body.
+    """
+    upload = SpooledUpload(_upload_max_bytes, spool_bytes=_upload_spool_bytes, directory=_upload_spool_dir,
+                           hasher=new_input_hasher())
+    if request.mimetype == 'multipart/form-data':
+        boundary = request.mimetype_params.get('boundary')
+        if not boundary:
+            upload.close()
+            raise ValueError('multipart body without a boundary')
+        form = spool_multipart(request.stream, boundary.encode('latin-1'), upload, field='image',
+                               check=_check_image_header)
+        return upload, form
+    return spool_stream(request.stream, upload, check=_check_image_header), {}
+
+
+def _submit_on_upload(upload: SpooledUpload, fn: Callable, *args, **kwargs) -> Future:
+    # Spooled uploads go to the worker by path and are decoded from an mmap
+    if upload.path is not None:
+        return compress_pool.submit(compress_file, upload.path, fn, *args, **kwargs)
+    return compress_pool.submit(fn, upload.data, *args, **kwargs)
+
+
+def _run_on_upload(upload: SpooledUpload, fn: Callable, *args, **kwargs):
+    return _submit_on_upload(upload, fn, *args, **kwargs).result(timeout=_compress_timeout)
+
+
+def _busy_response(e: PoolBusy) -> Response:
+    response = jsonify({'error': 'server busy, retry later', 'retry_after': e.retry_after})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
 
-    if not img_bytes:
+
+@app.route('/api/compress/jobs', methods=['POST'])
+def api_compress_jobs_submit():
+    """Queue a compression and return a job id at once (202).
+
+    Same input as /api/compress. Poll GET /api/compress/jobs/<id> (with
+    `?wait=<seconds>` to long-poll) and fetch the JPEG once from
+    GET /api/compress/jobs/<id>/result.
+    """
+    request.max_content_length = _upload_max_bytes
+    try:
+        upload, form = _read_image_upload()
+    except UploadTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        max_bytes, dedupe = _compress_options(form)
+    except ValueError as e:
+        upload.close()
+        return jsonify({'error': str(e)}), 400
+    if not upload.size:
+        upload.close()
         return jsonify({'error': 'no image bytes provided'}), 400
 
+    plan = _CompressPlan(upload, max_bytes)
+    cached = plan.cached()
+    if cached is not None:
+        upload.close()
+        done: Future = Future()
+        done.set_result((cached[0], cached[1] or None, 'HIT'))
+
+        def start() -> Future:
+            return done
+    else:
+        def start() -> Future:
+            future = plan.start(upload, dedupe)
+            # The spooled upload must outlive the request until the workers are done
+            future.add_done_callback(lambda f: upload.close())
+            return future
+
+    try:
+        job = compress_jobs.submit(start, lambda value: value + (plan.cache_key,))
+    except (PoolBusy, JobTableFull) as e:
+        upload.close()
+        if isinstance(e, PoolBusy):
+            return _busy_response(e)
+        return jsonify({'error': str(e)}), 503
+    response = jsonify(dict(job.describe(), status_url=f'/api/compress/jobs/{job.job_id}',
+                            result_url=f'/api/compress/jobs/{job.job_id}/result'))
+    response.status_code = 202
+    response.headers['Location'] = f'/api/compress/jobs/{job.job_id}'
+    return response
+
+
+@app.route('/api/compress/jobs/<job_id>', methods=['GET'])
+def api_compress_job_status(job_id: str):
+    """Job status; `?wait=<seconds>` (at most MAX_JOB_WAIT) long-polls until it finishes."""
+    try:
+        wait = min(max(float(request.args.get('wait', 0)), 0.0), MAX_JOB_WAIT)
+    except ValueError:
+        return jsonify({'error': 'wait must be a number'}), 400
+    job = compress_jobs.get(job_id, wait=wait)
+    if job is None:
+        return jsonify({'error': 'unknown or expired job'}), 404
+    return jsonify(dict(job.describe(), result_url=f'/api/compress/jobs/{job_id}/result'))
+
+
+@app.route('/api/compress/jobs/<job_id>/result', methods=['GET'])
+def api_compress_job_result(job_id: str):
+    """The finished job's JPEG (or its error); the job is removed once fetched."""
+    job = compress_jobs.take(job_id)
+    if job is None:
+        return jsonify({'error': 'unknown or expired job'}), 404
+    if job.status == PENDING:
+        return jsonify(dict(job.describe(), error='job not finished')), 409
+    if job.status == FAILED:
+        return _compress_error_response(job.error)
+    out, info, cache_status, key = job.result
+    return _compress_response(out, info, cache_status=cache_status, key=key)
+
+
+@app.route('/api/compress/jobs/stats', methods=['GET'])
+def api_compress_jobs_stats():
+    """Job table size, pending jobs (queue depth) and submit-to-finish latency percentiles."""
+    return jsonify(compress_jobs.stats())
+
+
+def _compress_response(out: bytes, info: Dict[str, Any] = None, cache_status: str = 'MISS',
+                       key: str = None) -> Response:
+    if out is None:
+        # dedupe=1 near-duplicate: name the earlier output (its X-Compress-Key)
+        response = jsonify(info)
+    else:
+        response = Response(out, content_type='image/jpeg')
+        if key is not None:
+            response.headers['X-Compress-Key'] = key
+    response.headers['X-Cache'] = cache_status
+    if info and 'near_duplicate_of' in info:
+        response.headers['X-Near-Duplicate-Of'] = info['near_duplicate_of']
+        response.headers['X-Near-Duplicate-Distance'] = str(info['near_duplicate_distance'])
+    if info and 'quality' in info:
+        response.headers['X-Compress-Quality'] = str(info['quality'])
+        response.headers['X-Compress-Width'] = str(info['width'])
+        response.headers['X-Compress-Height'] = str(info['height'])
+        response.headers['X-Compress-Attempts'] = str(info['attempts'])
+        response.headers['X-Compress-Within-Budget'] = '1' if info['within_budget'] else '0'
+    return response
+
+
+# Renditions produced when the request does not specify any
+DEFAULT_RENDITIONS = [
+    {'name': 'thumb', 'max_dim': 128, 'quality': 60, 'format': 'jpeg'},
+    {'name': 'medium', 'max_dim': 512, 'quality': 75, 'format': 'jpeg'},
+    {'name': 'large', 'max_dim': 1280, 'quality': 85, 'format': 'jpeg'},
+]
+MAX_RENDITIONS = 8
+_RENDITION_NAME = re.compile(r'^[A-Za-z0-9_-]{1,32}$')
+
+
+@app.route('/api/compress/renditions', methods=['POST'])
+def api_compress_renditions():
+    """Several sizes/formats of one upload from a single decode.
+
+    The image comes as multipart file 'image' or the raw body; an optional
+    `renditions` query/form field holds a JSON list of
+    {name, max_dim, quality, format} (format 'jpeg' or 'webp'). The response
+    is multipart/form-data (readable with `fetch(...).formData()`): a
+    'manifest' JSON part followed by one file part per rendition name.
+    """
+    request.max_content_length = _upload_max_bytes
+    try:
+        upload, form = _read_image_upload()
+    except UploadTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     try:
-        out = compress_image(img_bytes, max_dim=512, jpeg_quality=75)
+        specs = _rendition_specs(request.args.get('renditions') or form.get('renditions'))
+        if not upload.size:
+            return jsonify({'error': 'no image bytes provided'}), 400
+        results = _run_on_upload(upload, compress_renditions, specs)
+    except PoolBusy as e:
+        return _busy_response(e)
     except ValueError as e:
         return jsonify({'error': str(e)}), 400
+    except FutureTimeoutError:
+        return jsonify({'error': 'compression timed out'}), 504
     except Exception as e:
         return jsonify({'error': 'compression failed', 'detail': str(e)}), 500
+    finally:
+        upload.close()
+
+    return _multipart_renditions(results)
+
+
+def _rendition_specs(raw_specs: str = None) -> List[Dict[str, Any]]:
+    """The requested renditions (DEFAULT_RENDITIONS if none); ValueError if invalid."""
+    specs = DEFAULT_RENDITIONS
+    if raw_specs:
+        try:
+            specs = json.loads(raw_specs)
+        except ValueError:
+            raise ValueError('renditions must be a JSON list')
+        if not isinstance(specs, list) or not specs or not all(isinstance(s, dict) for s in specs):
+            raise ValueError('renditions must be a non-empty JSON list of objects')
+        if len(specs) > MAX_RENDITIONS:
+            raise ValueError(f'at most {MAX_RENDITIONS} renditions per request')
+    names = [s.get('name') for s in specs]
+    if not all(isinstance(n, str) and _RENDITION_NAME.match(n) for n in names) or len(set(names)) != len(names):
+        raise ValueError('each rendition needs a unique name of letters, digits, _ or -')
+    return specs
+
 
-    return Response(out, content_type='image/jpeg')
+def _multipart_renditions(results: List[Dict[str, Any]]) -> Response:
+    manifest = [{k: v for k, v in r.items() if k != 'data'} for r in results]
+    for entry, r in zip(manifest, results):
+        entry['bytes'] = len(r['data'])
+    boundary = 'rendition-' + os.urandom(12).hex()
+    extensions = {'jpeg': 'jpg', 'webp': 'webp'}
+    parts = [
+        f'--{boundary}\r\n'
+        'Content-Disposition: form-data; name="manifest"\r\n'
+        'Content-Type: application/json\r\n\r\n'.encode('ascii')
+        + json.dumps({'renditions': manifest}).encode('utf-8') + b'\r\n'
+    ]
+    for r in results:
+        filename = f"{r['name']}.{extensions[r['format']]}"
+        parts.append(
+            f'--{boundary}\r\n'
+            f'Content-Disposition: form-data; name="{r["name"]}"; filename="{filename}"\r\n'
+            f'Content-Type: {r["content_type"]}\r\n\r\n'.encode('ascii')
+            + r['data'] + b'\r\n'
+        )
+    parts.append(f'--{boundary}--\r\n'.encode('ascii'))
+    return Response(b''.join(parts), content_type=f'multipart/form-data; boundary={boundary}')
+
+
+@app.route('/api/compress/mesh', methods=['POST'])
+def api_compress_mesh():
+    """Compress like /api/compress and return the JPEG as mesh chunk messages.
+
+    Responds with { msg_id, chunk_total, bytes, mtu, messages } where each
+    message is a WireMsg dict (shared msg_id, base64 chunk in `content`)
+    sized to fit MESH_MTU, ready to hand to the mesh bridge. With `dedupe=1`,
+    a near-duplicate of an image the outbox still holds is answered with a
+    single `image_ref` message naming that transfer's msg_id (in
+    `near_duplicate_of`) instead of chunks.
+    """
+    return api_compress(respond=_mesh_chunks_response, resolve=mesh_outbox.find)
+
+
+def _mesh_chunks_response(out: bytes, info: Dict[str, Any] = None, cache_status: str = 'MISS',
+                          key: str = None) -> Response:
+    info = info or {}
+    if out is None:
+        messages = [make_ref(info['near_duplicate_of'], mesh_outbox.node_id, info['near_duplicate_distance'])]
+    else:
+        messages = mesh_outbox.send(out, msg_type='image', ref=key)
+    response = jsonify({
+        'msg_id': messages[0]['msg_id'],
+        'chunk_total': len(messages) if out is not None else 0,
+        'bytes': len(out) if out is not None else 0,
+        'mtu': mesh_outbox.mtu,
+        'near_duplicate_of': info.get('near_duplicate_of'),
+        'messages': messages,
+    })
+    response.headers['X-Cache'] = cache_status
+    return response
+
+
+@app.route('/api/mesh/messages', methods=['POST'])
+def api_mesh_messages():
+    """Feed messages received from the mesh into the chunk layer.
+
+    Accepts JSON { messages: [...] } with chunk messages and `chunk_nack`
+    re-requests (other messages are ignored). Returns
+      completed: reassembled payloads { msg_id, sender, type, bytes, content (base64) }
+      resend:    chunks answering re-requests for our own transfers
+      nacks:     re-requests for our stalled incoming transfers
+    `resend` and `nacks` are to be broadcast; posting an empty list is how
+    a poller collects due re-requests.
+    """
+    data = request.get_json(force=True, silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get('messages'), list):
+        return jsonify({'error': 'missing messages list'}), 400
+
+    completed, resend = [], []
+    for msg in data['messages']:
+        if not isinstance(msg, dict):
+            continue
+        if msg.get('type') == NACK_TYPE:
+            resend.extend(mesh_outbox.handle_nack(msg))
+        elif isinstance(msg.get('chunk_total'), int) and msg['chunk_total'] > 0:
+            payload = mesh_inbox.add(msg)
+            if payload is not None:
+                completed.append({
+                    'msg_id': msg['msg_id'],
+                    'sender': msg.get('sender'),
+                    'type': msg.get('type'),
+                    'bytes': len(payload),
+                    'content': base64.b64encode(payload).decode('ascii'),
+                })
+    return jsonify({'completed': completed, 'resend': resend, 'nacks': mesh_inbox.nacks()})
+
+
+@app.route('/api/mesh/stats', methods=['GET'])
+def api_mesh_stats():
+    """Chunk outbox and reassembly counters."""
+    return jsonify({'outbox': mesh_outbox.stats(), 'inbox': mesh_inbox.stats()})
+
+
+@app.route('/api/compress/stats', methods=['GET'])
+def api_compress_stats():
+    """Compression pool queue depth, rejections and queue-wait/compute times."""
+    return jsonify(compress_pool.stats())
+
+
+@app.route('/api/compress/cache/stats', methods=['GET'])
+def api_compress_cache_stats():
+    """Compressed-image cache hit rate, tier sizes and bytes saved."""
+    return jsonify(dict(image_cache.stats(), near_duplicates=image_index.stats()))
 
 
 @app.route('/api/rewrite', methods=['POST'])
@@ -152,7 +1235,10 @@ def api_rewrite():
     if target_tone not in ['supportive', 'professional', 'neutral']:
         return jsonify({'error': 'invalid tone. Use: supportive, professional, neutral'}), 400
     
-    rewritten = rewrite_tone(original_text, target_tone)
+    rewritten = response_cache.get_or_compute(
+        'rewrite', original_text, {'tone': target_tone},
+        lambda: rewrite_tone(original_text, target_tone)
+    )
     
     return jsonify({
         'original': original_text,
@@ -161,16 +1247,31 @@ def api_rewrite():
     })
 
 
+@app.route('/api/cache/stats', methods=['GET'])
+def api_cache_stats():
+    """Hit/miss/eviction counters of the text endpoint response cache."""
+    return jsonify(response_cache.stats())
+
+
 @app.route('/api/analytics', methods=['GET'])
 def api_analytics():
-    """Get emotion analytics for a user."""
+    """Get emotion analytics for a user (?fresh=1 includes events still queued)."""
     user_id = request.args.get('user_id', 'anonymous')
     days = int(request.args.get('days', 7))
     
-    trends = analytics.get_emotion_trends(user_id, days)
+    trends = _fresh_trends(user_id, days, flush=request.args.get('fresh') in ('1', 'true'))
     return jsonify(trends)
 
 
+@app.route('/api/analytics/stats', methods=['GET'])
+def api_analytics_stats():
+    """Analytics store size, ingestion queue, durable log and analytics server counters (null if disabled)."""
+    return jsonify(dict(
+        analytics_backend.stats(),
+        queue=analytics_queue.stats() if analytics_queue is not None else None,
+    ))
+
+
 @app.route('/api/mood-advice', methods=['POST'])
 def api_mood_advice():
     """Get personalized mood improvement advice."""
@@ -180,10 +1281,13 @@ def api_mood_advice():
     
     emotion = data['emotion']
     confidence = data.get('confidence', 0.5)
-    user_id = data.get('user_id', 'anonymous')
+    try:
+        user_id = _user_id(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    # Get recent patterns for context
-    trends = analytics.get_emotion_trends(user_id, 1)  # Last day
+    # Get recent patterns for context, including the message just classified
+    trends = _fresh_trends(user_id, 1)  # Last day
     patterns = trends.get('emotion_breakdown', {})
     
     # Generate advice
@@ -198,6 +1302,105 @@ def api_mood_advice():
     })
 
 
+def _positive_int(data: Dict[str, Any], key: str, default: int) -> int:
+    value = data.get(key, default)
+    if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+        raise ValueError(f'{key} must be a positive integer')
+    return value
+
+
+@app.route('/api/pipeline', methods=['POST'])
+def api_pipeline():
+    """Run several text stages on one message in a single round trip.
+
+    JSON body: { text, stages?, user_id?, days?, max_sentences? }. `stages`
+    is any of classify, rewrite, advice, analytics, summarize (default:
+    classify, rewrite, advice). The text is lowercased, split and tokenized
+    once in an `AnalysisContext` shared by all stages. Each stage's result
+    has the shape of the matching endpoint (`rewrite` is the tone -> text
+    map of /api/classify's `rewrite_suggestions`), and `timings_ms` reports
+    the time spent per stage.
+
+    Like /api/classify, the classify stage logs the message for analytics;
+    advice is then based on the detected emotion and today's patterns, as
+    the /api/classify + /api/mood-advice sequence would give.
+    """
+    data = request.get_json(force=True, silent=True)
+    if not data or not isinstance(data.get('text'), str):
+        return jsonify({'error': 'missing text'}), 400
+    try:
+        stages = parse_stages(data.get('stages', DEFAULT_STAGES))
+        days = _positive_int(data, 'days', 7)
+        max_sentences = _positive_int(data, 'max_sentences', 3)
+        user_id = _user_id(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    text = data['text']
+    timer = StageTimer()
+    with timer.stage('context'):
+        context = AnalysisContext(text)
+    result: Dict[str, Any] = {'stages': stages}
+
+    if {'classify', 'rewrite', 'advice'}.intersection(stages):
+        with timer.stage('classify'):
+            label, score, matched = classify_text(text, lowered=context.lowered)
+        if 'classify' in stages:
+            analytics_ingest.log_emotion(user_id, label, score, len(text))
+            result['classify'] = {'label': label, 'score': score, 'matched': matched}
+
+    if 'rewrite' in stages:
+        with timer.stage('rewrite'):
+            result['rewrite'] = get_rewrite_suggestions(text, label, lowered=context.lowered)
+
+    trends: Dict[int, Dict[str, Any]] = {}
+    if 'advice' in stages:
+        with timer.stage('advice'):
+            trends[1] = _fresh_trends(user_id, 1)
+            patterns = trends[1].get('emotion_breakdown', {})
+            advice = get_mood_advice(label, score, patterns)
+            result['advice'] = {
+                'emotion': label,
+                'advice': advice,
+                'formatted_advice': format_advice_for_display(advice, label),
+                'patterns': patterns
+            }
+
+    if 'analytics' in stages:
+        with timer.stage('analytics'):
+            # The advice stage may already have today's trends
+            result['analytics'] = trends[days] if days in trends else _fresh_trends(user_id, days)
+
+    if 'summarize' in stages:
+        with timer.stage('summarize'):
+            spans = response_cache.get_or_compute(
+                'summarize', text, {'max_sentences': max_sentences},
+                lambda: _summarize_and_track(text, max_sentences, context)
+            )
+            summary = [text[start:end] for start, end in spans]
+            result['summarize'] = {
+                'summary': ' '.join(summary),
+                'sentences': summary,
+                'spans': [[start, end] for start, end in spans]
+            }
+
+    result['timings_ms'] = timer.report()
+    return jsonify(result)
+
+
+@app.errorhandler(413)
+def _request_too_large(e):
+    # Raised by Werkzeug when a body goes over `request.max_content_length`
+    return jsonify({'error': 'request body too large'}), 413
+
+
+@app.errorhandler(AnalyticsUnavailable)
+def _analytics_unavailable(e):
+    # Trend queries to a down or overloaded analytics server (ANALYTICS_SERVER)
+    logger.warning('%s', e)
+    return jsonify({'error': 'analytics temporarily unavailable'}), 503
+
+
 # Add permissive CORS headers in development to make it easy for the Vite frontend to call
 @app.after_request
 def _add_cors_headers(response: Response):
@@ -207,6 +1410,10 @@ def _add_cors_headers(response: Response):
         response.headers['Access-Control-Allow-Origin'] = os.environ.get('CORS_ORIGIN', '*')
         response.headers['Access-Control-Allow-Methods'] = 'GET,POST,OPTIONS'
         response.headers['Access-Control-Allow-Headers'] = 'Content-Type,Authorization'
+        response.headers['Access-Control-Expose-Headers'] = (
+            'X-Compress-Quality,X-Compress-Width,X-Compress-Height,X-Compress-Attempts,X-Compress-Within-Budget,'
+            'X-Cache,X-Compress-Key,X-Near-Duplicate-Of,X-Near-Duplicate-Distance,Retry-After'
+        )
     return response
 
 
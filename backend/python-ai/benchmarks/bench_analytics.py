@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""Benchmark: dict-per-event analytics vs the columnar `EventRing` store.
+
+Memory: traced allocations for many users with a few events each and for
+fewer users at the 1000-event cap, for the previous storage (one dict
+with a `datetime` per event, list re-sliced past 1000, trends rescanning
+every event) and for `EmotionAnalytics` (event columns plus trend
+buckets). Latency: `log_emotion` per call and `get_emotion_trends` for
+1, 7 and 30 day windows over a full history. Trends from both stores are
+checked to be identical.
+
+Run from backend/python-ai:  python benchmarks/bench_analytics.py
+"""
+from __future__ import annotations
+import gc
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from analytics import EmotionAnalytics  # noqa: E402
+
+EMOTIONS = ['happy', 'sad', 'angry', 'scared', 'normal']
+
+
+class LegacyAnalytics(EmotionAnalytics):
+    """The previous storage and trend computation (insights text is shared)."""
+
+    def __init__(self):
+        super().__init__()
+        self.emotion_data = defaultdict(list)
+
+    def log_emotion(self, user_id, emotion, confidence, text_length=0, timestamp=None):
+        when = datetime.now() if timestamp is None else datetime.fromtimestamp(int(timestamp))
+        self.emotion_data[user_id].append({'timestamp': when, 'emotion': emotion,
+                                           'confidence': confidence, 'text_length': text_length})
+        if len(self.emotion_data[user_id]) > 1000:
+            self.emotion_data[user_id] = self.emotion_data[user_id][-1000:]
+
+    def get_emotion_trends(self, user_id, days=7):
+        if user_id not in self.emotion_data:
+            return self._empty_trends()
+        cutoff = datetime.now() - timedelta(days=days)
+        recent = [e for e in self.emotion_data[user_id] if e['timestamp'] > cutoff]
+        if not recent:
+            return self._empty_trends()
+        counts = Counter(e['emotion'] for e in recent)
+        percentages = {emotion: round((n / len(recent)) * 100, 1) for emotion, n in counts.items()}
+        hourly = defaultdict(list)
+        for e in recent:
+            hourly[e['timestamp'].hour].append(e['emotion'])
+        peaks = {}
+        for hour, emotions in hourly.items():
+            emotion, n = Counter(emotions).most_common(1)[0]
+            peaks[hour] = {'emotion': emotion, 'count': n}
+        avg_length = sum(e.get('text_length', 0) for e in recent) / len(recent)
+        return {'total_messages': len(recent), 'emotion_breakdown': percentages, 'peak_hours': peaks,
+                'insights': self._generate_insights(percentages, peaks, avg_length, days), 'period_days': days}
+
+
+def fill(store, users: int, events: int, rng: random.Random, now: float) -> None:
+    for u in range(users):
+        for t in sorted(now - rng.uniform(0, 14 * 86400) for _ in range(events)):
+            store.log_emotion(f'user-{u}', rng.choice(EMOTIONS), rng.random(), rng.randint(5, 300), timestamp=t)
+
+
+def traced_mb(factory, users: int, events: int) -> float:
+    gc.collect()
+    tracemalloc.start()
+    store = factory()
+    fill(store, users, events, random.Random(0), time.time())
+    current = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return current / 2 ** 20
+
+
+def per_call_us(fn, calls: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - t0) / calls * 1e6
+
+
+def main() -> int:
+    print(f"{'users':>6} {'events/user':>11} {'dicts MB':>9} {'columns MB':>11} {'ratio':>6}")
+    for users, events in ((20_000, 10), (2_000, 200), (200, 1000)):
+        old = traced_mb(LegacyAnalytics, users, events)
+        new = traced_mb(EmotionAnalytics, users, events)
+        print(f"{users:>6} {events:>11} {old:>9.1f} {new:>11.1f} {old / new:>5.1f}x")
+
+    now = time.time()
+    stores = {'dicts': LegacyAnalytics(), 'columns': EmotionAnalytics()}
+    for store in stores.values():
+        fill(store, 1, 1000, random.Random(1), now)
+    for days in (1, 7, 30):
+        a, b = (s.get_emotion_trends('user-0', days) for s in stores.values())
+        if a != b or list(a['peak_hours']) != list(b['peak_hours']):
+            print(f"  !! trends differ for days={days}")
+            return 1
+
+    print(f"\n{'store':>8} {'log_emotion us':>15} {'trends 1d us':>13} {'trends 7d us':>13} {'trends 30d us':>14}")
+    for name, store in stores.items():
+        rng = random.Random(2)
+        log = per_call_us(lambda: store.log_emotion('writer', rng.choice(EMOTIONS), 0.5, 40), 20_000)
+        trends = [statistics.median(per_call_us(lambda: store.get_emotion_trends('user-0', days), 50)
+                                    for _ in range(5)) for days in (1, 7, 30)]
+        print(f"{name:>8} {log:>15.2f} {trends[0]:>13.1f} {trends[1]:>13.1f} {trends[2]:>14.1f}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""Benchmark: /api/classify latency with analytics applied inline vs queued.
+
+Eight client threads post /api/classify for 1000 users (each with 300
+events of history) at a combined 1000 requests/s, while two more threads
+request 7-day trends from /api/analytics at 200/s, so writers and readers
+share the analytics locks. Requests are paced (open loop) rather than sent
+back to back, so latency is measured below saturation instead of being
+dominated by threads queueing for the GIL.
+Analytics are persisted to a durable log in a temp directory, as in the
+default configuration. Each mode runs the same requests: `inline` updates
+`EmotionAnalytics` inside the handler, `queue` only appends to the
+`IngestQueue`; the modes alternate for three rounds. Reports classify
+latency percentiles and throughput, the queue's depth and
+queue-to-applied lag, and the analytics cost per request on a single
+thread (no contention).
+
+Run from backend/python-ai:  python benchmarks/bench_analytics_queue.py
+"""
+from __future__ import annotations
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+LOG_DIR = tempfile.mkdtemp(prefix='bench-analytics-queue-')
+os.environ['ANALYTICS_LOG_DIR'] = LOG_DIR
+os.environ.setdefault('IMAGE_CACHE_DIR', '')
+os.environ.setdefault('SUMMARIZER_IDF_PATH', '')
+
+import app as api  # noqa: E402
+
+MESSAGES = [
+    "I'm done with this, this is stupid and you always ignore what I say. I hate it.",
+    "Feeling really down and gloomy today, kind of heartbroken. I can't do this.",
+    "Worried and anxious about the storm, a bit scared honestly. I'm terrified.",
+    "So happy and excited about the news, this is amazing!",
+    "Just checking in, all good here. Meeting moved to 3pm.",
+]
+USERS = 1000
+HISTORY = 300
+WRITERS = 8
+READERS = 2
+REQUESTS = 1000  # per writer and round
+ROUNDS = 3
+CLASSIFY_RATE = 500.0  # requests/s, all writers together
+TRENDS_RATE = 100.0
+
+
+def percentile(ordered, pct):
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def run(seed: int):
+    samples, reads = [], [0]
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def writer(n):
+        rng = random.Random(seed * 100 + n)
+        client = api.app.test_client()
+        local = []
+        due = time.perf_counter()
+        for _ in range(REQUESTS):
+            # Poisson arrivals; latency counts from the scheduled send time
+            due += rng.expovariate(CLASSIFY_RATE / WRITERS)
+            time.sleep(max(0.0, due - time.perf_counter()))
+            body = {'text': rng.choice(MESSAGES), 'user_id': f"user-{rng.randrange(USERS)}"}
+            r = client.post('/api/classify', json=body)
+            local.append(time.perf_counter() - due)
+            assert r.status_code == 200
+        with lock:
+            samples.extend(local)
+
+    def reader(n):
+        rng = random.Random(seed * 100 + 50 + n)
+        client = api.app.test_client()
+        due = time.perf_counter()
+        while not stop.is_set():
+            due += rng.expovariate(TRENDS_RATE / READERS)
+            time.sleep(max(0.0, due - time.perf_counter()))
+            client.get(f"/api/analytics?user_id=user-{rng.randrange(USERS)}&days=7")
+            reads[0] += 1
+
+    readers = [threading.Thread(target=reader, args=(i,)) for i in range(READERS)]
+    writers = [threading.Thread(target=writer, args=(i,)) for i in range(WRITERS)]
+    t0 = time.perf_counter()
+    for t in readers + writers:
+        t.start()
+    for t in writers:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    stop.set()
+    for t in readers:
+        t.join()
+    samples.sort()
+    return samples, len(samples) / elapsed, reads[0] / elapsed
+
+
+def main() -> int:
+    try:
+        now = time.time()
+        rng = random.Random(0)
+        for u in range(USERS):
+            for i in range(HISTORY):
+                api.analytics.log_emotion(f"user-{u}", rng.choice(('happy', 'sad', 'angry', 'normal')),
+                                          rng.random(), rng.randrange(10, 300),
+                                          timestamp=now - 7 * 86400 + i * 7 * 86400 / HISTORY)
+        api.analytics_log.flush()
+
+        print(f"{WRITERS} classify threads x {REQUESTS} requests, {READERS} trend readers, {USERS} users")
+        print(f"{'mode':>7} {'p50 us':>8} {'p95 us':>8} {'p99 us':>8} {'max ms':>7} {'classify/s':>11} "
+              f"{'trends/s':>9}")
+        for round_ in range(ROUNDS):
+            for mode, ingest in (('inline', api.analytics), ('queue', api.analytics_queue)):
+                api.analytics_ingest = ingest
+                samples, rate, read_rate = run(round_)
+                api.analytics_queue.flush(timeout=10)
+                print(f"{mode:>7} {percentile(samples, 50) * 1e6:>8.0f} {percentile(samples, 95) * 1e6:>8.0f} "
+                      f"{percentile(samples, 99) * 1e6:>8.0f} {samples[-1] * 1000:>7.1f} {rate:>11.0f} "
+                      f"{read_rate:>9.0f}")
+        # Analytics cost per request on the request thread
+        for mode, ingest in (('inline', api.analytics), ('queue', api.analytics_queue)):
+            n = 20000
+            t0 = time.perf_counter()
+            for i in range(n):
+                ingest.log_emotion(f"user-{i % USERS}", 'sad', 0.7, 80)
+            elapsed = time.perf_counter() - t0
+            api.analytics_queue.flush(timeout=10)
+            print(f"{mode} log_emotion on the request thread: {elapsed / n * 1e6:.1f} us")
+        stats = api.analytics_queue.stats()
+        print(f"queue: {stats['batches']} batches, max depth {stats['max_depth']}, queue-to-applied lag "
+              f"p50 {stats['apply_lag_ms']['p50']} ms, p99 {stats['apply_lag_ms']['p99']} ms, "
+              f"dropped {stats['dropped']}")
+    finally:
+        api.analytics_queue.close()
+        api.analytics_log.close(snapshot=False)
+        shutil.rmtree(LOG_DIR, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
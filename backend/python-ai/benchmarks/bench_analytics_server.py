@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""Benchmark: analytics update throughput shared across worker processes.
+
+Starts an analytics server (`analytics_server.py`, in memory, no durable
+log) on a Unix socket, then 1, 2, 4 and 8 worker processes that each log
+EVENTS_PER_WORKER events for 1000 users through `RemoteAnalytics`, either
+one message per event (ANALYTICS_QUEUE=0) or through an `IngestQueue` that
+sends batches (the default). Throughput counts until the server has applied
+every event. For reference, the same workers each update a private
+in-process `EmotionAnalytics`, which is what workers did before (fast, but
+every worker saw different trends).
+
+After each shared run, once every worker has sent its events, each worker
+queries a few users and the answers are compared. A separate client times
+trend query round trips while the writers are busy.
+
+Run from backend/python-ai:  python benchmarks/bench_analytics_server.py
+"""
+from __future__ import annotations
+import multiprocessing
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+
+from analytics import EmotionAnalytics  # noqa: E402
+from analytics_queue import IngestQueue  # noqa: E402
+from analytics_server import RemoteAnalytics  # noqa: E402
+
+AUTHKEY = b'bench-analytics-server'
+WORKERS = (1, 2, 4, 8)
+EVENTS_PER_WORKER = 20_000
+USERS = 1000
+QUERIES = 200
+EMOTIONS = ('happy', 'sad', 'angry', 'scared', 'normal')
+
+
+def percentile(ordered, pct):
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def worker(mode: str, address: str, seed: int, start, sent, results) -> None:
+    rng = random.Random(seed)
+    if mode == 'local':
+        store = EmotionAnalytics()
+    else:
+        remote = RemoteAnalytics(address, AUTHKEY)
+        store = IngestQueue(remote) if mode == 'batched' else remote
+    events = [(f"user-{rng.randrange(USERS)}", rng.choice(EMOTIONS), rng.random(), rng.randrange(5, 400))
+              for _ in range(EVENTS_PER_WORKER)]
+    start.wait()
+    for user_id, emotion, confidence, length in events:
+        store.log_emotion(user_id, emotion, confidence, length)
+    if mode == 'batched':
+        store.close()
+    if mode != 'local':
+        # Once every worker has sent its events, all of them should see the same trends
+        sent.wait()
+        results.put([remote.get_emotion_trends(f"user-{u}", 7) for u in range(5)])
+        remote.close()
+    else:
+        results.put(None)
+
+
+def applied_events(client: RemoteAnalytics) -> int:
+    return client.stats()['server']['events']
+
+
+def run(mode: str, workers: int, address: str, client: RemoteAnalytics):
+    """Events/s for `workers` processes, trend query latencies, and whether the workers agreed."""
+    ctx = multiprocessing.get_context('fork')
+    start, sent, results = ctx.Event(), ctx.Barrier(workers), ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(mode, address, w, start, sent, results)) for w in range(workers)]
+    for p in procs:
+        p.start()
+    before = applied_events(client) if mode != 'local' else 0
+    target = before + workers * EVENTS_PER_WORKER
+    time.sleep(0.5)  # let workers build their events
+    latencies = []
+    t0 = time.perf_counter()
+    start.set()
+    if mode != 'local':
+        rng = random.Random(workers)
+        while len(latencies) < QUERIES and any(p.is_alive() for p in procs):
+            q0 = time.perf_counter()
+            client.get_emotion_trends(f"user-{rng.randrange(USERS)}", 7)
+            latencies.append(time.perf_counter() - q0)
+            time.sleep(0.005)
+        while applied_events(client) < target:
+            time.sleep(0.001)
+    views = [results.get() for _ in procs]
+    elapsed = time.perf_counter() - t0
+    for p in procs:
+        p.join()
+    latencies.sort()
+    agree = all(view == views[-1] for view in views[:-1]) if mode != 'local' else None
+    return workers * EVENTS_PER_WORKER / elapsed, latencies, agree
+
+
+def main() -> int:
+    root = tempfile.mkdtemp(prefix='bench-analytics-server-')
+    address = os.path.join(root, 'analytics.sock')
+    env = dict(os.environ, ANALYTICS_SERVER=address, ANALYTICS_SERVER_AUTHKEY=AUTHKEY.decode(),
+               ANALYTICS_LOG_DIR='')
+    server = subprocess.Popen([sys.executable, os.path.join(HERE, '..', 'analytics_server.py')], env=env,
+                              stderr=subprocess.DEVNULL)
+    client = RemoteAnalytics(address, AUTHKEY, connect_timeout=30)
+    try:
+        print(f"{EVENTS_PER_WORKER} events per worker, {USERS} users, {os.cpu_count()} CPU(s)")
+        print(f"{'workers':>7} {'mode':>20} {'events/s':>10} {'query p50 us':>13} {'query p99 us':>13} "
+              f"{'same trends':>12}")
+        for workers in WORKERS:
+            for mode, label in (('local', 'private (unshared)'), ('per-event', 'server, per event'),
+                                ('batched', 'server, batched')):
+                rate, latencies, agree = run(mode, workers, address, client)
+                p50 = f"{percentile(latencies, 50) * 1e6:.0f}" if latencies else '-'
+                p99 = f"{percentile(latencies, 99) * 1e6:.0f}" if latencies else '-'
+                print(f"{workers:>7} {label:>20} {rate:>10.0f} {p50:>13} {p99:>13} "
+                      f"{'-' if agree is None else ('yes' if agree else 'NO'):>12}")
+        stats = client.stats()
+        print(f"server: {stats['server']['events']} events in {stats['server']['messages']} messages, "
+              f"{stats['server']['rounds']} rounds, {stats['server']['failed_events']} failed")
+    finally:
+        client.close()
+        server.terminate()
+        server.wait()
+        shutil.rmtree(root, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""Benchmark: single-pass keyword matcher vs per-keyword substring scans.
+
+Grows a synthetic lexicon from the real emotion keywords up to several
+thousand terms and reports classification throughput (messages/second) for
+the old approach (one `kw in text` scan per keyword) and for the
+Aho-Corasick `KeywordMatcher` used by `classify_text`.
+
+Run from backend/python-ai:  python benchmarks/bench_classifier.py
+"""
+from __future__ import annotations
+import os
+import random
+import string
+import sys
+import time
+from typing import Dict, List, Set
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from classifier import EMOTION_KEYWORDS, KeywordMatcher, label_from_hits  # noqa: E402
+
+MESSAGES = [
+    "I'm so happy and excited about the news, this is amazing!",
+    "Feeling really down and gloomy today, kind of heartbroken.",
+    "I am furious, this is so frustrating and I hate it 😡",
+    "Worried and anxious about the storm, a bit scared honestly.",
+    "Just checking in, all good here. Meeting moved to 3pm.",
+    "The shelter on 5th street has water and blankets available for everyone.",
+]
+
+
+def grow_lexicon(size_per_emotion: int, rng: random.Random) -> Dict[str, Set[str]]:
+    lexicon = {emotion: set(kws) for emotion, kws in EMOTION_KEYWORDS.items()}
+    for kws in lexicon.values():
+        while len(kws) < size_per_emotion:
+            kws.add(''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 10))))
+    return lexicon
+
+
+def naive_hits(lexicon: Dict[str, Set[str]], text: str) -> Dict[str, List[str]]:
+    t = text.lower()
+    return {emotion: [kw for kw in kws if kw in t] for emotion, kws in lexicon.items()}
+
+
+def throughput(fn, messages: List[str], min_time: float = 0.3) -> float:
+    n = 0
+    start = time.perf_counter()
+    while True:
+        for m in messages:
+            fn(m)
+        n += len(messages)
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return n / elapsed
+
+
+def main() -> int:
+    rng = random.Random(42)
+    print(f"{'terms':>7} {'build ms':>9} {'substring msg/s':>16} {'automaton msg/s':>16} {'speedup':>8}")
+    for per_emotion in (25, 100, 250, 1000, 2500):
+        lexicon = grow_lexicon(per_emotion, rng)
+        terms = sum(len(v) for v in lexicon.values())
+
+        t0 = time.perf_counter()
+        matcher = KeywordMatcher(lexicon)
+        build_ms = (time.perf_counter() - t0) * 1000
+
+        # Sanity check: both approaches must find the same keywords
+        for m in MESSAGES:
+            a = naive_hits(lexicon, m)
+            b = matcher.find(m.lower())
+            assert all(sorted(a[e]) == sorted(b[e]) for e in lexicon), m
+
+        naive = throughput(lambda m: naive_hits(lexicon, m), MESSAGES)
+        fast = throughput(lambda m: label_from_hits(matcher.find(m.lower())), MESSAGES)
+        print(f"{terms:>7} {build_ms:>9.1f} {naive:>16,.0f} {fast:>16,.0f} {fast / naive:>7.1f}x")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""Benchmark: full-size decode vs shrink-on-decode in compress_image.
+
+For typical camera resolutions this generates a photo-like JPEG, then in a
+fresh interpreter per case measures the latency of producing a 512 px JPEG
+and the peak RSS growth during the call, for the old path (full
+`IMREAD_COLOR` decode + `INTER_AREA` resize) and for `compress_image`.
+
+Run from backend/python-ai:  python benchmarks/bench_compress_decode.py
+"""
+from __future__ import annotations
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import cv2
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(HERE, '..')
+
+RESOLUTIONS = [('2 MP', 1600, 1200), ('8 MP', 3264, 2448), ('12 MP', 4032, 3024), ('24 MP', 6000, 4000)]
+
+# Executed in a fresh interpreter: argv = mode, jpeg path, repeats
+PROBE = r'''
+import json, sys, time
+import cv2, numpy as np
+from compressor import compress_image
+
+def legacy(img_bytes, max_dim=512, quality=75):
+    img = cv2.imdecode(np.frombuffer(img_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+    h, w = img.shape[:2]
+    scale = min(max_dim / float(h), max_dim / float(w), 1.0)
+    if scale < 1.0:
+        img = cv2.resize(img, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+    return cv2.imencode(".jpg", img, [int(cv2.IMWRITE_JPEG_QUALITY), quality])[1].tobytes()
+
+def rss_kb(field):
+    with open("/proc/self/status") as f:
+        return next(int(l.split()[1]) for l in f if l.startswith(field))
+
+mode, path, repeats = sys.argv[1], sys.argv[2], int(sys.argv[3])
+data = open(path, "rb").read()
+fn = legacy if mode == "full" else (lambda b: compress_image(b, max_dim=512, jpeg_quality=75))
+base = rss_kb("VmRSS:")
+t0 = time.perf_counter()
+fn(data)
+first = time.perf_counter() - t0
+peak = rss_kb("VmHWM:")
+t0 = time.perf_counter()
+for _ in range(repeats):
+    fn(data)
+avg = (time.perf_counter() - t0) / repeats
+print(json.dumps({"ms": avg * 1000, "first_ms": first * 1000, "peak_mb": (peak - base) / 1024}))
+'''
+
+
+def make_photo(width: int, height: int) -> bytes:
+    rng = np.random.default_rng(0)
+    yy, xx = np.mgrid[0:height, 0:width].astype(np.float32)
+    img = np.dstack([
+        128 + 100 * np.sin(xx / 97.0) * np.cos(yy / 53.0),
+        128 + 90 * np.cos((xx + yy) / 141.0),
+        (xx / width) * 255,
+    ])
+    img += rng.normal(0, 12, img.shape)
+    ok, enc = cv2.imencode('.jpg', np.clip(img, 0, 255).astype(np.uint8), [int(cv2.IMWRITE_JPEG_QUALITY), 90])
+    return enc.tobytes()
+
+
+def probe(mode: str, path: str) -> dict:
+    out = subprocess.run([sys.executable, '-c', PROBE, mode, path, '5'], cwd=ROOT,
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout)
+
+
+def main() -> int:
+    print(f"{'camera':<7} {'input KB':>9} {'full ms':>8} {'full peak MB':>13} "
+          f"{'shrink ms':>10} {'shrink peak MB':>15} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, w, h in RESOLUTIONS:
+            path = os.path.join(tmp, f'{w}x{h}.jpg')
+            data = make_photo(w, h)
+            with open(path, 'wb') as f:
+                f.write(data)
+            full = probe('full', path)
+            shrink = probe('shrink', path)
+            print(f"{name:<7} {len(data) // 1024:>9} {full['ms']:>8.1f} {full['peak_mb']:>13.1f} "
+                  f"{shrink['ms']:>10.1f} {shrink['peak_mb']:>15.1f} {full['ms'] / shrink['ms']:>7.1f}x")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""Benchmark: request hold time of /api/compress vs the job API under a burst.
+
+Fires a burst of N concurrent uploads of distinct 12 MP photos, either as
+synchronous /api/compress requests (each request is held until its image
+is compressed) or as /api/compress/jobs submissions (202 at once, then a
+long-poll and a result fetch). Reports how long requests are held open and
+the end-to-end time until every result is in hand.
+
+Run from backend/python-ai:  python benchmarks/bench_compress_jobs.py
+"""
+from __future__ import annotations
+import os
+import sys
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+sys.path.insert(0, HERE)
+os.environ.setdefault('IMAGE_CACHE_DIR', '')
+os.environ.setdefault('COMPRESS_QUEUE_SIZE', '64')
+
+from bench_compress_decode import make_photo  # noqa: E402
+import app as api  # noqa: E402
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def burst(photos, client_fn):
+    held, done = [], []
+    lock = threading.Lock()
+    start = time.perf_counter()
+
+    def run(photo):
+        client = api.app.test_client()
+        hold = client_fn(client, photo)
+        with lock:
+            held.append(hold)
+            done.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=run, args=(p,)) for p in photos]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return held, max(done)
+
+
+def sync_client(client, photo):
+    t0 = time.perf_counter()
+    assert client.post('/api/compress', data=photo).status_code == 200
+    return time.perf_counter() - t0
+
+
+def job_client(client, photo):
+    t0 = time.perf_counter()
+    r = client.post('/api/compress/jobs', data=photo)
+    assert r.status_code == 202, r.json
+    hold = time.perf_counter() - t0
+    job_id = r.json['job_id']
+    while client.get(f'/api/compress/jobs/{job_id}?wait=30').json['status'] == 'pending':
+        pass
+    assert client.get(f'/api/compress/jobs/{job_id}/result').status_code == 200
+    return hold
+
+
+def main() -> int:
+    base = make_photo(4032, 3024)
+    api.compress_pool.run(api.compress_with_hash, base)  # start the workers
+    print(f"workers={api.compress_pool.workers}")
+    print(f"{'uploads':>7} {'mode':>5} {'held p50 ms':>12} {'held p95 ms':>12} {'all done s':>11}")
+    for n in (4, 16):
+        for mode, fn in (('sync', sync_client), ('jobs', job_client)):
+            # Distinct bytes (trailing data after EOI) so nothing is served from cache
+            photos = [base + f'{mode}{n}-{i}'.encode() for i in range(n)]
+            held, total = burst(photos, fn)
+            print(f"{n:>7} {mode:>5} {percentile(held, 50) * 1000:>12.1f} {percentile(held, 95) * 1000:>12.1f} "
+                  f"{total:>11.2f}")
+    print('job stats:', api.compress_jobs.stats())
+    api.compress_pool.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""Benchmark: inline compression on request threads vs the process pool.
+
+Simulates N concurrent clients (threads), each compressing a 12 MP camera
+JPEG repeatedly for a fixed duration, and reports throughput (images/s),
+client-observed p95 latency and, for the pool, how many submissions were
+rejected with PoolBusy (which the API turns into a fast 503).
+
+Run from backend/python-ai:  python benchmarks/bench_compress_pool.py
+"""
+from __future__ import annotations
+import os
+import statistics
+import sys
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+sys.path.insert(0, HERE)
+
+from bench_compress_decode import make_photo  # noqa: E402
+from compress_pool import CompressionPool, PoolBusy  # noqa: E402
+from compressor import compress_image  # noqa: E402
+
+DURATION = 3.0
+
+
+def drive(clients: int, call) -> dict:
+    latencies, rejected = [], [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + DURATION
+
+    def client():
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            try:
+                call()
+            except PoolBusy as e:
+                with lock:
+                    rejected[0] += 1
+                time.sleep(min(e.retry_after, 0.05))  # a well-behaved client backs off
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - t0)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    p95 = statistics.quantiles(latencies, n=20)[-1] if len(latencies) >= 2 else (latencies or [0])[0]
+    return {'rate': len(latencies) / elapsed, 'p95_ms': p95 * 1000, 'rejected': rejected[0]}
+
+
+def main() -> int:
+    photo = make_photo(4032, 3024)
+    pool = CompressionPool()
+    pool.run(compress_image, photo)  # start the workers outside the timing
+
+    print(f"cores={os.cpu_count()} pool workers={pool.workers} queue={pool.queue_size} duration={DURATION}s")
+    print(f"{'clients':>7} {'inline img/s':>13} {'inline p95 ms':>14} {'pool img/s':>11} "
+          f"{'pool p95 ms':>12} {'rejected':>9}")
+    for clients in (1, 2, 4, 8, 16, 32):
+        inline = drive(clients, lambda: compress_image(photo))
+        pooled = drive(clients, lambda: pool.run(compress_image, photo))
+        print(f"{clients:>7} {inline['rate']:>13.1f} {inline['p95_ms']:>14.0f} {pooled['rate']:>11.1f} "
+              f"{pooled['p95_ms']:>12.0f} {pooled['rejected']:>9}")
+    print('pool stats:', pool.stats())
+    pool.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""Benchmark: one compress_image call per size vs compress_renditions.
+
+Produces the default thumb/medium/large set (128, 512, 1280 px) for typical
+camera resolutions, either as three independent `compress_image`-style
+decode+resize+encode passes or as one `compress_renditions` call (single
+decode, each size resized from the previous one), and reports the latency.
+
+Run from backend/python-ai:  python benchmarks/bench_compress_renditions.py
+"""
+from __future__ import annotations
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+sys.path.insert(0, HERE)
+
+from bench_compress_decode import RESOLUTIONS, make_photo  # noqa: E402
+from compressor import compress_image, compress_renditions  # noqa: E402
+
+RENDITIONS = [
+    {'name': 'thumb', 'max_dim': 128, 'quality': 60},
+    {'name': 'medium', 'max_dim': 512, 'quality': 75},
+    {'name': 'large', 'max_dim': 1280, 'quality': 85},
+]
+REPEATS = 5
+
+
+def separate(data: bytes) -> list:
+    return [compress_image(data, max_dim=r['max_dim'], jpeg_quality=r['quality']) for r in RENDITIONS]
+
+
+def single(data: bytes) -> list:
+    return compress_renditions(data, RENDITIONS)
+
+
+def timed(fn, data: bytes) -> float:
+    fn(data)
+    t0 = time.perf_counter()
+    for _ in range(REPEATS):
+        fn(data)
+    return (time.perf_counter() - t0) / REPEATS * 1000
+
+
+def main() -> int:
+    print(f"{'camera':<7} {'separate ms':>12} {'single decode ms':>17} {'speedup':>8}")
+    for name, w, h in RESOLUTIONS:
+        data = make_photo(w, h)
+        sep = timed(separate, data)
+        one = timed(single, data)
+        print(f"{name:<7} {sep:>12.1f} {one:>17.1f} {sep / one:>7.1f}x")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
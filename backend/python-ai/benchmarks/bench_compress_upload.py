@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""Benchmark: peak memory of buffered vs spooled /api/compress uploads.
+
+Starts the API in a subprocess and fires N concurrent uploads of a large
+camera JPEG (each made unique with trailing bytes so the image cache never
+hits), then reports the peak RSS growth of the API process and of its
+compression workers. 'buffered' is the old handler (`request.get_data()`
+and the bytes pickled to the pool); 'spooled' is `/api/compress`
+(size-capped spool to a temp file, workers decode from an mmap).
+
+Run from backend/python-ai:  python benchmarks/bench_compress_upload.py
+"""
+from __future__ import annotations
+import http.client
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(HERE, '..')
+sys.path.insert(0, HERE)
+
+from bench_compress_decode import make_photo  # noqa: E402
+
+# Executed in the server subprocess: argv = port
+SERVER = r'''
+import sys
+from flask import request
+from werkzeug.serving import make_server
+import app as api
+from compressor import compress_image
+
+@api.app.route("/legacy/compress", methods=["POST"])
+def legacy_compress():
+    img_bytes = request.get_data()
+    return api.compress_pool.run(compress_image, img_bytes, max_dim=512, jpeg_quality=75)
+
+server = make_server("127.0.0.1", int(sys.argv[1]), api.app, threaded=True)
+print("ready", flush=True)
+server.serve_forever()
+'''
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def rss_kb(pid: int, field: str) -> int:
+    with open(f'/proc/{pid}/status') as f:
+        return next(int(line.split()[1]) for line in f if line.startswith(field))
+
+
+def children(pid: int) -> list:
+    with open(f'/proc/{pid}/task/{pid}/children') as f:
+        return [int(p) for p in f.read().split()]
+
+
+def post(port: int, path: str, body: bytes) -> int:
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+    conn.request('POST', path, body=body, headers={'Content-Type': 'application/octet-stream'})
+    status = conn.getresponse().status
+    conn.close()
+    return status
+
+
+def run(mode: str, clients: int, photo: bytes, warmup: bytes) -> dict:
+    port = free_port()
+    env = dict(os.environ, COMPRESS_WORKERS='2', COMPRESS_QUEUE_SIZE='64', IMAGE_CACHE_DIR='',
+               IMAGE_CACHE_MEMORY_BYTES='0', RESPONSE_CACHE_SIZE='0')
+    proc = subprocess.Popen([sys.executable, '-c', SERVER, str(port)], cwd=ROOT, env=env,
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    try:
+        proc.stdout.readline()
+        path = '/legacy/compress' if mode == 'buffered' else '/api/compress'
+        post(port, path, warmup)  # start the workers with a small image
+        base = rss_kb(proc.pid, 'VmRSS:')
+
+        statuses = []
+        threads = [threading.Thread(target=lambda i=i: statuses.append(post(port, path, photo + b'%08d' % i)))
+                   for i in range(clients)]
+        t0 = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - t0
+        return {
+            'api_mb': (rss_kb(proc.pid, 'VmHWM:') - base) / 1024,
+            'workers_mb': sum(rss_kb(pid, 'VmHWM:') for pid in children(proc.pid)) / 1024,
+            'ok': statuses.count(200),
+            's': elapsed,
+        }
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main() -> int:
+    photo = make_photo(6000, 4000)
+    warmup = make_photo(64, 64)
+    print(f"upload: 24 MP JPEG, {len(photo) / 2 ** 20:.1f} MB")
+    print(f"{'clients':>7} {'mode':>9} {'API peak MB':>12} {'workers peak MB':>16} {'ok':>4} {'seconds':>8}")
+    for clients in (1, 4, 8):
+        for mode in ('buffered', 'spooled'):
+            r = run(mode, clients, photo, warmup)
+            print(f"{clients:>7} {mode:>9} {r['api_mb']:>12.1f} {r['workers_mb']:>16.1f} {r['ok']:>4} {r['s']:>8.1f}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""Benchmark: near-duplicate lookup latency as the hash index grows.
+
+Fills a `HashIndex` with random 64-bit hashes (1k to 100k images) and
+times `nearest()` for queries that are perturbed copies of indexed hashes
+(hits) and for unrelated hashes (misses), at the default radius (6 bits)
+and a looser one (10 bits). A vectorized NumPy linear scan over all hashes
+is the baseline. Also reports insert throughput and the cost of `dhash`
+on an already decoded 512 px image.
+
+Run from backend/python-ai:  python benchmarks/bench_image_index.py
+"""
+from __future__ import annotations
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+sys.path.insert(0, HERE)
+
+from bench_compress_decode import make_photo  # noqa: E402
+from compressor import decode_image, dhash  # noqa: E402
+from image_index import HashIndex  # noqa: E402
+
+SIZES = (1_000, 10_000, 100_000)
+QUERIES = 500
+
+# popcount of every byte value, for the NumPy baseline
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def scan(hashes: np.ndarray, query: int, radius: int):
+    distances = _POPCOUNT[(hashes ^ np.uint64(query)).view(np.uint8)].reshape(-1, 8).sum(axis=1)
+    best = int(distances.argmin())
+    return (best, int(distances[best])) if distances[best] <= radius else None
+
+
+def perturb(rng: random.Random, value: int, bits: int) -> int:
+    for bit in rng.sample(range(64), bits):
+        value ^= 1 << bit
+    return value
+
+
+def percentiles_us(samples):
+    ordered = sorted(samples)
+    return ordered[len(ordered) // 2] * 1e6, ordered[int(len(ordered) * 0.99)] * 1e6
+
+
+def main() -> int:
+    rng = random.Random(0)
+    img = decode_image(make_photo(4032, 3024), 512)
+    t0 = time.perf_counter()
+    for _ in range(1000):
+        dhash(img)
+    print(f"dhash on a decoded 512 px image: {(time.perf_counter() - t0):.3f} ms/call")
+
+    print(f"{'entries':>8} {'insert/s':>9} {'radius':>6} {'query':>5} {'index p50 us':>13} {'index p99 us':>13} "
+          f"{'scan p50 us':>12} {'candidates':>11}")
+    for size in SIZES:
+        hashes = [rng.getrandbits(64) for _ in range(size)]
+        index = HashIndex(max_entries=size)
+        t0 = time.perf_counter()
+        for i, h in enumerate(hashes):
+            index.add(h, str(i))
+        insert_rate = size / (time.perf_counter() - t0)
+        array = np.array(hashes, dtype=np.uint64)
+
+        for radius in (6, 10):
+            for kind in ('hit', 'miss'):
+                queries = [perturb(rng, rng.choice(hashes), rng.randint(0, radius)) if kind == 'hit'
+                           else rng.getrandbits(64) for _ in range(QUERIES)]
+                before = index.stats()['candidates']
+                timings, found = [], 0
+                for q in queries:
+                    t0 = time.perf_counter()
+                    found += index.nearest(q, radius) is not None
+                    timings.append(time.perf_counter() - t0)
+                candidates = (index.stats()['candidates'] - before) / QUERIES
+                scan_timings = []
+                for q in queries[:100]:
+                    t0 = time.perf_counter()
+                    scan(array, q, radius)
+                    scan_timings.append(time.perf_counter() - t0)
+                p50, p99 = percentiles_us(timings)
+                print(f"{size:>8} {insert_rate:>9.0f} {radius:>6} {kind:>5} {p50:>13.1f} {p99:>13.1f} "
+                      f"{percentiles_us(scan_timings)[0]:>12.1f} {candidates:>11.1f}")
+                if kind == 'hit' and found != QUERIES:
+                    print(f"  !! only {found}/{QUERIES} planted near-duplicates found")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
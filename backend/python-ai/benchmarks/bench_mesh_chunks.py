@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""Benchmark: chunked image transfer over a simulated lossy mesh link.
+
+Sends the /api/compress output for a 12 MP photo through `ChunkOutbox` /
+`Reassembler` over a simulated link (1 Mbit/s, 40 ms one-way latency with
+up to 20 ms jitter, so chunks arrive out of order) that drops each frame
+in either direction with probability p. The receiver re-requests missing
+chunks once a transfer has been idle for 200 ms. Time is simulated, so the
+numbers are independent of this machine; the CPU cost of chunking and
+reassembly is measured separately.
+
+Run from backend/python-ai:  python benchmarks/bench_mesh_chunks.py
+"""
+from __future__ import annotations
+import heapq
+import os
+import random
+import statistics
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+sys.path.insert(0, HERE)
+
+from bench_compress_decode import make_photo  # noqa: E402
+from compressor import compress_image  # noqa: E402
+from mesh_chunks import ChunkOutbox, Reassembler, encode_message  # noqa: E402
+
+BANDWIDTH = 125_000      # bytes/s
+LATENCY = 0.040          # s, one way
+JITTER = 0.020           # s
+TICK = 0.050             # receiver polls for due re-requests
+NACK_AFTER = 0.200
+TIMEOUT = 30.0
+TRIALS = 20
+
+
+class Link:
+    """One direction of the link: serializes frames at BANDWIDTH, then delays/drops them."""
+
+    def __init__(self, loss: float, rng: random.Random):
+        self.loss = loss
+        self.rng = rng
+        self.free_at = 0.0
+        self.frames = 0
+
+    def send(self, now: float, msg: dict, events: list, kind: str) -> None:
+        size = len(encode_message(msg)) + 1
+        self.free_at = max(self.free_at, now) + size / BANDWIDTH
+        self.frames += 1
+        if self.rng.random() >= self.loss:
+            arrive = self.free_at + LATENCY + self.rng.uniform(0, JITTER)
+            heapq.heappush(events, (arrive, self.rng.random(), kind, msg))
+
+
+def transfer(payload: bytes, loss: float, mtu: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    clock = [0.0]
+    outbox = ChunkOutbox('sender', mtu=mtu)
+    inbox = Reassembler('receiver', mtu=mtu, nack_after=NACK_AFTER, max_nacks=50, timeout=TIMEOUT,
+                        clock=lambda: clock[0])
+    forward, back = Link(loss, rng), Link(loss, rng)
+    events: list = []
+    messages = outbox.send(payload)
+    for msg in messages:
+        forward.send(0.0, msg, events, 'chunk')
+    heapq.heappush(events, (TICK, 0.0, 'tick', None))
+
+    while events:
+        now, _, kind, msg = heapq.heappop(events)
+        clock[0] = now
+        if now > TIMEOUT:
+            break
+        if kind == 'chunk':
+            if inbox.add(msg) is not None:
+                return {'ok': True, 'seconds': now, 'chunks': len(messages),
+                        'resent': outbox.stats()['chunks_resent'], 'nacks': inbox.stats()['nacks_sent']}
+        elif kind == 'nack':
+            for chunk in outbox.handle_nack(msg):
+                forward.send(now, chunk, events, 'chunk')
+        else:
+            for nack in inbox.nacks():
+                back.send(now, nack, events, 'nack')
+            heapq.heappush(events, (now + TICK, 0.0, 'tick', None))
+    return {'ok': False, 'seconds': TIMEOUT, 'chunks': len(messages),
+            'resent': outbox.stats()['chunks_resent'], 'nacks': inbox.stats()['nacks_sent']}
+
+
+def cpu_cost(payload: bytes, mtu: int, repeats: int = 200) -> float:
+    """MB/s of payload through split + shuffled reassembly."""
+    rng = random.Random(0)
+    outbox = ChunkOutbox('sender', mtu=mtu, max_transfers=1)
+    inbox = Reassembler('receiver', mtu=mtu)
+    t0 = time.perf_counter()
+    for _ in range(repeats):
+        messages = outbox.send(payload)
+        rng.shuffle(messages)
+        for msg in messages:
+            inbox.add(msg)
+    return len(payload) * repeats / (time.perf_counter() - t0) / 2 ** 20
+
+
+def main() -> int:
+    payload = compress_image(make_photo(4032, 3024), max_dim=512, jpeg_quality=75)
+    print(f"payload: {len(payload)} bytes; link {BANDWIDTH * 8 // 1000} kbit/s, {LATENCY * 1000:.0f} ms "
+          f"+ up to {JITTER * 1000:.0f} ms jitter; {TRIALS} trials per row")
+    print(f"{'mtu':>5} {'loss':>5} {'chunks':>7} {'done':>5} {'p50 ms':>7} {'p95 ms':>7} "
+          f"{'goodput KB/s':>13} {'resent':>7} {'nacks':>6}")
+    for mtu in (512, 1200):
+        for loss in (0.0, 0.01, 0.05, 0.10, 0.20):
+            runs = [transfer(payload, loss, mtu, seed) for seed in range(TRIALS)]
+            done = [r for r in runs if r['ok']]
+            secs = sorted(r['seconds'] for r in done) or [TIMEOUT]
+            p95 = secs[min(len(secs) - 1, int(round(0.95 * (len(secs) - 1))))]
+            print(f"{mtu:>5} {loss:>5.0%} {runs[0]['chunks']:>7} {len(done):>2}/{TRIALS:<2} "
+                  f"{statistics.median(secs) * 1000:>7.0f} {p95 * 1000:>7.0f} "
+                  f"{len(payload) / statistics.median(secs) / 1024:>13.1f} "
+                  f"{statistics.mean(r['resent'] for r in runs):>7.1f} "
+                  f"{statistics.mean(r['nacks'] for r in runs):>6.1f}")
+    for mtu in (512, 1200):
+        print(f"chunk + reassemble CPU, mtu {mtu}: {cpu_cost(payload, mtu):.0f} MB/s")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
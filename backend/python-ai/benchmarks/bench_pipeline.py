@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""Benchmark: multi-call classify/advice/rewrite flow vs one /api/pipeline call.
+
+The frontend flow for a message is /api/classify, then /api/mood-advice
+(which recomputes today's trends) and, for negative messages, /api/rewrite.
+This sends the same messages through that flow and through a single
+/api/pipeline request (stages classify, rewrite, advice), both in-process
+(Flask test client: handler cost only) and over HTTP to a local server
+on a keep-alive connection (adds the per-request round trip). The response
+cache is disabled so every call computes. Also prints the pipeline's own
+average per-stage timings.
+
+Run from backend/python-ai:  python benchmarks/bench_pipeline.py
+"""
+from __future__ import annotations
+import http.client
+import json
+import logging
+import os
+import statistics
+import sys
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+os.environ['RESPONSE_CACHE_SIZE'] = '0'
+os.environ.setdefault('IMAGE_CACHE_DIR', '')
+os.environ.setdefault('SUMMARIZER_IDF_PATH', '')
+
+from werkzeug.serving import WSGIRequestHandler, make_server  # noqa: E402
+
+import app as api  # noqa: E402
+
+MESSAGES = [
+    "I'm done with this, this is stupid and you always ignore what I say. I hate it.",
+    "Feeling really down and gloomy today, kind of heartbroken. I can't do this.",
+    "Worried and anxious about the storm, a bit scared honestly. I'm terrified.",
+    "So happy and excited about the news, this is amazing!",
+    "Just checking in, all good here. Meeting moved to 3pm.",
+]
+ROUNDS = 200
+
+
+def multi_call(post, text):
+    classified = post('/api/classify', {'text': text, 'user_id': 'bench-multi'})
+    post('/api/mood-advice', {'emotion': classified['label'], 'confidence': classified['score'],
+                              'user_id': 'bench-multi'})
+    if classified['rewrite_suggestions']:
+        post('/api/rewrite', {'text': text, 'tone': 'supportive'})
+
+
+def pipeline(post, text):
+    return post('/api/pipeline', {'text': text, 'user_id': 'bench-pipeline',
+                                  'stages': ['classify', 'rewrite', 'advice']})
+
+
+def measure(flow, post):
+    samples = []
+    for _ in range(ROUNDS):
+        for text in MESSAGES:
+            t0 = time.perf_counter()
+            flow(post, text)
+            samples.append(time.perf_counter() - t0)
+    samples.sort()
+    return statistics.median(samples) * 1000, samples[int(len(samples) * 0.95)] * 1000
+
+
+def test_client_post():
+    client = api.app.test_client()
+
+    def post(path, body):
+        r = client.post(path, json=body)
+        assert r.status_code == 200, r.json
+        return r.json
+    return post
+
+
+def http_post(port):
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+
+    def post(path, body):
+        conn.request('POST', path, body=json.dumps(body), headers={'Content-Type': 'application/json'})
+        r = conn.getresponse()
+        payload = json.loads(r.read())
+        assert r.status == 200, payload
+        return payload
+    return post
+
+
+def main() -> int:
+    WSGIRequestHandler.protocol_version = 'HTTP/1.1'  # keep-alive, like a browser
+    server = make_server('127.0.0.1', 0, api.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    print(f"{len(MESSAGES)} messages x {ROUNDS} rounds")
+    print(f"{'transport':>9} {'flow':>10} {'p50 ms':>8} {'p95 ms':>8}")
+    for transport, post in (('in-proc', test_client_post()), ('http', http_post(server.server_port))):
+        for name, flow in (('multi-call', multi_call), ('pipeline', pipeline)):
+            measure(flow, post)  # warm up
+            p50, p95 = measure(flow, post)
+            print(f"{transport:>9} {name:>10} {p50:>8.3f} {p95:>8.3f}")
+
+    post = test_client_post()
+    stages = {}
+    for text in MESSAGES * 100:
+        for stage, ms in pipeline(post, text)['timings_ms'].items():
+            stages.setdefault(stage, []).append(ms)
+    print('pipeline stage means (ms): ' + ', '.join(f"{s} {statistics.mean(v):.3f}" for s, v in stages.items()))
+    server.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""Benchmark: string-copy vs offset-based sentence segmentation.
+
+For growing inputs this reports, for `split_sentences` (string copies) and
+`sentence_spans` ((start, end) offsets), the number of memory blocks and
+bytes still held by the result, the peak traced memory while segmenting,
+and the wall time. It then does the same for a whole summarization with the
+numpy backend via `summarize` (copies every sentence before scoring in the
+old code path, emulated here with `score_sentences`) and `summarize_spans`.
+
+Run from backend/python-ai:  python benchmarks/bench_sentence_spans.py
+"""
+from __future__ import annotations
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+sys.path.insert(0, HERE)
+
+from bench_summarizer import make_messages  # noqa: E402
+from summarizer import ExtractiveSummarizer, select_top, sentence_spans, split_sentences  # noqa: E402
+
+
+def measure(fn):
+    """Return (result blocks, result MB, peak MB, seconds) for calling fn()."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    t0 = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    stats = after.compare_to(before, 'filename')
+    blocks = sum(s.count_diff for s in stats if s.count_diff > 0)
+    size = sum(s.size_diff for s in stats if s.size_diff > 0)
+    del result
+    return blocks, size / 2 ** 20, peak / 2 ** 20, elapsed
+
+
+def row(name, mb, m):
+    blocks, size, peak, elapsed = m
+    print(f"{name:<34} {mb:>5} {blocks:>10,} {size:>10.1f} {peak:>9.1f} {elapsed:>8.3f}")
+
+
+def main() -> int:
+    rng = random.Random(9)
+    block = ' '.join(make_messages(500, rng))
+    summarizer = ExtractiveSummarizer(backend='numpy')
+
+    def copy_then_score(text):
+        # The pre-span pipeline: materialize every sentence, then score them
+        sentences = split_sentences(text)
+        scores = summarizer.score_sentences(sentences)
+        return [sentences[i] for i in select_top(scores, 5)]
+
+    print(f"{'operation':<34} {'MB':>5} {'blocks':>10} {'held MB':>10} {'peak MB':>9} {'seconds':>8}")
+    for mb in (1, 8, 32):
+        text = block * max(1, (mb * 2 ** 20) // len(block))
+        row('split_sentences (copies)', mb, measure(lambda: split_sentences(text)))
+        row('sentence_spans (offsets)', mb, measure(lambda: sentence_spans(text)))
+        row('summarize, copying sentences', mb, measure(lambda: copy_then_score(text)))
+        row('summarize_spans', mb, measure(lambda: summarizer.summarize_spans(text, 5)))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
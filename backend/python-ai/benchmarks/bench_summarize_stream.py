@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""Benchmark: whole-text summarize vs streaming map-reduce summarize_stream.
+
+Generates synthetic incident logs of growing size in a temporary file and
+reports wall time and peak traced Python memory (tracemalloc) for reading
+the file and summarizing it both ways. The streaming peak should stay flat
+as the input grows.
+
+Run from backend/python-ai:  python benchmarks/bench_summarize_stream.py
+"""
+from __future__ import annotations
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+sys.path.insert(0, HERE)
+
+from bench_summarizer import make_messages  # noqa: E402
+from summarizer import ExtractiveSummarizer, iter_file_chunks  # noqa: E402
+
+
+def write_log(path: str, target_bytes: int, rng: random.Random) -> None:
+    block = '\n'.join(make_messages(200, rng)) + '\n'
+    with open(path, 'w', encoding='utf-8') as f:
+        written = 0
+        while written < target_bytes:
+            f.write(block)
+            written += len(block)
+
+
+def run(fn):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 2 ** 20
+
+
+def main() -> int:
+    rng = random.Random(3)
+    summarizer = ExtractiveSummarizer(backend='numpy')
+    print(f"{'input MB':>8} {'whole s':>8} {'whole peak MB':>14} {'stream s':>9} {'stream peak MB':>15}")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'incident.log')
+        for mb in (1, 4, 16):
+            write_log(path, mb * 2 ** 20, rng)
+
+            def whole():
+                with open(path, encoding='utf-8') as f:
+                    summarizer.summarize(f.read(), max_sentences=5)
+
+            def stream():
+                with open(path, encoding='utf-8') as f:
+                    summarizer.summarize_stream(iter_file_chunks(f), max_sentences=5)
+
+            w_time, w_peak = run(whole)
+            s_time, s_peak = run(stream)
+            print(f"{mb:>8} {w_time:>8.2f} {w_peak:>14.1f} {s_time:>9.2f} {s_peak:>15.1f}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""Benchmark: per-request TF-IDF fit vs a shared corpus-IDF summarizer.
+
+The old /api/summarize path built a new `ExtractiveSummarizer` and fitted a
+`TfidfVectorizer` on every message. The shared summarizer keeps hashed
+document frequencies in a `CorpusIdf` model and only transforms per call.
+Reports per-call latency (mean / p50 / p99) for messages of 4-10 sentences.
+
+Run from backend/python-ai:  python benchmarks/bench_summarizer.py
+"""
+from __future__ import annotations
+import os
+import random
+import statistics
+import sys
+import time
+from typing import Callable, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from summarizer import CorpusIdf, ExtractiveSummarizer  # noqa: E402
+
+WORDS = (
+    "shelter water power outage road blocked bridge flooded hospital triage volunteers "
+    "medical supplies generator fuel radio signal north district south river evacuation "
+    "families children elderly blankets food convoy arrived delayed tonight tomorrow morning "
+    "team checkpoint rubble injured stable rescue helicopter landing zone clear"
+).split()
+
+
+def make_messages(n: int, rng: random.Random) -> List[str]:
+    messages = []
+    for _ in range(n):
+        sentences = []
+        for _ in range(rng.randint(4, 10)):
+            words = rng.sample(WORDS, rng.randint(5, 12))
+            sentences.append(' '.join(words).capitalize() + '.')
+        messages.append(' '.join(sentences))
+    return messages
+
+
+def measure(fn: Callable[[str], object], messages: List[str]) -> List[float]:
+    timings = []
+    for m in messages:
+        t0 = time.perf_counter()
+        fn(m)
+        timings.append((time.perf_counter() - t0) * 1000)
+    return timings
+
+
+def report(name: str, timings: List[float]) -> None:
+    timings = sorted(timings)
+    p99 = timings[int(len(timings) * 0.99) - 1]
+    print(f"{name:<28} mean={statistics.mean(timings):6.3f} ms  "
+          f"p50={statistics.median(timings):6.3f} ms  p99={p99:6.3f} ms")
+
+
+def main() -> int:
+    rng = random.Random(7)
+    warmup = make_messages(200, rng)
+    messages = make_messages(2000, rng)
+
+    shared = ExtractiveSummarizer(idf_model=CorpusIdf())
+    for m in warmup:
+        shared.summarize(m, max_sentences=3)
+
+    per_request = measure(lambda m: ExtractiveSummarizer().summarize(m, max_sentences=3), messages)
+    corpus = measure(lambda m: shared.summarize(m, max_sentences=3), messages)
+
+    print(f"{len(messages)} messages, 4-10 sentences each")
+    report('per-request fit', per_request)
+    report('shared corpus IDF', corpus)
+    print(f"speedup (mean): {statistics.mean(per_request) / statistics.mean(corpus):.1f}x")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""Benchmark: scikit-learn vs pure-NumPy summarizer backends.
+
+For each backend this reports, measured in a fresh interpreter:
+  - import time of `summarizer` plus constructing the summarizer,
+  - peak RSS after summarizing one message,
+and, in this process, per-call latency of `summarize` with a per-message
+fit and with a shared corpus IDF. It also checks that both backends select
+the same sentences on the benchmark corpus.
+
+Run from backend/python-ai:  python benchmarks/bench_summarizer_backends.py
+"""
+from __future__ import annotations
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(HERE, '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HERE)
+
+from bench_summarizer import make_messages  # noqa: E402
+from summarizer import BACKENDS, CorpusIdf, ExtractiveSummarizer  # noqa: E402
+
+# Executed in a fresh interpreter per backend
+STARTUP_PROBE = r'''
+import json, resource, sys, time
+t0 = time.perf_counter()
+import summarizer
+s = summarizer.ExtractiveSummarizer(backend=sys.argv[1])
+elapsed = time.perf_counter() - t0
+s.summarize("Power is out. Water is low. The bridge is closed. Volunteers are here. Roads are flooded.", 2)
+try:
+    # VmHWM is reset on exec, unlike ru_maxrss which can inherit the parent's peak
+    with open("/proc/self/status") as f:
+        rss_kb = next(int(l.split()[1]) for l in f if l.startswith("VmHWM:"))
+except OSError:
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({"import_ms": elapsed * 1000, "rss_mb": rss_kb / 1024,
+                  "sklearn_loaded": any(m.startswith("sklearn") for m in sys.modules)}))
+'''
+
+
+def startup(backend: str) -> dict:
+    runs = []
+    for _ in range(3):
+        out = subprocess.run([sys.executable, '-c', STARTUP_PROBE, backend], cwd=ROOT,
+                             capture_output=True, text=True, check=True)
+        runs.append(json.loads(out.stdout))
+    best = min(runs, key=lambda r: r['import_ms'])
+    return best
+
+
+def latency_ms(summarizer: ExtractiveSummarizer, messages) -> float:
+    t0 = time.perf_counter()
+    for m in messages:
+        summarizer.summarize(m, max_sentences=3)
+    return (time.perf_counter() - t0) * 1000 / len(messages)
+
+
+def main() -> int:
+    messages = make_messages(2000, random.Random(11))
+
+    sk = ExtractiveSummarizer(backend='sklearn')
+    np_ = ExtractiveSummarizer(backend='numpy')
+    mismatches = sum(sk.summarize(m, 3) != np_.summarize(m, 3) for m in messages)
+    print(f"ranking check: {len(messages) - mismatches}/{len(messages)} summaries identical")
+
+    print(f"\n{'backend':<8} {'import ms':>10} {'peak RSS MB':>12} {'sklearn?':>9} "
+          f"{'fit ms/call':>12} {'corpus ms/call':>15}")
+    for backend in BACKENDS:
+        s = startup(backend)
+        fit = latency_ms(ExtractiveSummarizer(backend=backend), messages)
+        corpus = latency_ms(ExtractiveSummarizer(CorpusIdf(backend=backend), backend=backend), messages)
+        print(f"{backend:<8} {s['import_ms']:>10.1f} {s['rss_mb']:>12.1f} {str(s['sklearn_loaded']):>9} "
+              f"{fit:>12.3f} {corpus:>15.3f}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
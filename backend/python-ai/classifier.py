@@ -2,8 +2,10 @@
 # Small rule-based classifier used by the Flask API to prioritize incoming
 # short messages (for example from the chat UI). The goal is to be simple,
 # deterministic, and easy to audit; this is NOT a full NLP model.
-import re
-from typing import List, Tuple
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
 
 # Emotion keyword dictionaries for classification. These are plain-text
 # substring matches (the incoming message is lowercased before matching).
@@ -32,19 +34,149 @@ SCARED_KEYWORDS = {
 }
 
 
-def classify_text(text: str) -> Tuple[str, float, List[str]]:
+# Emotion name -> keyword set, and the tie-break priority used when several
+# emotions have the same number of hits.
+EMOTION_KEYWORDS = {
+    'angry': ANGRY_KEYWORDS,
+    'sad': SAD_KEYWORDS,
+    'scared': SCARED_KEYWORDS,
+    'happy': HAPPY_KEYWORDS,
+}
+EMOTION_PRIORITY = ('angry', 'sad', 'scared', 'happy')
+
+# Per-emotion hits: emotion -> {keyword: None}. A dict is used as an
+# insertion-ordered set so matched keywords keep their first-seen order.
+Hits = Dict[str, Dict[str, None]]
+
+
+class KeywordMatcher:
+    """Aho-Corasick automaton over the emotion keyword sets.
+
+    The automaton is built once from all keyword sets and finds every
+    (emotion, keyword) substring hit in a single left-to-right pass over the
+    text, so the cost of a scan depends on the text length rather than on the
+    number of keywords in the lexicon.
+
+    `feed` takes and returns the automaton state, which lets callers resume a
+    scan where a previous one stopped (e.g. when text is appended).
+    """
+
+    def __init__(self, lexicon: Dict[str, Iterable[str]]):
+        self.emotions = tuple(lexicon)
+        # Trie transitions, failure links and outputs, indexed by state id.
+        # State 0 is the root.
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[Tuple[str, str], ...]] = [()]
+
+        for emotion, keywords in lexicon.items():
+            for kw in keywords:
+                if kw:
+                    self._add(kw, emotion)
+        self._link()
+
+    def _add(self, keyword: str, emotion: str) -> None:
+        state = 0
+        for ch in keyword:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            state = nxt
+        self._out[state] += ((emotion, keyword),)
+
+    def _link(self) -> None:
+        # Breadth-first over the trie: a state's failure link is the longest
+        # proper suffix that is also a trie path. Outputs of the failure
+        # target are merged in so `feed` never has to walk the links to
+        # collect shorter keywords ending at the same position.
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                target = self._goto[f].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] += self._out[self._fail[nxt]]
+
+    def new_hits(self) -> Hits:
+        return {emotion: {} for emotion in self.emotions}
+
+    def feed(self, text: str, state: int = 0, hits: Optional[Hits] = None) -> Tuple[int, Hits]:
+        """Scan `text` starting from automaton `state`.
+
+        Matches are added to `hits` (a fresh one is created if omitted).
+        Returns the state after the last character together with the hits.
+        """
+        if hits is None:
+            hits = self.new_hits()
+        goto, fail, out = self._goto, self._fail, self._out
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for emotion, kw in out[state]:
+                hits[emotion][kw] = None
+        return state, hits
+
+    def find(self, text: str) -> Hits:
+        """Return all keyword hits in `text` (which should already be lowercased)."""
+        return self.feed(text)[1]
+
+
+def build_matcher() -> KeywordMatcher:
+    """Build a matcher from the current module-level keyword sets.
+
+    Call this again (and assign to `_MATCHER`) after editing the keyword sets
+    at runtime.
+    """
+    return KeywordMatcher(EMOTION_KEYWORDS)
+
+
+_MATCHER = build_matcher()
+
+
+def label_from_hits(hits: Hits) -> Tuple[str, float, List[str]]:
+    """Turn per-emotion hits into the (label, score, matched) result."""
+    # Count matches for each emotion and find the emotion with most matches
+    max_score = max((len(hits.get(e, ())) for e in EMOTION_PRIORITY), default=0)
+
+    if max_score == 0:
+        return "normal", 0.2, []
+
+    # Priority order if tied: angry > sad > scared > happy
+    for emotion in EMOTION_PRIORITY:
+        if len(hits.get(emotion, ())) == max_score:
+            confidence = min(1.0, max_score * 0.3 + 0.4)
+            return emotion, confidence, list(hits[emotion])
+
+    return "normal", 0.2, []
+
+
+def classify_text(text: str, lowered: Optional[str] = None) -> Tuple[str, float, List[str]]:
     """Classify a short message into an emotion label.
 
     Returns:
       - label: 'happy' | 'sad' | 'angry' | 'scared' | 'normal'
       - score: heuristic confidence based on keyword matches (0.0 to 1.0)
-      - matched_keywords: the subset of keywords that matched the text
+      - matched_keywords: the subset of keywords that matched the text, in
+        order of first appearance
 
     Implementation notes:
       - Empty or whitespace-only input is treated as 'normal' with score 0.0.
+      - Callers that already lowercased the text can pass it as `lowered`.
       - We scan for emotion keywords and return the emotion with most matches.
       - If multiple emotions tie, priority is: angry > sad > scared > happy.
       - Confidence increases with more keyword matches.
+      - All keyword sets are matched in one pass with a prebuilt Aho-Corasick
+        automaton (see `KeywordMatcher`), so adding keywords doesn't slow
+        down classification.
       - This function is intentionally simple: it avoids ML model dependencies
         so it can run offline and be inspected/edited easily.
     """
@@ -53,40 +185,128 @@ def classify_text(text: str) -> Tuple[str, float, List[str]]:
         return "normal", 0.0, []
 
     # Lowercase the input for case-insensitive substring matching
-    t = text.lower()
-
-    # Collect matches from each emotion set
-    happy_hits = [kw for kw in HAPPY_KEYWORDS if kw in t]
-    sad_hits = [kw for kw in SAD_KEYWORDS if kw in t]
-    angry_hits = [kw for kw in ANGRY_KEYWORDS if kw in t]
-    scared_hits = [kw for kw in SCARED_KEYWORDS if kw in t]
-
-    # Count matches for each emotion
-    emotion_scores = {
-        'happy': len(happy_hits),
-        'sad': len(sad_hits),
-        'angry': len(angry_hits),
-        'scared': len(scared_hits)
-    }
-
-    # Find the emotion with most matches
-    max_score = max(emotion_scores.values())
-    
-    if max_score == 0:
-        return "normal", 0.2, []
-    
-    # Priority order if tied: angry > sad > scared > happy
-    if emotion_scores['angry'] == max_score:
-        confidence = min(1.0, max_score * 0.3 + 0.4)
-        return "angry", confidence, angry_hits
-    elif emotion_scores['sad'] == max_score:
-        confidence = min(1.0, max_score * 0.3 + 0.4)
-        return "sad", confidence, sad_hits
-    elif emotion_scores['scared'] == max_score:
-        confidence = min(1.0, max_score * 0.3 + 0.4)
-        return "scared", confidence, scared_hits
-    elif emotion_scores['happy'] == max_score:
-        confidence = min(1.0, max_score * 0.3 + 0.4)
-        return "happy", confidence, happy_hits
-    
-    return "normal", 0.2, []
+    t = text.lower() if lowered is None else lowered
+
+    # Collect matches from every emotion set in a single pass
+    return label_from_hits(_MATCHER.find(t))
+
+
+def classify_batch(texts: Sequence[str]) -> List[Tuple[str, float, List[str]]]:
+    """Classify a list of messages in one call.
+
+    Each message is scanned once with the shared matcher and its
+    per-emotion hit counts go into one (n_texts x n_emotions) array; the
+    label, confidence and tie-break are then computed for the whole batch
+    with NumPy.
+
+    Returns one (label, score, matched) tuple per input, identical to
+    calling `classify_text` on each message.
+    """
+    n = len(texts)
+    if n == 0:
+        return []
+
+    find = _MATCHER.find
+    all_hits = [find(text.lower()) if text and text.strip() else None for text in texts]
+    blank = np.fromiter((hits is None for hits in all_hits), dtype=bool, count=n)
+
+    # (n_texts x n_emotions) hit counts, columns in tie-break priority order
+    # so argmax picks the highest-priority emotion among ties.
+    counts = np.zeros((n, len(EMOTION_PRIORITY)), dtype=np.int32)
+    for i, hits in enumerate(all_hits):
+        if hits is not None:
+            counts[i] = [len(hits.get(emotion, ())) for emotion in EMOTION_PRIORITY]
+    best = counts.argmax(axis=1)
+    max_score = counts[np.arange(n), best]
+    confidence = np.minimum(1.0, max_score * 0.3 + 0.4)
+
+    results: List[Tuple[str, float, List[str]]] = []
+    for i in range(n):
+        if blank[i]:
+            results.append(("normal", 0.0, []))
+        elif max_score[i] == 0:
+            results.append(("normal", 0.2, []))
+        else:
+            emotion = EMOTION_PRIORITY[best[i]]
+            results.append((emotion, float(confidence[i]), list(all_hits[i][emotion])))
+    return results
+
+
+class IncrementalClassifier:
+    """Classify-as-you-type session for a single draft.
+
+    Keeps the matcher state after every character of the draft plus the
+    per-emotion keyword hit counts, so appending text or replacing the tail
+    from some offset only scans the changed part. `result()` always equals
+    `classify_text(draft)` for the current draft.
+
+    Memory is one int per draft character plus one record per keyword hit;
+    the draft text itself is not stored.
+    """
+
+    def __init__(self, matcher: Optional[KeywordMatcher] = None):
+        self._matcher = matcher or _MATCHER
+        # _states[i] is the automaton state after the first i characters
+        self._states: List[int] = [0]
+        # (end offset, emotion, keyword) for every hit, in scan order
+        self._events: List[Tuple[int, str, str]] = []
+        # emotion -> {keyword: occurrences}; keys stay in first-seen order
+        self._counts: Dict[str, Dict[str, int]] = {e: {} for e in self._matcher.emotions}
+        # Offset of the first non-whitespace character, None if there is none
+        self._first_content: Optional[int] = None
+
+    def __len__(self) -> int:
+        return len(self._states) - 1
+
+    def append(self, tail: str) -> Tuple[str, float, List[str]]:
+        """Append `tail` to the draft and return the updated classification."""
+        matcher = self._matcher
+        goto, fail, out = matcher._goto, matcher._fail, matcher._out
+        states, events, counts = self._states, self._events, self._counts
+        state = states[-1]
+        pos = len(states) - 1
+        for ch in tail:
+            if self._first_content is None and not ch.isspace():
+                self._first_content = pos
+            pos += 1
+            # Lowercase per character, as classify_text does for the whole text
+            for lc in ch.lower():
+                while state and lc not in goto[state]:
+                    state = fail[state]
+                state = goto[state].get(lc, 0)
+                for emotion, kw in out[state]:
+                    events.append((pos, emotion, kw))
+                    hits = counts[emotion]
+                    hits[kw] = hits.get(kw, 0) + 1
+            states.append(state)
+        return self.result()
+
+    def truncate(self, offset: int) -> None:
+        """Drop everything after the first `offset` characters of the draft."""
+        offset = max(0, min(offset, len(self)))
+        del self._states[offset + 1:]
+        events, counts = self._events, self._counts
+        while events and events[-1][0] > offset:
+            _, emotion, kw = events.pop()
+            hits = counts[emotion]
+            if hits[kw] == 1:
+                del hits[kw]
+            else:
+                hits[kw] -= 1
+        if self._first_content is not None and self._first_content >= offset:
+            self._first_content = None
+
+    def replace(self, offset: int, text: str) -> Tuple[str, float, List[str]]:
+        """Replace the draft from `offset` onwards with `text`."""
+        self.truncate(offset)
+        return self.append(text)
+
+    def reset(self, text: str = '') -> Tuple[str, float, List[str]]:
+        """Start over with `text` as the whole draft."""
+        return self.replace(0, text)
+
+    def result(self) -> Tuple[str, float, List[str]]:
+        """Classification of the current draft (same as `classify_text`)."""
+        if self._first_content is None:
+            return "normal", 0.0, []
+        return label_from_hits(self._counts)
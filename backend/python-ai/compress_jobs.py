@@ -0,0 +1,140 @@
+# compress_jobs.py
+# Job table behind the asynchronous /api/compress/jobs API. A client on a
+# slow link submits an upload, gets a job id back at once and later polls
+# (or long-polls) for the status and fetches the result exactly once,
+# instead of holding a request open for the whole compression.
+#
+# The work itself runs on the `CompressionPool`; this module only tracks
+# the futures. The table is bounded, and finished results that are never
+# fetched are dropped after a TTL.
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional
+
+from latency import summary_ms
+
+PENDING, DONE, FAILED = 'pending', 'done', 'failed'
+
+
+class JobTableFull(Exception):
+    """Raised when the table holds `max_jobs` unfinished jobs."""
+
+
+class Job:
+    __slots__ = ('job_id', 'status', 'created', 'finished', 'result', 'error', 'event')
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.status = PENDING
+        self.created = time.monotonic()
+        self.finished: Optional[float] = None
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.event = threading.Event()
+
+    def describe(self) -> Dict[str, Any]:
+        end = self.finished if self.finished is not None else time.monotonic()
+        info = {'job_id': self.job_id, 'status': self.status,
+                'elapsed_ms': round((end - self.created) * 1000, 1)}
+        if self.error is not None:
+            info['error'] = str(self.error)
+        return info
+
+
+class JobTable:
+    """Bounded table of compression jobs with TTL cleanup of finished ones.
+
+    `submit(start, finish)` calls `start()` for a Future, registers the job
+    and returns it; when the future resolves, `finish(value)` turns the
+    pool result into the stored job result (an exception marks the job
+    failed). When `max_jobs` are held, the oldest finished jobs are dropped
+    to make room; if all of them are still pending `JobTableFull` is
+    raised. Finished jobs disappear `ttl` seconds after completing or once
+    their result is taken.
+    """
+
+    def __init__(self, max_jobs: int = 1000, ttl: float = 300.0, samples: int = 1024):
+        self.max_jobs = max_jobs
+        self.ttl = ttl
+        self._jobs: 'OrderedDict[str, Job]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=samples)
+        self.pending = 0
+        self._counters = {'submitted': 0, 'completed': 0, 'failed': 0, 'fetched': 0, 'expired': 0,
+                          'rejected': 0}
+
+    def submit(self, start: Callable[[], Future], finish: Callable[[Any], Any] = lambda value: value) -> Job:
+        job = Job(os.urandom(12).hex())
+        with self._lock:
+            self._cleanup(time.monotonic())
+            while len(self._jobs) >= self.max_jobs:
+                oldest = next((j for j in self._jobs.values() if j.status != PENDING), None)
+                if oldest is None:
+                    self._counters['rejected'] += 1
+                    raise JobTableFull(f"{self.max_jobs} jobs pending")
+                del self._jobs[oldest.job_id]
+                self._counters['expired'] += 1
+            future = start()  # may raise (e.g. PoolBusy); nothing registered yet
+            self._jobs[job.job_id] = job
+            self.pending += 1
+            self._counters['submitted'] += 1
+
+        def _done(f: Future) -> None:
+            error = f.exception()
+            result = None
+            if error is None:
+                try:
+                    result = finish(f.result())
+                except Exception as e:
+                    error = e
+            with self._lock:
+                job.finished = time.monotonic()
+                job.status = DONE if error is None else FAILED
+                job.result, job.error = result, error
+                self.pending -= 1
+                self._counters['completed' if error is None else 'failed'] += 1
+                self._latencies.append(job.finished - job.created)
+            job.event.set()
+
+        future.add_done_callback(_done)
+        return job
+
+    def get(self, job_id: str, wait: float = 0.0) -> Optional[Job]:
+        """The job (None if unknown or expired), waiting up to `wait` s for it to finish."""
+        with self._lock:
+            self._cleanup(time.monotonic())
+            job = self._jobs.get(job_id)
+        if job is not None and wait > 0:
+            job.event.wait(wait)
+        return job
+
+    def take(self, job_id: str) -> Optional[Job]:
+        """Remove and return a finished job; a pending job is returned but kept."""
+        with self._lock:
+            self._cleanup(time.monotonic())
+            job = self._jobs.get(job_id)
+            if job is not None and job.status != PENDING:
+                del self._jobs[job_id]
+                self._counters['fetched'] += 1
+        return job
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._cleanup(time.monotonic())
+            latencies = list(self._latencies)
+            return dict(
+                self._counters,
+                pending=self.pending,
+                held=len(self._jobs),
+                max_jobs=self.max_jobs,
+                latency_ms=summary_ms(latencies, (50, 95, 99)),
+            )
+
+    def _cleanup(self, now: float) -> None:
+        stale = [k for k, j in self._jobs.items() if j.finished is not None and now - j.finished > self.ttl]
+        for job_id in stale:
+            del self._jobs[job_id]
+        self._counters['expired'] += len(stale)
@@ -0,0 +1,163 @@
+# compress_pool.py
+# Dedicated process pool for CPU-heavy image work (decode / resize / encode)
+# so bursts of uploads neither serialize on the request threads nor hold the
+# GIL. Submissions go through a bounded queue: when it is full, callers get
+# `PoolBusy` immediately and the API answers 503 with a Retry-After hint.
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from latency import summary_ms
+
+
+class PoolBusy(Exception):
+    """Raised when the submission queue is full.
+
+    `retry_after` is a rough estimate (seconds) of when capacity frees up.
+    """
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"compression queue full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+def _run_timed(fn: Callable, args: Tuple, kwargs: Dict[str, Any]) -> Tuple[Any, float, float]:
+    # Runs in the worker process. time.monotonic() is system-wide on the
+    # platforms we deploy to, so the start time is comparable with the
+    # submit time taken in the parent.
+    start = time.monotonic()
+    result = fn(*args, **kwargs)
+    return result, start, time.monotonic() - start
+
+
+class CompressionPool:
+    """Process pool with a bounded submission queue and per-job timings.
+
+    At most `workers` jobs run at once and at most `queue_size` more wait;
+    anything beyond that is rejected with `PoolBusy` instead of piling up.
+    Queue-wait and compute times of recent jobs are kept for `stats()`.
+
+    `start_method` picks how workers are created (None: the platform
+    default). Forking a process that already runs threads can leave a
+    copied lock held in the child, so with `fork` call `start()` before any
+    thread is started; `forkserver` workers are safe to create at any time.
+    """
+
+    def __init__(self, workers: Optional[int] = None, queue_size: Optional[int] = None,
+                 samples: int = 1024, start_method: Optional[str] = None):
+        self.workers = workers or os.cpu_count() or 1
+        self.mp_context = multiprocessing.get_context(start_method)
+        self.queue_size = self.workers * 2 if queue_size is None else queue_size
+        self._slots = threading.BoundedSemaphore(self.workers + self.queue_size)
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._waits = deque(maxlen=samples)
+        self._computes = deque(maxlen=samples)
+        self.in_flight = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=self.mp_context)
+            return self._executor
+
+    def start(self) -> None:
+        """Create the worker processes now instead of on the first submit."""
+        # A forking executor launches all of its workers on its first job
+        self._get_executor().submit(int)
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """Queue `fn(*args, **kwargs)` in a worker process.
+
+        `fn` must be a picklable module-level function. Returns a Future of
+        its result; raises `PoolBusy` when the queue is full.
+        """
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise PoolBusy(self._retry_after())
+
+        submitted_at = time.monotonic()
+        result: Future = Future()
+        try:
+            inner = self._get_executor().submit(_run_timed, fn, args, kwargs)
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM); start a fresh pool and retry once
+            with self._lock:
+                self._executor = None
+            try:
+                inner = self._get_executor().submit(_run_timed, fn, args, kwargs)
+            except BaseException:
+                self._slots.release()
+                raise
+        except BaseException:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self.in_flight += 1
+            self.submitted += 1
+
+        def _done(f: Future) -> None:
+            self._slots.release()
+            error = f.exception()
+            with self._lock:
+                self.in_flight -= 1
+                if error is None:
+                    value, started_at, compute = f.result()
+                    self.completed += 1
+                    self._waits.append(max(0.0, started_at - submitted_at))
+                    self._computes.append(compute)
+                else:
+                    self.failed += 1
+                    if isinstance(error, BrokenProcessPool):
+                        self._executor = None
+            if error is None:
+                result.set_result(value)
+            else:
+                result.set_exception(error)
+
+        inner.add_done_callback(_done)
+        return result
+
+    def run(self, fn: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """Submit and wait for the result (raises `PoolBusy` if full)."""
+        return self.submit(fn, *args, **kwargs).result(timeout=timeout)
+
+    def _retry_after(self) -> int:
+        # Time for the queued work to drain, from recent compute times
+        with self._lock:
+            avg = sum(self._computes) / len(self._computes) if self._computes else 0.5
+            backlog = self.in_flight
+        return max(1, int(round(avg * backlog / self.workers + 0.5)))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            waits, computes = list(self._waits), list(self._computes)
+            return {
+                'workers': self.workers,
+                'queue_size': self.queue_size,
+                'in_flight': self.in_flight,
+                'queued': max(0, self.in_flight - self.workers),
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'failed': self.failed,
+                'rejected': self.rejected,
+                'queue_wait_ms': summary_ms(waits),
+                'compute_ms': summary_ms(computes),
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
@@ -2,15 +2,251 @@
 # Utilities for decoding image bytes, downscaling if necessary, and re-encoding
 # as JPEG bytes. Used by the Flask `/api/compress` endpoint which either accepts
 # a multipart file field named 'image' or raw bytes in the request body.
+import mmap
+import struct
+import traceback
 import cv2
 import numpy as np
-from typing import Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# JPEG start-of-frame markers (SOF0-SOF15 except DHT, JPG and DAC) carry the
+# image height and width.
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+# libjpeg can decode directly at 1/2, 1/4 or 1/8 scale (DCT scaling), which
+# is much cheaper than a full decode followed by a resize.
+_REDUCED_COLOR_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4),
+                        (2, cv2.IMREAD_REDUCED_COLOR_2))
+
+
+def read_image_header(img_bytes: bytes) -> Optional[Tuple[str, int, int]]:
+    """Return (format, width, height) from a JPEG or PNG header, or None.
+
+    Only the first few bytes/markers are inspected; nothing is decoded.
+    A header with a zero width or height is treated as unreadable (None).
+    """
+    return probe_image_header(img_bytes)[0]
+
+
+def probe_image_header(img_bytes: bytes) -> Tuple[Optional[Tuple[str, int, int]], bool]:
+    """`read_image_header` for a body that may still be arriving.
+
+    Returns (header, complete): `complete` is False when the bytes end
+    before the header could be read, so more of the body may still give a
+    header; otherwise `header` (possibly None) is final.
+    """
+    if len(img_bytes) < 24 and b'\x89PNG\r\n\x1a\n'.startswith(bytes(img_bytes[:8])):
+        return None, False
+    if img_bytes[:8] == b'\x89PNG\r\n\x1a\n' and img_bytes[12:16] == b'IHDR':
+        width, height = struct.unpack('>II', img_bytes[16:24])
+        return ('png', width, height) if width and height else None, True
+
+    if len(img_bytes) < 2:
+        return None, len(img_bytes) == 1 and img_bytes[0] != 0xFF
+    if img_bytes[:2] != b'\xff\xd8':
+        return None, True
+    pos, n = 2, len(img_bytes)
+    while pos + 4 <= n:
+        if img_bytes[pos] != 0xFF:
+            return None, True
+        marker = img_bytes[pos + 1]
+        if marker == 0xFF:  # fill byte
+            pos += 1
+            continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:  # no length field
+            pos += 2
+            continue
+        (length,) = struct.unpack('>H', img_bytes[pos + 2:pos + 4])
+        if marker in _JPEG_SOF_MARKERS:
+            if pos + 9 > n:
+                return None, False
+            height, width = struct.unpack('>HH', img_bytes[pos + 5:pos + 9])
+            # Height 0 (defined by a later DNL marker) or a corrupt frame header
+            return ('jpeg', width, height) if width and height else None, True
+        if marker == 0xDA:  # start of scan without a frame header
+            return None, True
+        pos += 2 + length
+    return None, False
+
+
+def _target_size(w: int, h: int, max_dim: int) -> Optional[Tuple[int, int]]:
+    """(width, height) to shrink a w x h image to, or None if it already fits."""
+    # Compute shrink factor; don't enlarge (scale capped at 1.0)
+    scale = min(max_dim / float(h), max_dim / float(w), 1.0)
+    if scale < 1.0:
+        # Very narrow images would round a side down to 0, which cv2.resize rejects
+        return max(1, int(w * scale)), max(1, int(h * scale))
+    return None
+
+
+def _reduced_decode_flag(w: int, h: int, max_dim: int) -> Tuple[int, int]:
+    """Pick the largest JPEG shrink-on-decode factor that still leaves at
+    least the target resolution, so only a downscale remains afterwards.
+
+    Returns (factor, imdecode flag); (1, IMREAD_COLOR) if no reduction fits.
+    """
+    target = _target_size(w, h, max_dim)
+    if target is None:
+        return 1, cv2.IMREAD_COLOR
+    tw, th = target
+    # Compare long and short sides so an EXIF rotation on decode doesn't matter
+    long_side, short_side = max(w, h), min(w, h)
+    t_long, t_short = max(tw, th), min(tw, th)
+    for factor, flag in _REDUCED_COLOR_FLAGS:
+        if -(-long_side // factor) >= t_long and -(-short_side // factor) >= t_short:
+            return factor, flag
+    return 1, cv2.IMREAD_COLOR
+
+
+def decode_image(img_bytes: bytes, max_dim: int) -> np.ndarray:
+    """Decode image bytes (BGR) downscaled to fit within `max_dim`.
+
+    JPEGs whose header shows they are much larger than the target are
+    decoded at a reduced resolution (1/2, 1/4 or 1/8) so a full-size pixel
+    buffer is never allocated; the remaining resize uses `INTER_AREA`.
+    Raises ValueError if the bytes don't decode to an image.
+    """
+    # Convert bytes -> numpy array required by cv2.imdecode
+    arr = np.frombuffer(img_bytes, dtype=np.uint8)
+
+    header = read_image_header(img_bytes)
+    factor, flag = 1, cv2.IMREAD_COLOR
+    if header is not None and header[0] == 'jpeg':
+        _, w, h = header
+        factor, flag = _reduced_decode_flag(w, h, max_dim)
+
+    img = cv2.imdecode(arr, flag)
+    if img is None and flag != cv2.IMREAD_COLOR:
+        img = cv2.imdecode(arr, cv2.IMREAD_COLOR)
+        factor = 1
+    if img is None:
+        # The bytes didn't decode to a valid image
+        raise ValueError("Could not decode image")
+
+    dh, dw = img.shape[:2]
+    if factor > 1:
+        # Size the output from the original dimensions (as if it had been
+        # decoded at full size), matching the decoded orientation.
+        _, w, h = header
+        ow, oh = (w, h) if (dw >= dh) == (w >= h) else (h, w)
+        new_size = _target_size(ow, oh, max_dim)
+    else:
+        new_size = _target_size(dw, dh, max_dim)
+    if new_size is not None and new_size != (dw, dh):
+        img = cv2.resize(img, new_size, interpolation=cv2.INTER_AREA)
+    return img
+
+
+# Output formats for renditions: extension, quality flag, content type
+RENDITION_FORMATS = {
+    'jpeg': ('.jpg', cv2.IMWRITE_JPEG_QUALITY, 'image/jpeg'),
+    'webp': ('.webp', cv2.IMWRITE_WEBP_QUALITY, 'image/webp'),
+}
+
+
+def supported_formats() -> List[str]:
+    """Rendition formats this OpenCV build can encode."""
+    return [name for name, (ext, _, _) in RENDITION_FORMATS.items() if cv2.haveImageWriter(ext)]
+
+
+def _encode_jpeg(img: np.ndarray, quality: int) -> bytes:
+    ok, enc = cv2.imencode(".jpg", img, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+    if not ok:
+        raise RuntimeError("JPEG encoding failed")
+    return enc.tobytes()
+
+
+def compress_to_budget(
+    img_bytes: bytes,
+    max_bytes: int,
+    max_dim: int = 512,
+    min_quality: int = 30,
+    max_quality: int = 90,
+    max_attempts: int = 12,
+    scale_step: float = 0.75,
+    min_dim: int = 32
+) -> Tuple[bytes, Dict[str, Any]]:
+    """JPEG-compress an image so the output fits in `max_bytes`.
+
+    Starting from the image downscaled to `max_dim`, each resolution is
+    first encoded at `min_quality`; if even that is too large the image is
+    shrunk by `scale_step` (INTER_AREA, from the previous step) and tried
+    again. Otherwise the image is tried at `max_quality` and, if that is too
+    large, the highest quality that fits is found by bisection in between. All encodes happen in memory
+    and at most `max_attempts` are made.
+
+    Returns (jpeg_bytes, info) where info holds the chosen `quality`,
+    `width`, `height`, the output `bytes`, the number of `attempts` and
+    `within_budget`. If nothing fits before the attempts run out or the
+    image reaches `min_dim`, the smallest encode produced is returned with
+    `within_budget` False.
+    """
+    img = decode_image(img_bytes, max_dim)
+    return _fit_budget(img, max_bytes, min_quality, max_quality, max_attempts, scale_step, min_dim)
+
+
+def _fit_budget(img: np.ndarray, max_bytes: int, min_quality: int = 30, max_quality: int = 90,
+                max_attempts: int = 12, scale_step: float = 0.75,
+                min_dim: int = 32) -> Tuple[bytes, Dict[str, Any]]:
+    # The search behind `compress_to_budget`, on an already decoded image
+    attempts = 0
+    best: Optional[Tuple[bytes, int, np.ndarray]] = None      # fits the budget
+    smallest: Optional[Tuple[bytes, int, np.ndarray]] = None  # fallback
+
+    def encode(quality: int) -> bytes:
+        nonlocal attempts, smallest
+        attempts += 1
+        enc = _encode_jpeg(img, quality)
+        if smallest is None or len(enc) < len(smallest[0]):
+            smallest = (enc, quality, img)
+        return enc
+
+    while attempts < max_attempts:
+        enc = encode(min_quality)
+        if len(enc) <= max_bytes:
+            best = (enc, min_quality, img)
+            # Generous budgets fit at full quality; otherwise bisect for the
+            # highest quality that still fits
+            lo, hi = min_quality + 1, max_quality - 1
+            if attempts < max_attempts and max_quality > min_quality:
+                enc = encode(max_quality)
+                if len(enc) <= max_bytes:
+                    best = (enc, max_quality, img)
+                    lo = hi + 1
+            while lo <= hi and attempts < max_attempts:
+                mid = (lo + hi) // 2
+                enc = encode(mid)
+                if len(enc) <= max_bytes:
+                    best = (enc, mid, img)
+                    lo = mid + 1
+                else:
+                    hi = mid - 1
+            break
+
+        # Too large even at the lowest quality: step the resolution down
+        h, w = img.shape[:2]
+        new_size = (int(w * scale_step), int(h * scale_step))
+        if min(new_size) < min_dim:
+            break
+        img = cv2.resize(img, new_size, interpolation=cv2.INTER_AREA)
+
+    enc, quality, chosen = best if best is not None else smallest
+    h, w = chosen.shape[:2]
+    return enc, {
+        'quality': quality,
+        'width': w,
+        'height': h,
+        'bytes': len(enc),
+        'attempts': attempts,
+        'within_budget': best is not None,
+    }
 
 
 def compress_image(
     img_bytes: bytes,
     max_dim: int = 512,
-    jpeg_quality: int = 70
+    jpeg_quality: int = 70,
+    max_bytes: Optional[int] = None
 ) -> bytes:
     """Downscale and JPEG-compress an image.
 
@@ -18,35 +254,143 @@ def compress_image(
       img_bytes: raw bytes (e.g. contents of a PNG or JPEG file)
       max_dim: target maximum width/height (keeps aspect ratio)
       jpeg_quality: JPEG quality 0-100 (higher -> better quality and larger size)
+      max_bytes: optional output size budget. When given, `jpeg_quality` is
+        ignored and quality/resolution are searched instead (see
+        `compress_to_budget`, which also reports the chosen parameters).
 
     Returns:
       JPEG-encoded bytes (the byte string starts with JPEG magic 0xFF 0xD8).
 
     Steps:
-      1. Convert the incoming Python bytes into a numpy uint8 buffer because
-         OpenCV's `imdecode` expects that layout.
+      1. Peek at the image header. Large JPEGs are decoded directly at 1/2,
+         1/4 or 1/8 resolution when that still covers `max_dim`.
       2. Decode into an image array (BGR channels). If decoding fails we raise
          ValueError so the API can return a 400 to the client.
-      3. If either dimension is larger than `max_dim`, compute a scale factor
-         and resize using OpenCV's `INTER_AREA` (good for downscaling).
+      3. If either dimension is still larger than the target, resize using
+         OpenCV's `INTER_AREA` (good for downscaling).
       4. Encode the possibly-resized image as JPEG in memory with the
          requested quality and return the raw bytes.
     """
-    # Convert bytes -> numpy array required by cv2.imdecode
-    arr = np.frombuffer(img_bytes, dtype=np.uint8)
-    img = cv2.imdecode(arr, cv2.IMREAD_COLOR)
-    if img is None:
-        # The bytes didn't decode to a valid image
-        raise ValueError("Could not decode image")
+    if max_bytes is not None:
+        return compress_to_budget(img_bytes, max_bytes, max_dim=max_dim)[0]
 
-    h, w = img.shape[:2]
-    # Compute shrink factor; don't enlarge (scale capped at 1.0)
-    scale = min(max_dim / float(h), max_dim / float(w), 1.0)
-    if scale < 1.0:
-        new_size = (int(w * scale), int(h * scale))
-        img = cv2.resize(img, new_size, interpolation=cv2.INTER_AREA)
+    img = decode_image(img_bytes, max_dim)
+    return _encode_jpeg(img, jpeg_quality)
 
-    ok, enc = cv2.imencode(".jpg", img, [int(cv2.IMWRITE_JPEG_QUALITY), jpeg_quality])
-    if not ok:
-        raise RuntimeError("JPEG encoding failed")
-    return enc.tobytes()
+
+def dhash(img: np.ndarray, hash_size: int = 8) -> int:
+    """64-bit difference hash of a decoded (BGR or grayscale) image.
+
+    The image is reduced to a (hash_size + 1) x hash_size grayscale
+    thumbnail and each bit records whether a pixel is brighter than its
+    right-hand neighbour, so re-encodes, resizes and small edits change
+    only a few bits (compare with Hamming distance).
+    """
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def image_hash(img_bytes: bytes, decode_dim: int = 64) -> int:
+    """`dhash` of a small (shrink-on-decode) thumbnail, without compressing.
+
+    Agrees with the hash `compress_with_hash` reports to within a bit or
+    so, which lets an upload be looked up before it is encoded.
+    """
+    return dhash(decode_image(img_bytes, decode_dim))
+
+
+def compress_with_hash(
+    img_bytes: bytes,
+    max_dim: int = 512,
+    jpeg_quality: int = 70,
+    max_bytes: Optional[int] = None
+) -> Tuple[bytes, Optional[Dict[str, Any]], int]:
+    """`compress_image` plus the `dhash` of the same decoded image.
+
+    Returns (jpeg_bytes, info, hash); info is the `compress_to_budget`
+    report when `max_bytes` is given, else None.
+    """
+    img = decode_image(img_bytes, max_dim)
+    image_hash = dhash(img)
+    if max_bytes is not None:
+        out, info = _fit_budget(img, max_bytes)
+        return out, info, image_hash
+    return _encode_jpeg(img, jpeg_quality), None, image_hash
+
+
+def compress_renditions(img_bytes: bytes, renditions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Produce several renditions of one image from a single decode.
+
+    Args:
+      img_bytes: raw image bytes
+      renditions: list of {name, max_dim, quality, format} dicts; format is
+        'jpeg' (default) or 'webp' (if `supported_formats()` has it)
+
+    The image is decoded once, shrunk to the largest requested size (using
+    shrink-on-decode for JPEGs), and each smaller rendition is resized with
+    `INTER_AREA` from the previous one rather than from the original.
+
+    Returns one dict per rendition, in the requested order, with `name`,
+    `format`, `content_type`, `width`, `height`, `quality` and the encoded
+    `data` bytes. Raises ValueError for bad specs or undecodable input.
+    """
+    if not renditions:
+        raise ValueError("no renditions requested")
+    available = supported_formats()
+    specs = []
+    for i, spec in enumerate(renditions):
+        fmt = spec.get('format', 'jpeg')
+        if fmt not in available:
+            raise ValueError(f"unsupported format {fmt!r}; available: {', '.join(available)}")
+        try:
+            max_dim = int(spec['max_dim'])
+            quality = int(spec.get('quality', 75))
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("each rendition needs an integer max_dim (and optional integer quality)")
+        if max_dim < 1 or not 1 <= quality <= 100:
+            raise ValueError("max_dim must be positive and quality between 1 and 100")
+        specs.append((i, str(spec.get('name', f'r{i}')), fmt, max_dim, quality))
+
+    # Largest first so every step only ever shrinks the previous image
+    ordered = sorted(specs, key=lambda s: -s[3])
+    img = decode_image(img_bytes, ordered[0][3])
+
+    results: List[Optional[Dict[str, Any]]] = [None] * len(specs)
+    for i, name, fmt, max_dim, quality in ordered:
+        h, w = img.shape[:2]
+        new_size = _target_size(w, h, max_dim)
+        if new_size is not None:
+            img = cv2.resize(img, new_size, interpolation=cv2.INTER_AREA)
+        ext, quality_flag, content_type = RENDITION_FORMATS[fmt]
+        ok, enc = cv2.imencode(ext, img, [int(quality_flag), quality])
+        if not ok:
+            raise RuntimeError(f"{fmt} encoding failed")
+        h, w = img.shape[:2]
+        results[i] = {
+            'name': name,
+            'format': fmt,
+            'content_type': content_type,
+            'width': w,
+            'height': h,
+            'quality': quality,
+            'data': enc.tobytes(),
+        }
+    return results
+
+
+def compress_file(path: str, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Run `fn(data, *args, **kwargs)` with `data` a read-only mmap of `path`.
+
+    Lets worker processes decode a spooled upload in place instead of
+    receiving a pickled copy of its bytes.
+    """
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        try:
+            return fn(data, *args, **kwargs)
+        except BaseException as e:
+            # Frames in the traceback may still hold arrays viewing the map,
+            # which would make closing it fail and hide the real error.
+            traceback.clear_frames(e.__traceback__)
+            raise
@@ -0,0 +1,208 @@
+# image_cache.py
+# Content-addressed cache for compressed images. In the mesh the same photo
+# (a map, a flyer, a hazard picture) is forwarded and recompressed over and
+# over; this lets /api/compress return the stored output without decoding.
+#
+# Entries are keyed by a digest of the input bytes plus the compression
+# parameters. There are two tiers:
+#   - a small in-memory LRU bounded by total bytes, and
+#   - a size-capped directory on disk (least recently used files evicted
+#     first) that is re-indexed on startup, so the cache survives restarts.
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+# (output bytes, metadata such as the chosen quality)
+CacheEntry = Tuple[bytes, Dict[str, Any]]
+
+
+def input_digest(img_bytes: bytes) -> str:
+    """Content digest of the uploaded image bytes."""
+    return new_input_hasher(img_bytes).hexdigest()
+
+
+def new_input_hasher(data: bytes = b''):
+    """Hash object producing `input_digest`, for digesting uploads as they stream in."""
+    return hashlib.blake2b(data, digest_size=20)
+
+
+class ImageCache:
+    """Two-tier (memory + disk) content-addressed cache of compressed images."""
+
+    def __init__(self, directory: Optional[str] = None, memory_bytes: int = 32 * 2 ** 20,
+                 disk_bytes: int = 512 * 2 ** 20):
+        self.directory = directory or None
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self._memory: 'OrderedDict[str, CacheEntry]' = OrderedDict()
+        self._memory_used = 0
+        # key -> size on disk, in least-recently-used order
+        self._disk: 'OrderedDict[str, int]' = OrderedDict()
+        self._disk_used = 0
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes_saved = 0    # input bytes that didn't need decoding
+        self.bytes_served = 0   # output bytes served from the cache
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            self._load_index()
+
+    @staticmethod
+    def make_key(digest: str, params: Dict[str, Any]) -> str:
+        payload = json.dumps([digest, params], sort_keys=True)
+        return hashlib.blake2b(payload.encode('utf-8'), digest_size=20).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + '.bin')
+
+    def _load_index(self) -> None:
+        """Rebuild the disk index from the cache directory (oldest first)."""
+        found = []
+        for sub in os.listdir(self.directory):
+            subdir = os.path.join(self.directory, sub)
+            if not os.path.isdir(subdir):
+                continue
+            for name in os.listdir(subdir):
+                path = os.path.join(subdir, name)
+                if name.endswith('.tmp'):
+                    # Left over from an interrupted write
+                    os.remove(path)
+                    continue
+                if not name.endswith('.bin'):
+                    continue
+                st = os.stat(path)
+                found.append((st.st_mtime, name[:-4], st.st_size))
+        for _, key, size in sorted(found):
+            self._disk[key] = size
+            self._disk_used += size
+        self._evict_disk()
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._memory or key in self._disk
+
+    def get(self, key: str, input_size: int = 0) -> Optional[CacheEntry]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                self._count_hit(entry, input_size)
+                return entry
+            on_disk = key in self._disk
+        if on_disk:
+            entry = self._read(key)
+            if entry is not None:
+                with self._lock:
+                    if key in self._disk:
+                        self._disk.move_to_end(key)
+                    self.disk_hits += 1
+                    self._count_hit(entry, input_size)
+                    self._remember(key, entry)
+                return entry
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def _count_hit(self, entry: CacheEntry, input_size: int) -> None:
+        self.bytes_saved += input_size
+        self.bytes_served += len(entry[0])
+
+    def put(self, key: str, data: bytes, meta: Optional[Dict[str, Any]] = None) -> None:
+        entry = (data, meta or {})
+        with self._lock:
+            self._remember(key, entry)
+        if self.directory:
+            size = self._write(key, entry)
+            if size is not None:
+                with self._lock:
+                    self._disk_used += size - self._disk.pop(key, 0)
+                    self._disk[key] = size
+                    self._evict_disk()
+
+    def _remember(self, key: str, entry: CacheEntry) -> None:
+        # Memory tier; caller holds the lock
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_used -= len(old[0])
+        if len(entry[0]) > self.memory_bytes:
+            return
+        self._memory[key] = entry
+        self._memory_used += len(entry[0])
+        while self._memory_used > self.memory_bytes:
+            _, (data, _) = self._memory.popitem(last=False)
+            self._memory_used -= len(data)
+
+    def _evict_disk(self) -> None:
+        # Caller holds the lock (or is the constructor)
+        while self._disk_used > self.disk_bytes and self._disk:
+            key, size = self._disk.popitem(last=False)
+            self._disk_used -= size
+            self.evictions += 1
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def _write(self, key: str, entry: CacheEntry) -> Optional[int]:
+        # File layout: 4-byte metadata length, JSON metadata, output bytes
+        data, meta = entry
+        header = json.dumps(meta).encode('utf-8')
+        path = self._path(key)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp, 'wb') as f:
+                f.write(len(header).to_bytes(4, 'big'))
+                f.write(header)
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError:
+            return None
+        return 4 + len(header) + len(data)
+
+    def _read(self, key: str) -> Optional[CacheEntry]:
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                raw = f.read()
+            os.utime(path)  # keep the LRU order across restarts
+            n = int.from_bytes(raw[:4], 'big')
+            meta = json.loads(raw[4:4 + n].decode('utf-8'))
+            if len(raw) < 4 + n or not isinstance(meta, dict):
+                raise ValueError('truncated cache file')
+        except (OSError, ValueError):
+            # Missing, truncated or corrupt: drop the entry and count a miss
+            with self._lock:
+                size = self._disk.pop(key, None)
+                if size is not None:
+                    self._disk_used -= size
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return raw[4 + n:], meta
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                'memory_entries': len(self._memory),
+                'memory_bytes': self._memory_used,
+                'disk_entries': len(self._disk),
+                'disk_bytes': self._disk_used,
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+                'bytes_saved': self.bytes_saved,
+                'bytes_served': self.bytes_served,
+            }
@@ -0,0 +1,114 @@
+# image_index.py
+# Near-duplicate lookup for 64-bit perceptual image hashes (see
+# `compressor.dhash`). Resent screenshots of the same alert or lightly
+# edited copies hash to within a few bits of each other, so /api/compress
+# can point them at the rendition it already produced.
+#
+# The index uses multi-index hashing: the hash is split into `bands`
+# substrings, each with its own table. If two hashes differ in at most r
+# bits, then by the pigeonhole principle some band differs in at most
+# r // bands bits. A query therefore only probes each table at the few band
+# values within that radius, then checks the full distance of the
+# candidates it finds.
+import threading
+from collections import OrderedDict
+from itertools import combinations
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+HASH_BITS = 64
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+
+class HashIndex:
+    """Bounded multi-index hash table of (hash, ref, tag) entries.
+
+    `ref` identifies the stored item (e.g. an image-cache key) and is unique
+    within the index; `tag` partitions entries (e.g. by compression
+    parameters) so lookups only match items of the same kind. Beyond
+    `max_entries` the oldest entries are dropped.
+    """
+
+    def __init__(self, bands: int = 4, max_entries: int = 100_000):
+        if HASH_BITS % bands:
+            raise ValueError(f"bands must divide {HASH_BITS}")
+        self.bands = bands
+        self.band_bits = HASH_BITS // bands
+        self.max_entries = max_entries
+        self._mask = (1 << self.band_bits) - 1
+        self._tables: List[Dict[int, Set[str]]] = [{} for _ in range(bands)]
+        self._entries: 'OrderedDict[str, Tuple[int, str]]' = OrderedDict()
+        self._flips: Dict[int, List[int]] = {}
+        self._lock = threading.Lock()
+        self._counters = {'lookups': 0, 'matches': 0, 'candidates': 0}
+
+    def _band_values(self, image_hash: int):
+        for b in range(self.bands):
+            yield b, (image_hash >> (b * self.band_bits)) & self._mask
+
+    def _flip_masks(self, radius: int) -> List[int]:
+        # All band-width masks with at most `radius` bits set
+        masks = self._flips.get(radius)
+        if masks is None:
+            masks = [0]
+            for k in range(1, radius + 1):
+                masks.extend(sum(1 << i for i in bits) for bits in combinations(range(self.band_bits), k))
+            self._flips[radius] = masks
+        return masks
+
+    def add(self, image_hash: int, ref: str, tag: str = '') -> None:
+        with self._lock:
+            if ref in self._entries:
+                self._remove(ref)
+            self._entries[ref] = (image_hash, tag)
+            for b, value in self._band_values(image_hash):
+                self._tables[b].setdefault(value, set()).add(ref)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def discard(self, ref: str) -> None:
+        with self._lock:
+            if ref in self._entries:
+                self._remove(ref)
+
+    def nearest(self, image_hash: int, max_distance: int, tag: str = '') -> Optional[Tuple[str, int]]:
+        """Closest entry with the same tag within `max_distance` bits, as (ref, distance)."""
+        masks = self._flip_masks(max_distance // self.bands)
+        best: Optional[Tuple[str, int]] = None
+        with self._lock:
+            seen: Set[str] = set()
+            for b, value in self._band_values(image_hash):
+                table = self._tables[b]
+                for mask in masks:
+                    refs = table.get(value ^ mask)
+                    if refs:
+                        seen.update(refs)
+            for ref in seen:
+                other, other_tag = self._entries[ref]
+                if other_tag != tag:
+                    continue
+                distance = hamming(image_hash, other)
+                if distance <= max_distance and (best is None or distance < best[1]):
+                    best = (ref, distance)
+            self._counters['lookups'] += 1
+            self._counters['candidates'] += len(seen)
+            if best is not None:
+                self._counters['matches'] += 1
+        return best
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._counters, entries=len(self._entries), bands=self.bands)
+
+    def _remove(self, ref: str) -> None:
+        image_hash, _ = self._entries.pop(ref)
+        for b, value in self._band_values(image_hash):
+            refs = self._tables[b][value]
+            refs.discard(ref)
+            if not refs:
+                del self._tables[b][value]
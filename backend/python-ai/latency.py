@@ -0,0 +1,19 @@
+# latency.py
+# Percentile summaries of the timing samples that the /stats endpoints
+# report (compression pool, compression jobs, analytics ingestion queue).
+from typing import Dict, Iterable, Sequence
+
+
+def percentile(values: Iterable[float], pct: float) -> float:
+    """Nearest-rank `pct` percentile of `values`; 0.0 if there are none."""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def summary_ms(seconds: Sequence[float], percentiles: Sequence[int] = (50, 95)) -> Dict[str, float]:
+    """{'p50': ..., 'p95': ..., 'max': ...} of samples in seconds, as milliseconds."""
+    summary = {f"p{pct}": round(percentile(seconds, pct) * 1000, 2) for pct in percentiles}
+    summary['max'] = round(max(seconds, default=0.0) * 1000, 2)
+    return summary
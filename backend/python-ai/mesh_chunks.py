@@ -0,0 +1,376 @@
+# mesh_chunks.py
+# Splits large payloads (e.g. the JPEG from /api/compress) into chunk
+# messages small enough for one mesh frame, and puts them back together on
+# the receiving side.
+#
+# Messages are plain dicts with the fields of `WireMsg` in
+# backend/cpp-mesh/include/message.hpp (msg_id, type, sender, priority,
+# timestamp, ttl, content, chunk_index, chunk_total), so they can be handed
+# to the bridge as JSON. All chunks of one payload share a msg_id; the chunk
+# bytes travel base64-encoded in `content` because the C++ side keeps it in
+# a std::string that must stay valid UTF-8 JSON.
+#
+# Lost chunks are recovered selectively: a receiver that stops making
+# progress sends a `chunk_nack` message listing the missing indices, and the
+# sender's outbox re-sends just those chunks.
+import base64
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+DEFAULT_MTU = 1200
+NACK_TYPE = 'chunk_nack'
+REF_TYPE = 'image_ref'
+MAX_CHUNKS = 65535
+
+Message = Dict[str, Any]
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def encode_message(msg: Message) -> str:
+    """Compact JSON line for a message, as sent to the bridge."""
+    return json.dumps(msg, separators=(',', ':'))
+
+
+def make_message(msg_id: str, msg_type: str, sender: str, content: str = '', priority: int = 0,
+                 ttl: int = 6, chunk_index: int = 0, chunk_total: int = 0,
+                 timestamp: Optional[int] = None) -> Message:
+    return {
+        'msg_id': msg_id,
+        'type': msg_type,
+        'sender': sender,
+        'priority': priority,
+        'timestamp': _now_ms() if timestamp is None else timestamp,
+        'ttl': ttl,
+        'content': content,
+        'chunk_index': chunk_index,
+        'chunk_total': chunk_total,
+    }
+
+
+def new_msg_id(sender: str) -> str:
+    return f"{sender}-{os.urandom(8).hex()}"
+
+
+def chunk_payload_size(mtu: int, msg_id: str, msg_type: str, sender: str) -> int:
+    """Raw payload bytes per chunk so each encoded message (plus newline) fits in `mtu`."""
+    # Size the envelope with the widest index/total and timestamp it can carry
+    envelope = make_message(msg_id, msg_type, sender, priority=-99, ttl=99, chunk_index=MAX_CHUNKS,
+                            chunk_total=MAX_CHUNKS, timestamp=10 ** 13)
+    room = mtu - len(encode_message(envelope)) - 1
+    size = (room // 4) * 3
+    if size <= 0:
+        raise ValueError(f"mtu {mtu} is too small for the message envelope")
+    return size
+
+
+def split_payload(payload: bytes, sender: str, msg_type: str = 'image', mtu: int = DEFAULT_MTU,
+                  msg_id: Optional[str] = None, priority: int = 0, ttl: int = 6,
+                  indices: Optional[Iterable[int]] = None) -> List[Message]:
+    """Split `payload` into chunk messages that each encode to at most `mtu` bytes.
+
+    All chunks share one msg_id (generated from `sender` if not given).
+    `indices` restricts the output to those chunk indices, for re-sends.
+    Raises ValueError if the payload needs more than MAX_CHUNKS chunks.
+    """
+    msg_id = msg_id or new_msg_id(sender)
+    size = chunk_payload_size(mtu, msg_id, msg_type, sender)
+    total = max(1, -(-len(payload) // size))
+    if total > MAX_CHUNKS:
+        raise ValueError(f"payload needs {total} chunks; at most {MAX_CHUNKS} are supported")
+    view = memoryview(payload)
+    timestamp = _now_ms()
+    wanted = range(total) if indices is None else sorted(i for i in set(indices) if 0 <= i < total)
+    return [
+        make_message(msg_id, msg_type, sender,
+                     content=base64.b64encode(view[i * size:(i + 1) * size]).decode('ascii'),
+                     priority=priority, ttl=ttl, chunk_index=i, chunk_total=total, timestamp=timestamp)
+        for i in wanted
+    ]
+
+
+def _format_ranges(indices: List[int]) -> str:
+    """[0, 1, 2, 5, 7, 8] -> '0-2,5,7-8'"""
+    parts = []
+    start = prev = None
+    for i in indices:
+        if start is None:
+            start = prev = i
+        elif i == prev + 1:
+            prev = i
+        else:
+            parts.append(str(start) if start == prev else f"{start}-{prev}")
+            start = prev = i
+    if start is not None:
+        parts.append(str(start) if start == prev else f"{start}-{prev}")
+    return ','.join(parts)
+
+
+def parse_ranges(text: str, limit: int = MAX_CHUNKS) -> List[int]:
+    """'0-2,5' -> [0, 1, 2, 5]; raises ValueError on malformed input."""
+    out = []
+    for part in filter(None, text.split(',')):
+        lo, _, hi = part.partition('-')
+        lo, hi = int(lo), int(hi or lo)
+        if lo < 0 or hi < lo or hi >= limit:
+            raise ValueError(f"bad chunk range {part!r}")
+        out.extend(range(lo, hi + 1))
+    return out
+
+
+def make_nack(msg_id: str, missing: List[int], sender: str, mtu: int = DEFAULT_MTU, ttl: int = 6) -> Message:
+    """Re-request message for the `missing` chunk indices of transfer `msg_id`.
+
+    If the full list doesn't fit in one `mtu`-sized message the tail is left
+    out; it is requested again on the next round.
+    """
+    nack_id = new_msg_id(sender)
+    ranges = _format_ranges(sorted(missing))
+    while True:
+        msg = make_message(nack_id, NACK_TYPE, sender, ttl=ttl,
+                           content=json.dumps({'msg_id': msg_id, 'missing': ranges}, separators=(',', ':')))
+        if len(encode_message(msg)) + 1 <= mtu or ',' not in ranges:
+            return msg
+        ranges = ranges.rsplit(',', 1)[0]
+
+
+def make_ref(ref_msg_id: str, sender: str, distance: int = 0, ttl: int = 6) -> Message:
+    """Message pointing receivers at the earlier transfer `ref_msg_id` instead of
+    sending a near-identical payload again (`distance` bits apart)."""
+    return make_message(new_msg_id(sender), REF_TYPE, sender, ttl=ttl,
+                        content=json.dumps({'msg_id': ref_msg_id, 'distance': distance}, separators=(',', ':')))
+
+
+class _Transfer:
+    __slots__ = ('total', 'chunks', 'received', 'bytes', 'last_progress', 'last_nack', 'nacks')
+
+    def __init__(self, total: int, now: float):
+        self.total = total
+        self.chunks: List[Optional[bytes]] = [None] * total
+        self.received = 0
+        self.bytes = 0
+        self.last_progress = now
+        self.last_nack = 0.0
+        self.nacks = 0
+
+    def missing(self) -> List[int]:
+        return [i for i, c in enumerate(self.chunks) if c is None]
+
+
+class Reassembler:
+    """Reassembles chunk messages, in any order, into payloads.
+
+    Memory is bounded per transfer (`max_transfer_bytes`, `max_chunks`) and
+    overall (`max_total_bytes`, `max_transfers`; the least recently active
+    transfer is dropped to make room). Transfers that make no progress for
+    `timeout` seconds are dropped. `nacks()` produces re-requests for
+    transfers idle for `nack_after` seconds, at most `max_nacks` each.
+    """
+
+    def __init__(self, node_id: str, max_transfers: int = 64, max_transfer_bytes: int = 8 * 2 ** 20,
+                 max_total_bytes: int = 64 * 2 ** 20, max_chunks: int = 4096, timeout: float = 30.0,
+                 nack_after: float = 1.0, max_nacks: int = 5, mtu: int = DEFAULT_MTU,
+                 clock: Callable[[], float] = time.monotonic):
+        self.node_id = node_id
+        self.max_transfers = max_transfers
+        self.max_transfer_bytes = max_transfer_bytes
+        self.max_total_bytes = max_total_bytes
+        self.max_chunks = max_chunks
+        self.timeout = timeout
+        self.nack_after = nack_after
+        self.max_nacks = max_nacks
+        self.mtu = mtu
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._transfers: 'OrderedDict[str, _Transfer]' = OrderedDict()
+        # Recently finished transfers, so late duplicates don't start a new one
+        self._done: 'OrderedDict[str, None]' = OrderedDict()
+        self._bytes = 0
+        self._counters = {'completed': 0, 'expired': 0, 'dropped': 0, 'duplicates': 0, 'invalid': 0,
+                          'nacks_sent': 0}
+
+    def add(self, msg: Message) -> Optional[bytes]:
+        """Add one chunk message; returns the payload once all chunks are in."""
+        try:
+            msg_id = str(msg['msg_id'])
+            index, total = int(msg['chunk_index']), int(msg['chunk_total'])
+            data = base64.b64decode(msg['content'], validate=True)
+        except (KeyError, TypeError, ValueError):
+            with self._lock:
+                self._counters['invalid'] += 1
+            return None
+        now = self.clock()
+        with self._lock:
+            self._expire(now)
+            if msg_id in self._done:
+                self._counters['duplicates'] += 1
+                return None
+            if not 0 < total <= self.max_chunks or not 0 <= index < total:
+                self._counters['invalid'] += 1
+                return None
+            transfer = self._transfers.get(msg_id)
+            if transfer is None:
+                transfer = _Transfer(total, now)
+                self._transfers[msg_id] = transfer
+            elif transfer.total != total:
+                self._counters['invalid'] += 1
+                return None
+            if transfer.chunks[index] is not None:
+                self._counters['duplicates'] += 1
+                return None
+            if transfer.bytes + len(data) > self.max_transfer_bytes:
+                self._drop(msg_id)
+                self._counters['dropped'] += 1
+                return None
+
+            transfer.chunks[index] = data
+            transfer.received += 1
+            transfer.bytes += len(data)
+            transfer.last_progress = now
+            self._bytes += len(data)
+            self._transfers.move_to_end(msg_id)
+
+            if transfer.received == transfer.total:
+                payload = b''.join(transfer.chunks)
+                self._drop(msg_id)
+                self._remember_done(msg_id)
+                self._counters['completed'] += 1
+                return payload
+
+            # Over the global budget: drop the least recently active transfers
+            while self._bytes > self.max_total_bytes or len(self._transfers) > self.max_transfers:
+                oldest = next(iter(self._transfers))
+                self._drop(oldest)
+                self._counters['dropped'] += 1
+                if oldest == msg_id:
+                    break
+            return None
+
+    def missing(self, msg_id: str) -> Optional[List[int]]:
+        """Indices not yet received for an active transfer, or None."""
+        with self._lock:
+            transfer = self._transfers.get(msg_id)
+            return transfer.missing() if transfer is not None else None
+
+    def nacks(self) -> List[Message]:
+        """Re-request messages for transfers that have stalled."""
+        now = self.clock()
+        out = []
+        with self._lock:
+            self._expire(now)
+            for msg_id, transfer in self._transfers.items():
+                idle_since = max(transfer.last_progress, transfer.last_nack)
+                if transfer.nacks >= self.max_nacks or now - idle_since < self.nack_after:
+                    continue
+                transfer.nacks += 1
+                transfer.last_nack = now
+                out.append(make_nack(msg_id, transfer.missing(), self.node_id, mtu=self.mtu))
+            self._counters['nacks_sent'] += len(out)
+        return out
+
+    def expire(self) -> int:
+        """Drop timed-out transfers now; returns how many were dropped."""
+        with self._lock:
+            return self._expire(self.clock())
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._counters, active=len(self._transfers), buffered_bytes=self._bytes)
+
+    def _expire(self, now: float) -> int:
+        stale = [k for k, t in self._transfers.items() if now - t.last_progress > self.timeout]
+        for msg_id in stale:
+            self._drop(msg_id)
+        self._counters['expired'] += len(stale)
+        return len(stale)
+
+    def _drop(self, msg_id: str) -> None:
+        transfer = self._transfers.pop(msg_id)
+        self._bytes -= transfer.bytes
+
+    def _remember_done(self, msg_id: str) -> None:
+        self._done[msg_id] = None
+        while len(self._done) > 4 * self.max_transfers:
+            self._done.popitem(last=False)
+
+
+class ChunkOutbox:
+    """Sender side: splits payloads and keeps them for a while to answer re-requests.
+
+    Holds at most `max_transfers` payloads and `max_bytes` in total (oldest
+    dropped first); a re-request for a dropped transfer gets no answer and
+    the receiver eventually times out.
+    """
+
+    def __init__(self, node_id: str, mtu: int = DEFAULT_MTU, max_transfers: int = 32,
+                 max_bytes: int = 32 * 2 ** 20):
+        self.node_id = node_id
+        self.mtu = mtu
+        self.max_transfers = max_transfers
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._sent: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._refs: Dict[str, str] = {}
+        self._bytes = 0
+        self._counters = {'transfers': 0, 'chunks_sent': 0, 'chunks_resent': 0, 'unknown_nacks': 0}
+
+    def send(self, payload: bytes, msg_type: str = 'image', priority: int = 0, ttl: int = 6,
+             ref: Optional[str] = None) -> List[Message]:
+        """Chunk messages for `payload`; the payload is kept for re-sends.
+
+        `ref` (e.g. an image-cache key) names the payload for `find`.
+        """
+        messages = split_payload(payload, self.node_id, msg_type=msg_type, mtu=self.mtu, priority=priority,
+                                 ttl=ttl)
+        msg_id = messages[0]['msg_id']
+        with self._lock:
+            self._sent[msg_id] = (bytes(payload), msg_type, priority, ttl, ref)
+            self._bytes += len(payload)
+            if ref is not None:
+                self._refs[ref] = msg_id
+            while len(self._sent) > self.max_transfers or self._bytes > self.max_bytes:
+                old_id, (old, *_rest, old_ref) = self._sent.popitem(last=False)
+                self._bytes -= len(old)
+                if old_ref is not None and self._refs.get(old_ref) == old_id:
+                    del self._refs[old_ref]
+            self._counters['transfers'] += 1
+            self._counters['chunks_sent'] += len(messages)
+        return messages
+
+    def handle_nack(self, msg: Message) -> List[Message]:
+        """Chunk messages answering a `chunk_nack`; [] if it isn't ours or is malformed."""
+        if msg.get('type') != NACK_TYPE:
+            return []
+        try:
+            request = json.loads(msg['content'])
+            msg_id = str(request['msg_id'])
+            indices = parse_ranges(str(request['missing']))
+        except (KeyError, TypeError, ValueError):
+            return []
+        with self._lock:
+            entry = self._sent.get(msg_id)
+            if entry is None:
+                self._counters['unknown_nacks'] += 1
+                return []
+            self._sent.move_to_end(msg_id)
+        payload, msg_type, priority, ttl, _ = entry
+        messages = split_payload(payload, self.node_id, msg_type=msg_type, mtu=self.mtu, msg_id=msg_id,
+                                 priority=priority, ttl=ttl, indices=indices)
+        with self._lock:
+            self._counters['chunks_resent'] += len(messages)
+        return messages
+
+    def find(self, ref: str) -> Optional[str]:
+        """msg_id of the held transfer sent with `ref`, or None."""
+        with self._lock:
+            return self._refs.get(ref)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._counters, held=len(self._sent), held_bytes=self._bytes)
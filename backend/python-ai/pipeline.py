@@ -0,0 +1,84 @@
+# pipeline.py
+# Shared per-message analysis for the fused /api/pipeline endpoint. The
+# frontend used to call /api/classify, /api/mood-advice and /api/rewrite
+# one after another, each lowercasing and scanning the same text again.
+# The pipeline builds one `AnalysisContext` per message and every stage
+# (classifier, tone rewriter, summarizer) reads from it.
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from summarizer import sentence_spans, span_tokens
+
+STAGES = ('classify', 'rewrite', 'advice', 'analytics', 'summarize')
+DEFAULT_STAGES = ('classify', 'rewrite', 'advice')
+
+
+class AnalysisContext:
+    """Text analysis done once per message and shared by the stages.
+
+    The lowercased text is computed up front (the classifier and the tone
+    rewriter both need it); sentence spans and their tokens are computed on
+    first use, so stages that don't need them cost nothing.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.lowered = text.lower()
+        self._spans: Optional[np.ndarray] = None
+        self._tokens: Optional[List[List[str]]] = None
+
+    @property
+    def spans(self) -> np.ndarray:
+        """(n, 2) array of sentence (start, end) offsets (see `sentence_spans`)."""
+        if self._spans is None:
+            self._spans = sentence_spans(self.text)
+        return self._spans
+
+    @property
+    def tokens(self) -> List[List[str]]:
+        """Summarizer tokens of each sentence (see `span_tokens`)."""
+        if self._tokens is None:
+            self._tokens = list(span_tokens(self.text, self.spans, self.lowered))
+        return self._tokens
+
+
+def parse_stages(stages: Sequence[str]) -> List[str]:
+    """Validate requested stage names; returns them in execution order.
+
+    Raises ValueError unless `stages` is a non-empty list (or tuple) of
+    known stage names.
+    """
+    if not isinstance(stages, (list, tuple)) or not all(isinstance(s, str) for s in stages):
+        raise ValueError('stages must be a list of strings')
+    requested = set(stages)
+    unknown = requested.difference(STAGES)
+    if unknown:
+        raise ValueError(f"unknown stage(s) {', '.join(sorted(unknown))}; use {', '.join(STAGES)}")
+    if not requested:
+        raise ValueError('no stages requested')
+    return [stage for stage in STAGES if stage in requested]
+
+
+class StageTimer:
+    """Wall-clock milliseconds spent in each pipeline stage."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.timings: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + (time.perf_counter() - t0) * 1000
+
+    def report(self) -> Dict[str, float]:
+        """Per-stage timings plus the total, rounded to microseconds."""
+        report = {name: round(ms, 3) for name, ms in self.timings.items()}
+        report['total'] = round((time.perf_counter() - self.started) * 1000, 3)
+        return report
@@ -2,26 +2,318 @@
 # Very small extractive summarizer used by the /api/summarize endpoint.
 # It picks the most "important" sentences from a text by scoring sentences
 # with TF-IDF and selecting the top-scoring ones.
+#
+# Two interchangeable backends compute the TF-IDF scores:
+#   - 'sklearn': scikit-learn's TfidfVectorizer / HashingVectorizer.
+#   - 'numpy':   the same tokenization and math using only NumPy and the
+#                standard library. scikit-learn is never imported, which
+#                saves noticeable startup time and memory per worker.
+# Pick one with SUMMARIZER_BACKEND or the `backend` argument.
+import heapq
+from array import array
+import os
 import re
-from typing import List
+import threading
+import zlib
+from collections import Counter
+from typing import IO, Callable, Iterable, Iterator, List, Optional, Tuple
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
+
+BACKENDS = ('sklearn', 'numpy')
+DEFAULT_BACKEND = os.environ.get('SUMMARIZER_BACKEND', 'sklearn')
 
 # A lightweight sentence splitter. It splits on punctuation (.!? ) followed by
 # whitespace — good enough for short messages and multi-sentence inputs.
 _SENTENCE_SPLIT = re.compile(r'(?<=[.!?])\s+')
 
 
+# (start, end) offsets of a sentence in the original text
+Span = Tuple[int, int]
+
+
+def _trimmed_span(text: str, start: int, end: int) -> Optional[Span]:
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return (start, end) if start < end else None
+
+
+def iter_sentence_spans(text: str) -> Iterator[Span]:
+    """Yield (start, end) offsets into `text` for each non-empty sentence.
+
+    Spans are trimmed of surrounding whitespace and follow the same boundary
+    rules as `split_sentences`; `text[start:end]` gives the sentence string.
+    """
+    pos = 0
+    for m in _SENTENCE_SPLIT.finditer(text):
+        span = _trimmed_span(text, pos, m.start())
+        if span:
+            yield span
+        pos = m.end()
+    span = _trimmed_span(text, pos, len(text))
+    if span:
+        yield span
+
+
+def sentence_spans(text: str) -> np.ndarray:
+    """Split text into sentences without copying it.
+
+    Returns an (n_sentences, 2) int64 array of (start, end) offsets (see
+    `iter_sentence_spans`), stored compactly at 16 bytes per sentence.
+    """
+    flat = array('q')
+    for span in iter_sentence_spans(text):
+        flat.extend(span)
+    return _as_int64(flat).reshape(-1, 2)
+
+
+def _as_int64(values: array) -> np.ndarray:
+    return np.frombuffer(values, dtype=np.int64) if values else np.zeros(0, dtype=np.int64)
+
+
+def _iter_pairs(spans: np.ndarray) -> Iterator[Span]:
+    """Iterate an (n, 2) span array as tuples of plain ints, lazily."""
+    flat = iter(memoryview(np.ascontiguousarray(spans, dtype=np.int64).reshape(-1)))
+    return zip(flat, flat)
+
+
 def split_sentences(text: str) -> List[str]:
     """Split text into sentences.
 
-    If the regex doesn't find sentences (e.g. no punctuation), fall back to
-    splitting on newlines. Returns a list of non-empty trimmed sentence strings.
+    Returns a list of non-empty trimmed sentence strings; see
+    `sentence_spans` for the offset-based variant that avoids the copies.
+    """
+    return [text[start:end] for start, end in iter_sentence_spans(text)]
+
+
+# Tokenization used by the numpy backend. Mirrors scikit-learn's defaults:
+# lowercase, tokens of 2+ word characters, then drop English stop words
+# (a copy of sklearn.feature_extraction.text.ENGLISH_STOP_WORDS).
+_TOKEN_PATTERN = re.compile(r'(?u)\b\w\w+\b')
+ENGLISH_STOP_WORDS = frozenset("""
+    a about above across after afterwards again against all almost alone along
+    already also although always am among amongst amoungst amount an and another
+    any anyhow anyone anything anyway anywhere are around as at back be became
+    because become becomes becoming been before beforehand behind being below
+    beside besides between beyond bill both bottom but by call can cannot cant
+    co con could couldnt cry de describe detail do done down due during each eg
+    eight either eleven else elsewhere empty enough etc even ever every everyone
+    everything everywhere except few fifteen fifty fill find fire first five for
+    former formerly forty found four from front full further get give go had has
+    hasnt have he hence her here hereafter hereby herein hereupon hers herself
+    him himself his how however hundred i ie if in inc indeed interest into is
+    it its itself keep last latter latterly least less ltd made many may me
+    meanwhile might mill mine more moreover most mostly move much must my myself
+    name namely neither never nevertheless next nine no nobody none noone nor
+    not nothing now nowhere of off often on once one only onto or other others
+    otherwise our ours ourselves out over own part per perhaps please put rather
+    re same see seem seemed seeming seems serious several she should show side
+    since sincere six sixty so some somehow someone something sometime sometimes
+    somewhere still such system take ten than that the their them themselves
+    then thence there thereafter thereby therefore therein thereupon these they
+    thick thin third this those though three through throughout thru thus to
+    together too top toward towards twelve twenty two un under until up upon us
+    very via was we well were what whatever when whence whenever where
+    whereafter whereas whereby wherein whereupon wherever whether which while
+    whither who whoever whole whom whose why will with within without would yet
+    you your yours yourself yourselves
+""".split())
+
+# CSR-style term counts: (indptr, columns, counts) with one row per sentence
+TermCounts = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+def tokenize(sentence: str) -> List[str]:
+    """Lowercase, split into word tokens and remove English stop words."""
+    return [tok for tok in _TOKEN_PATTERN.findall(sentence.lower()) if tok not in ENGLISH_STOP_WORDS]
+
+
+def span_tokens(text: str, spans: np.ndarray, lowered: Optional[str] = None) -> Iterator[List[str]]:
+    """Tokenize each span of `text` like `tokenize`, without slicing sentences.
+
+    The text is lowercased once (or `lowered` is used, if given) and the
+    token regex runs directly between each span's offsets.
+    """
+    if lowered is None:
+        lowered = text.lower()
+    if len(lowered) != len(text):
+        # A few characters lowercase to several (e.g. 'İ'); offsets no longer
+        # line up, so tokenize sentence copies instead.
+        for start, end in _iter_pairs(spans):
+            yield tokenize(text[start:end])
+        return
+    findall = _TOKEN_PATTERN.findall
+    for start, end in _iter_pairs(spans):
+        yield [tok for tok in findall(lowered, start, end) if tok not in ENGLISH_STOP_WORDS]
+
+
+def _count_terms(token_lists: Iterable[List[str]], column: Callable[[str], int]) -> TermCounts:
+    """Count tokens per sentence, mapping each token to a column with `column`."""
+    # Typed arrays keep large inputs compact (8 bytes per entry)
+    indptr = array('q', [0])
+    cols = array('q')
+    vals = array('d')
+    for tokens in token_lists:
+        counts = Counter(column(tok) for tok in tokens)
+        cols.extend(counts.keys())
+        vals.extend(counts.values())
+        indptr.append(len(cols))
+    return _as_int64(indptr), _as_int64(cols), np.frombuffer(vals, dtype=np.float64) if vals else np.zeros(0)
+
+
+def _normalized_row_sums(indptr: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """Per-row sum of the L2-normalized weights (0 for empty rows)."""
+    n = len(indptr) - 1
+    rows = np.repeat(np.arange(n), np.diff(indptr))
+    sums = np.bincount(rows, weights=weights, minlength=n)
+    norms = np.sqrt(np.bincount(rows, weights=weights * weights, minlength=n))
+    return np.divide(sums, norms, out=np.zeros(n), where=norms > 0)
+
+
+def _check_backend(backend: Optional[str]) -> str:
+    backend = backend or DEFAULT_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown summarizer backend {backend!r}; use one of {', '.join(BACKENDS)}")
+    return backend
+
+
+def iter_sentences(chunks: Iterable[str], max_sentence_chars: int = 65536) -> Iterator[str]:
+    """Yield trimmed sentences from a stream of text chunks.
+
+    Uses the same boundary rule as `split_sentences` but only buffers the
+    unfinished sentence at the end of the stream read so far. A "sentence"
+    longer than `max_sentence_chars` (e.g. a log without punctuation) is cut
+    at its last newline, or hard-cut if there is none, so the buffer stays
+    bounded.
+    """
+    buffer = ''
+    for chunk in chunks:
+        buffer += chunk
+        parts = _SENTENCE_SPLIT.split(buffer)
+        buffer = parts.pop()
+        for part in parts:
+            part = part.strip()
+            if part:
+                yield part
+        while len(buffer) > max_sentence_chars:
+            cut = buffer.rfind('\n', 0, max_sentence_chars)
+            if cut <= 0:
+                cut = max_sentence_chars
+            head, buffer = buffer[:cut].strip(), buffer[cut:]
+            if head:
+                yield head
+    tail = buffer.strip()
+    if tail:
+        yield tail
+
+
+def iter_file_chunks(f: IO[str], chunk_size: int = 64 * 1024) -> Iterator[str]:
+    """Read a text file object in `chunk_size` pieces."""
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+class CorpusIdf:
+    """Document frequencies fitted incrementally over every sentence seen.
+
+    Terms are hashed into a fixed number of buckets, so memory stays bounded
+    no matter how large the vocabulary of the corpus grows (2**18 buckets ->
+    2 MB of counts). The 'sklearn' backend hashes with `HashingVectorizer`
+    (MurmurHash3), the 'numpy' backend with CRC-32; a saved model can only
+    be loaded by the backend that wrote it. The model can be saved to and
+    loaded from a `.npz` file so the statistics survive restarts.
+
+    IDF uses the same smoothed formula as `TfidfVectorizer`:
+    idf(t) = ln((1 + n_docs) / (1 + df(t))) + 1.
     """
-    sentences = [s.strip() for s in _SENTENCE_SPLIT.split(text) if s.strip()]
-    if not sentences:
-        sentences = [s.strip() for s in text.splitlines() if s.strip()]
-    return sentences
+
+    HASHERS = {'sklearn': 'murmur3', 'numpy': 'crc32'}
+
+    def __init__(self, n_features: int = 2 ** 18, backend: Optional[str] = None):
+        self.n_features = n_features
+        self.backend = _check_backend(backend)
+        self.hasher = self.HASHERS[self.backend]
+        self.vectorizer = None
+        if self.backend == 'sklearn':
+            from sklearn.feature_extraction.text import HashingVectorizer
+            self.vectorizer = HashingVectorizer(
+                n_features=n_features, stop_words="english",
+                alternate_sign=False, norm=None
+            )
+        self.df = np.zeros(n_features, dtype=np.int64)
+        self.n_docs = 0
+        self._lock = threading.Lock()
+
+    def counts(self, sentences: Iterable[str]) -> TermCounts:
+        """Hashed term counts of `sentences` (stateless)."""
+        if self.vectorizer is not None:
+            m = self.vectorizer.transform(sentences)
+            return m.indptr, m.indices, m.data
+        return self.count_tokens(map(tokenize, sentences))
+
+    def count_tokens(self, token_lists: Iterable[List[str]]) -> TermCounts:
+        """Hashed term counts of already tokenized sentences (numpy backend)."""
+        n_features = self.n_features
+        return _count_terms(token_lists, lambda tok: zlib.crc32(tok.encode('utf-8')) % n_features)
+
+    def partial_fit(self, counts: TermCounts) -> None:
+        """Add the documents (rows) of `counts` to the statistics."""
+        indptr, cols, _ = counts
+        # Columns are distinct within a row, so each document counts once per term
+        with self._lock:
+            np.add.at(self.df, cols, 1)
+            self.n_docs += len(indptr) - 1
+
+    def idf(self, cols: np.ndarray) -> np.ndarray:
+        """IDF weights for the given hashed term columns."""
+        with self._lock:
+            df = self.df[cols]
+            n_docs = self.n_docs
+        return np.log((1.0 + n_docs) / (1.0 + df)) + 1.0
+
+    def save(self, path: str) -> None:
+        """Atomically write the statistics to `path` (.npz)."""
+        with self._lock:
+            df = self.df.copy()
+            n_docs = self.n_docs
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            np.savez_compressed(f, df=df, n_docs=np.int64(n_docs), n_features=np.int64(self.n_features),
+                                hasher=np.str_(self.hasher))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str, backend: Optional[str] = None) -> 'CorpusIdf':
+        with np.load(path) as data:
+            model = cls(n_features=int(data['n_features']), backend=backend)
+            # Files written before the numpy backend existed are MurmurHash3
+            hasher = str(data['hasher']) if 'hasher' in data.files else 'murmur3'
+            if hasher != model.hasher:
+                raise ValueError(f"{path} was hashed with {hasher}, the {model.backend} backend uses {model.hasher}")
+            model.df[:] = data['df']
+            model.n_docs = int(data['n_docs'])
+        return model
+
+    @classmethod
+    def load_or_create(cls, path: Optional[str], n_features: int = 2 ** 18,
+                       backend: Optional[str] = None) -> 'CorpusIdf':
+        if path and os.path.exists(path):
+            return cls.load(path, backend=backend)
+        return cls(n_features=n_features, backend=backend)
+
+
+def select_top(scores: np.ndarray, max_sentences: int) -> List[int]:
+    """Indices of the `max_sentences` best scores, in original (reading) order.
+
+    Scores are rounded so both backends break ties (earliest sentence
+    first) the same way despite last-bit floating point differences.
+    """
+    ranked = np.argsort(-np.round(scores, 12), kind='stable')
+    return sorted(ranked[:max_sentences])
 
 
 class ExtractiveSummarizer:
@@ -29,8 +321,8 @@ class ExtractiveSummarizer:
 
     How it works:
       1. Split the input into sentences using `split_sentences`.
-      2. Vectorize each sentence with scikit-learn's TF-IDF (English stop words
-         removed).
+      2. Vectorize each sentence with TF-IDF (English stop words removed),
+         using scikit-learn or the pure NumPy backend.
       3. For each sentence, sum its TF-IDF weights across all terms to get a
          single numeric importance score.
       4. Select the top-k scoring sentences and return them in their original
@@ -38,31 +330,216 @@ class ExtractiveSummarizer:
 
     This is intentionally simple and fast. It performs well enough for short
     messages and gives deterministic, explainable output that is easy to
-    communicate to non-technical users.
+    communicate to non-technical users. Both backends produce the same
+    rankings.
+
+    If a `CorpusIdf` model is passed, step 2 uses IDF statistics learned over
+    every message summarized so far instead of fitting on just the current
+    message: each call updates the model with its sentences and then only
+    transforms them. Such an instance is meant to be long-lived and shared.
     """
-    def __init__(self):
-        # The TfidfVectorizer is created once per instance. We ignore English
-        # stop words to focus the scores on informative words.
-        self.vectorizer = TfidfVectorizer(stop_words="english")
+    def __init__(self, idf_model: Optional[CorpusIdf] = None, backend: Optional[str] = None):
+        self.backend = _check_backend(backend)
+        self.idf_model = idf_model
+        self._tfidf = None
+        if self.backend == 'sklearn':
+            # A fresh TfidfVectorizer is fitted per call: the instance is
+            # shared between request threads, and refitting one vectorizer
+            # concurrently corrupts its vocabulary. We ignore English stop
+            # words to focus the scores on informative words.
+            from sklearn.feature_extraction.text import TfidfVectorizer
+            self._tfidf = lambda: TfidfVectorizer(stop_words="english")
 
     def summarize(self, text: str, max_sentences: int = 3) -> List[str]:
+        return [text[start:end] for start, end in _iter_pairs(self.summarize_spans(text, max_sentences))]
+
+    def summarize_spans(self, text: str, max_sentences: int = 3, spans: Optional[np.ndarray] = None,
+                        tokens: Optional[Callable[[], Iterable[List[str]]]] = None) -> np.ndarray:
+        """Like `summarize` but returns an (n, 2) array of (start, end) offsets into `text`.
+
+        Sentences are located with `sentence_spans`; with the numpy backend
+        they are scored straight from the offsets, so no sentence strings
+        are created at all. The sklearn vectorizers need strings, so each
+        sentence is sliced out as the vectorizer reaches it and dropped
+        after (one sentence alive at a time, not a list of all). Callers that already split and tokenized the
+        text can pass the `spans` and a `tokens` callable returning the
+        `span_tokens` lists.
+        """
         # Split into candidate sentences
-        sentences = split_sentences(text)
-        if not sentences:
-            return []
+        if spans is None:
+            spans = sentence_spans(text)
 
         # If the document is short return it unchanged
-        if len(sentences) <= max_sentences:
-            return sentences
-
-        # Fit TF-IDF across the sentences and compute a scalar score per
-        # sentence by summing TF-IDF weights. Higher means more "important".
-        tfidf = self.vectorizer.fit_transform(sentences)  # shape: (n_sentences, n_terms)
-        scores = np.asarray(tfidf.sum(axis=1)).ravel()
-
-        # Rank sentences by score (descending). We then select the indices of
-        # the top-scoring sentences and sort them so the returned sentences
-        # preserve the original reading order.
-        ranked = np.argsort(-scores)
-        selected = sorted(ranked[:max_sentences])
-        return [sentences[i] for i in selected]
+        if len(spans) <= max_sentences:
+            return spans
+
+        scores = self._score(
+            lambda: (text[start:end] for start, end in _iter_pairs(spans)),
+            tokens or (lambda: span_tokens(text, spans)),
+        )
+        return spans[select_top(scores, max_sentences)]
+
+    def summarize_stream(self, chunks: Iterable[str], max_sentences: int = 3,
+                         chunk_sentences: int = 256, candidates: Optional[int] = None) -> List[str]:
+        """Summarize text that arrives as a stream of chunks (map-reduce).
+
+        Map: sentences are scored in groups of `chunk_sentences` with a
+        TF-IDF fit on that group, and only the best `candidates` sentences
+        seen so far (default 4 * max_sentences) are kept in a min-heap.
+        Reduce: the surviving candidates are re-scored together and the top
+        `max_sentences` are returned in their original order.
+
+        Memory is bounded by one group of sentences plus the candidate heap,
+        however large the input is. The shared corpus IDF (if any) is
+        neither used nor updated, so one huge document can't skew it.
+        """
+        keep = max(candidates or 4 * max_sentences, max_sentences)
+        heap: List[Tuple[float, int, str]] = []  # (score, -index, sentence)
+        group: List[str] = []
+        index = 0
+
+        def flush() -> None:
+            scores = self._safe_fit_scores(group)
+            start = index - len(group)
+            for offset, (score, sentence) in enumerate(zip(scores, group)):
+                # Ties keep the earlier sentence: it has the larger -index
+                entry = (round(float(score), 12), -(start + offset), sentence)
+                if len(heap) < keep:
+                    heapq.heappush(heap, entry)
+                elif entry > heap[0]:
+                    heapq.heapreplace(heap, entry)
+            group.clear()
+
+        for sentence in iter_sentences(chunks):
+            group.append(sentence)
+            index += 1
+            if len(group) >= chunk_sentences:
+                flush()
+        if group:
+            flush()
+
+        # Reduce: candidates in reading order, re-scored as one document
+        pool = sorted(heap, key=lambda e: -e[1])
+        if len(pool) <= max_sentences:
+            return [e[2] for e in pool]
+        scores = self._safe_fit_scores([e[2] for e in pool])
+        return [pool[i][2] for i in select_top(scores, max_sentences)]
+
+    def score_sentences(self, sentences: List[str]) -> np.ndarray:
+        """Sum of each sentence's TF-IDF weights. Higher means more "important"."""
+        return self._score(lambda: sentences, lambda: map(tokenize, sentences))
+
+    def _safe_fit_scores(self, sentences: List[str]) -> np.ndarray:
+        # scikit-learn refuses a group made only of stop words; score it 0
+        try:
+            return self._fit_scores(sentences)
+        except ValueError:
+            return np.zeros(len(sentences))
+
+    def _fit_scores(self, sentences: List[str]) -> np.ndarray:
+        """TF-IDF scores with the IDF fitted on `sentences` alone."""
+        return self._score(lambda: sentences, lambda: map(tokenize, sentences), use_corpus=False)
+
+    def _score(self, strings: Callable[[], Iterable[str]], tokens: Callable[[], Iterable[List[str]]],
+               use_corpus: bool = True) -> np.ndarray:
+        """Score sentences given lazily as strings (sklearn) or token lists (numpy)."""
+        model = self.idf_model if use_corpus else None
+        if model is not None:
+            # TF-IDF using (and updating) the shared corpus IDF
+            counts = model.counts(strings()) if model.vectorizer is not None else model.count_tokens(tokens())
+            model.partial_fit(counts)
+            indptr, cols, vals = counts
+            return _normalized_row_sums(indptr, vals * model.idf(cols))
+        if self._tfidf is not None:
+            tfidf = self._tfidf().fit_transform(strings())  # shape: (n_sentences, n_terms)
+            return np.asarray(tfidf.sum(axis=1)).ravel()
+        return self._numpy_scores(tokens())
+
+    def _numpy_scores(self, token_lists: Iterable[List[str]]) -> np.ndarray:
+        """Per-message TF-IDF fit, equivalent to TfidfVectorizer's defaults."""
+        vocabulary = {}
+        indptr, cols, vals = _count_terms(token_lists, lambda tok: vocabulary.setdefault(tok, len(vocabulary)))
+        n = len(indptr) - 1
+        df = np.bincount(cols, minlength=len(vocabulary))
+        idf = np.log((1.0 + n) / (1.0 + df)) + 1.0
+        return _normalized_row_sums(indptr, vals * idf[cols])
+
+
+class RunningSummary:
+    """Incrementally maintained extractive summary of one conversation.
+
+    Scores sentences the same way as `ExtractiveSummarizer` (sum of the
+    L2-normalized TF-IDF weights, IDF fitted on the conversation's
+    sentences), but keeps the term statistics between messages instead of
+    refitting the whole history:
+
+      - document frequencies over every sentence seen so far are updated
+        with each new message's sentences;
+      - only a bounded pool of `candidates` best sentences (with their term
+        counts) is kept; on each message the pool and the new sentences are
+        re-scored against the current IDF and the pool is trimmed again.
+
+    Adding a message therefore costs time proportional to that message (plus
+    the constant-size pool), and `summary()` returns the cached result.
+    Sentences that drop out of the pool are not reconsidered later, which
+    is the approximation that keeps updates cheap.
+
+    Document frequencies are kept for at most `max_terms` distinct terms:
+    beyond that the rarest half is forgotten (terms of pooled sentences are
+    always kept). A forgotten term that comes back counts as new, which
+    only matters for terms that were rare anyway.
+    """
+
+    def __init__(self, max_sentences: int = 3, candidates: Optional[int] = None, max_terms: int = 20_000):
+        self.max_sentences = max_sentences
+        self.capacity = max(candidates or 4 * max_sentences, max_sentences)
+        self.max_terms = max_terms
+        self.df: Counter = Counter()
+        self.n_docs = 0
+        self.n_messages = 0
+        # Pool entries: (sequence number, sentence, {term: count})
+        self._pool: List[Tuple[int, str, Counter]] = []
+        self._summary: List[str] = []
+
+    def add_message(self, text: str) -> List[str]:
+        """Fold a new message into the summary and return the updated summary."""
+        self.n_messages += 1
+        new = []
+        for start, end in iter_sentence_spans(text):
+            sentence = text[start:end]
+            counts = Counter(tokenize(sentence))
+            self.df.update(counts.keys())
+            self.n_docs += 1
+            new.append((self.n_docs, sentence, counts))
+        if not new:
+            return self._summary
+
+        pool = self._pool + new
+        scores = self._scores([counts for _, _, counts in pool])
+        keep = select_top(scores, self.capacity)
+        self._pool = [pool[i] for i in keep]
+        kept_scores = scores[keep]
+        top = select_top(kept_scores, self.max_sentences)
+        self._summary = [self._pool[i][1] for i in top]
+        if len(self.df) > self.max_terms:
+            self._forget_rare_terms()
+        return self._summary
+
+    def summary(self) -> List[str]:
+        """The current summary sentences, in conversation order."""
+        return self._summary
+
+    def _forget_rare_terms(self) -> None:
+        keep = {tok for _, _, counts in self._pool for tok in counts}
+        keep.update(tok for tok, _ in self.df.most_common(self.max_terms // 2))
+        self.df = Counter({tok: self.df[tok] for tok in keep})
+
+    def _scores(self, term_counts: List[Counter]) -> np.ndarray:
+        vocabulary = {}
+        indptr, cols, vals = _count_terms(
+            (counts.elements() for counts in term_counts),
+            lambda tok: vocabulary.setdefault(tok, len(vocabulary))
+        )
+        df = np.fromiter((self.df[tok] for tok in vocabulary), dtype=np.float64, count=len(vocabulary))
+        idf = np.log((1.0 + self.n_docs) / (1.0 + df)) + 1.0
+        return _normalized_row_sums(indptr, vals * idf[cols])
@@ -2,7 +2,7 @@
 # Rule-based tone transformation system for improving message quality
 # Converts aggressive/negative messages into more constructive alternatives
 import re
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 # Tone transformation patterns - maps problematic phrases to better alternatives
 TONE_PATTERNS = {
@@ -67,6 +67,65 @@ TONE_PATTERNS = {
     }
 }
 
+
+class ToneRewriter:
+    """Applies each tone's rules in table order, like a `re.sub` per rule.
+
+    Patterns are compiled once. Each tone also gets one alternation of all
+    its patterns: if that finds nothing in a message, no rule can change
+    it, so the message is returned without running the rules one by one
+    (most messages match no rule at all). Otherwise the rules are applied
+    in order, so output is exactly that of the plain per-rule loop.
+    """
+
+    def __init__(self, table: Dict[str, Dict[str, str]]):
+        self.tones = list(table)
+        self._rules = {
+            tone: [(re.compile(pattern, re.IGNORECASE), replacement) for pattern, replacement in rules.items()]
+            for tone, rules in table.items()
+        }
+        self._any = {
+            tone: re.compile('|'.join(f'(?:{pattern})' for pattern in rules), re.IGNORECASE)
+            for tone, rules in table.items() if rules
+        }
+
+    def rewrite(self, lowered: str, tone: str) -> str:
+        """`lowered` (already lowercased text) rewritten into `tone`."""
+        any_rule = self._any.get(tone)
+        if any_rule is None or any_rule.search(lowered) is None:
+            return lowered
+        result = lowered
+        for pattern, replacement in self._rules[tone]:
+            result = pattern.sub(replacement, result)
+        return result
+
+    def rewrite_all(self, text: str, tones: Optional[List[str]] = None,
+                    lowered: Optional[str] = None) -> Dict[str, str]:
+        """Lowercased text rewritten into each tone (all tones by default).
+
+        `lowered` is `text.lower()`, if the caller already has it.
+        """
+        if lowered is None:
+            lowered = text.lower()
+        wanted = self.tones if tones is None else tones
+        return {tone: self.rewrite(lowered, tone) for tone in self.tones if tone in wanted}
+
+
+_REWRITER = ToneRewriter(TONE_PATTERNS)
+
+
+def _match_case(text: str, result: str) -> str:
+    # Capitalize first letter and maintain original capitalization style
+    if result and text:
+        # If original was all caps, keep it all caps
+        if text.isupper():
+            result = result.upper()
+        # If original started with capital, capitalize first letter
+        elif text[0].isupper():
+            result = result[0].upper() + result[1:]
+    return result
+
+
 def rewrite_tone(text: str, target_tone: str) -> str:
     """Transform the tone of a message using rule-based pattern matching.
     
@@ -79,31 +138,16 @@ def rewrite_tone(text: str, target_tone: str) -> str:
     """
     if target_tone not in TONE_PATTERNS:
         return text
-    
-    result = text.lower()
-    patterns = TONE_PATTERNS[target_tone]
-    
-    # Apply transformation patterns
-    for pattern, replacement in patterns.items():
-        result = re.sub(pattern, replacement, result, flags=re.IGNORECASE)
-    
-    # Capitalize first letter and maintain original capitalization style
-    if result and text:
-        # If original was all caps, keep it all caps
-        if text.isupper():
-            result = result.upper()
-        # If original started with capital, capitalize first letter
-        elif text[0].isupper():
-            result = result[0].upper() + result[1:]
-    
-    return result
+    return _match_case(text, _REWRITER.rewrite_all(text, [target_tone])[target_tone])
+
 
-def get_rewrite_suggestions(text: str, detected_emotion: str) -> Dict[str, str]:
+def get_rewrite_suggestions(text: str, detected_emotion: str, lowered: Optional[str] = None) -> Dict[str, str]:
     """Get multiple tone rewrite suggestions based on detected emotion.
     
     Args:
         text: Original message text
         detected_emotion: Emotion detected by classifier
+        lowered: `text.lower()`, if the caller already computed it
     
     Returns:
         Dictionary mapping tone names to rewritten versions
@@ -112,13 +156,13 @@ def get_rewrite_suggestions(text: str, detected_emotion: str) -> Dict[str, str]:
     
     # Only suggest rewrites for negative emotions
     if detected_emotion in ['angry', 'sad', 'scared']:
-        suggestions['supportive'] = rewrite_tone(text, 'supportive')
-        suggestions['professional'] = rewrite_tone(text, 'professional') 
-        suggestions['neutral'] = rewrite_tone(text, 'neutral')
+        # Lowercase once; each tone's prefilter skips text none of its rules match
+        rewritten = _REWRITER.rewrite_all(text, ['supportive', 'professional', 'neutral'], lowered)
+        suggestions = {tone: _match_case(text, result) for tone, result in rewritten.items()}
         
         # Remove suggestions that are identical to original
-        original_lower = text.lower().strip()
+        original_lower = (text.lower() if lowered is None else lowered).strip()
         suggestions = {k: v for k, v in suggestions.items() 
                       if v.lower().strip() != original_lower}
     
-    return suggestions
\ No newline at end of file
+    return suggestions
@@ -0,0 +1,208 @@
+# uploads.py
+# Size-capped spooling of image uploads. The request body is copied in
+# chunks into a buffer that stays in memory while small and moves to a
+# temporary file once it grows past a threshold; going over the hard limit
+# aborts the upload immediately. A caller-supplied check sees the first
+# bytes as they arrive (e.g. to reject huge pixel dimensions from the image
+# header) before the rest of the body is read. Multipart bodies are parsed
+# here as a stream too, rather than through `request.files`, which would
+# have Werkzeug buffer the whole body before any check could run.
+#
+# Large uploads are then handed to the compression workers by path and
+# decoded straight from a read-only mmap, so the body is never held in the
+# API process as one bytes object.
+import atexit
+import mmap
+import os
+import tempfile
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from werkzeug.sansio.multipart import Data, Epilogue, Field, File, MultipartDecoder, NeedData
+
+# Most bytes of the body given to `check` (enough for JPEG APP segments before the frame header)
+HEADER_PROBE_BYTES = 256 * 1024
+
+
+# Spool files that could not be deleted yet (Windows refuses while a worker
+# still has the file mapped); retried on every later close and at exit
+_undeleted: List[str] = []
+_undeleted_lock = threading.Lock()
+
+
+def _delete_spool_files(path: Optional[str] = None) -> None:
+    with _undeleted_lock:
+        paths = _undeleted + ([path] if path is not None else [])
+        _undeleted.clear()
+        for p in paths:
+            try:
+                os.unlink(p)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                _undeleted.append(p)
+
+
+atexit.register(_delete_spool_files)
+
+
+class UploadTooLarge(Exception):
+    """The upload exceeds the byte limit or the image exceeds the pixel limit."""
+
+
+class SpooledUpload:
+    """Write-once upload buffer: memory below `spool_bytes`, a temp file above.
+
+    `data` holds the bytes while in memory; once spooled, `path` names the
+    temp file instead. `digest` (if a hash object was given) covers
+    everything written. Close (or use as a context manager) to remove the
+    file.
+    """
+
+    def __init__(self, max_bytes: int, spool_bytes: int = 2 ** 20, directory: Optional[str] = None,
+                 hasher: Any = None):
+        self.max_bytes = max_bytes
+        self.spool_bytes = spool_bytes
+        self.directory = directory
+        self.hasher = hasher
+        self.size = 0
+        self.path: Optional[str] = None
+        self._memory: Optional[bytearray] = bytearray()
+        self._file = None
+
+    def write(self, chunk: bytes) -> None:
+        if self.size + len(chunk) > self.max_bytes:
+            raise UploadTooLarge(f"upload exceeds {self.max_bytes} bytes")
+        if self.hasher is not None:
+            self.hasher.update(chunk)
+        self.size += len(chunk)
+        if self._file is None and self.size > self.spool_bytes:
+            fd, self.path = tempfile.mkstemp(prefix='upload-', suffix='.bin', dir=self.directory)
+            self._file = os.fdopen(fd, 'wb')
+            self._file.write(self._memory)
+            self._memory = None
+        if self._file is not None:
+            self._file.write(chunk)
+        else:
+            self._memory += chunk
+
+    def finish(self) -> 'SpooledUpload':
+        """Flush the temp file so workers can map it."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        return self
+
+    @property
+    def data(self) -> Optional[bytearray]:
+        return self._memory
+
+    @property
+    def digest(self) -> Optional[str]:
+        return self.hasher.hexdigest() if self.hasher is not None else None
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self.path is not None:
+            _delete_spool_files(self.path)
+            self.path = None
+        self._memory = None
+
+    def __enter__(self) -> 'SpooledUpload':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class _HeaderProbe:
+    """Feeds the start of a body to `check(head) -> bool` until it returns True.
+
+    `check` is called with all bytes so far after each chunk, and no more
+    once it returns True (it has seen enough) or HEADER_PROBE_BYTES have
+    been passed to it.
+    """
+
+    def __init__(self, check: Optional[Callable[[bytes], bool]]):
+        self.check = check
+        self.head = bytearray()
+
+    def feed(self, chunk: bytes) -> None:
+        if self.check is None:
+            return
+        self.head += chunk[:HEADER_PROBE_BYTES - len(self.head)]
+        if self.check(bytes(self.head)) or len(self.head) >= HEADER_PROBE_BYTES:
+            self.check = self.head = None
+
+
+def spool_stream(stream, upload: SpooledUpload, check: Optional[Callable[[bytes], bool]] = None,
+                 chunk_size: int = 64 * 1024) -> SpooledUpload:
+    """Copy a readable stream into `upload` chunk by chunk.
+
+    `check(head)` sees the bytes received so far after every chunk until it
+    returns True (see `_HeaderProbe`) and may raise to abort the upload
+    early; so does going over `upload.max_bytes`. The upload is closed on
+    error.
+    """
+    probe = _HeaderProbe(check)
+    try:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            upload.write(chunk)
+            probe.feed(chunk)
+        return upload.finish()
+    except BaseException:
+        upload.close()
+        raise
+
+
+def spool_multipart(stream, boundary: bytes, upload: SpooledUpload, field: str = 'image',
+                    check: Optional[Callable[[bytes], bool]] = None, chunk_size: int = 64 * 1024,
+                    max_field_bytes: int = 64 * 1024, max_parts: int = 16) -> Dict[str, str]:
+    """Parse a multipart/form-data stream, copying the file part `field` into `upload`.
+
+    The file's bytes go through `check` and `upload.max_bytes` as they
+    arrive, as in `spool_stream`. Returns the non-file fields as strings;
+    other file parts are skipped. Raises ValueError for a malformed body or
+    a field over `max_field_bytes` (too many parts raise Werkzeug's
+    RequestEntityTooLarge). The upload is closed on error.
+    """
+    decoder = MultipartDecoder(boundary, max_parts=max_parts)
+    probe = _HeaderProbe(check)
+    fields: Dict[str, str] = {}
+    part, value, keep, taken = None, bytearray(), False, False
+    try:
+        while True:
+            chunk = stream.read(chunk_size)
+            decoder.receive_data(chunk or None)
+            event = decoder.next_event()
+            while not isinstance(event, (NeedData, Epilogue)):
+                if isinstance(event, (Field, File)):
+                    # Only the first file part named `field` is kept
+                    part, value = event, bytearray()
+                    keep = isinstance(event, File) and event.name == field and not taken
+                    taken = taken or keep
+                elif not isinstance(event, Data):
+                    pass  # preamble
+                elif isinstance(part, File):
+                    if keep:
+                        upload.write(event.data)
+                        probe.feed(event.data)
+                else:
+                    value += event.data
+                    if len(value) > max_field_bytes:
+                        raise ValueError(f"form field {part.name!r} exceeds {max_field_bytes} bytes")
+                    if not event.more_data:
+                        fields[part.name] = value.decode('utf-8', 'replace')
+                event = decoder.next_event()
+            if not chunk or isinstance(event, Epilogue):
+                break
+        upload.finish()
+        return fields
+    except BaseException:
+        upload.close()
+        raise